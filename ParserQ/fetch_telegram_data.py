@@ -2,9 +2,16 @@ import asyncio
 import json
 import logging
 import os
+import sys
 from datetime import datetime
+from pathlib import Path
 from telethon import TelegramClient
 
+# Shared helpers live in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from entity_cache import EntityCache
+from store_io import write_json
+
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
@@ -20,6 +27,7 @@ GROUP_IDS = [
 ]
 CONFIG_FILE = 'config.json'
 DATA_FILE = 'transactions.json'
+ENTITY_CACHE_FILE = 'entity_cache.json'
 income_messages = []
 expense_messages = []
 
@@ -43,16 +51,16 @@ def save_data():
         'expense': expense_messages,
         'last_updated': datetime.now().isoformat()
     }
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # Locked atomic replace so concurrent readers never see a truncated file
+    write_json(DATA_FILE, data)
     logger.info(f"Data saved to {DATA_FILE}")
 
-def process_message(message_data: dict, chat) -> dict:
+def process_message(message_data: dict) -> dict:
     return {
         'id': message_data['message_id'],
         'timestamp': message_data['timestamp'],
         'group_id': message_data['group_id'],
-        'group_title': getattr(chat, 'title', 'Unknown'),
+        'group_title': message_data['group_title'],
         'text': message_data['message_text'],
         'sender_id': message_data['sender_id'],
         'amount': extract_amount(message_data['message_text']),
@@ -88,21 +96,22 @@ async def fetch_messages():
         expense_messages.clear()
         income_group_id = -4855539306
         expense_group_id = -4884869527
+        entity_cache = EntityCache(ENTITY_CACHE_FILE, scope='my_session')
         for group_id in GROUP_IDS:
             try:
-                chat = await client.get_entity(group_id)
-                async for message in client.iter_messages(group_id, limit=100):
+                chat, group_title = await entity_cache.resolve(group_id, client.get_entity)
+                async for message in client.iter_messages(chat, limit=100):
                     if message.text:
                         message_data = {
                             'timestamp': message.date.isoformat() if message.date else datetime.now().isoformat(),
                             'group_id': group_id,
-                            'group_title': getattr(chat, 'title', 'Unknown'),
+                            'group_title': group_title,
                             'sender_id': message.sender_id,
                             'message_id': message.id,
                             'message_text': message.text,
                             'is_reply': message.reply_to_msg_id is not None,
                         }
-                        processed_message = process_message(message_data, chat)
+                        processed_message = process_message(message_data)
                         if group_id == income_group_id:
                             income_messages.append(processed_message)
                         elif group_id == expense_group_id:
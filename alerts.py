@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Budget alerts
+Rules from the config's "alerts" section (category budgets per day, week or
+month, a daily expense cap and a large-expense threshold) evaluated against
+every store write as it happens. The engine keeps one running total per
+budget for its current window and adjusts it by the rows each write adds,
+edits or deletes, so the cost of a write depends on the number of rules and
+not on the size of the store; the store is read once to seed the totals.
+Alerts are appended to a small log (transactions.alerts, JSON lines) that
+the web app serves to the UI, and can also be sent to a Telegram chat.
+
+Example config:
+    "alerts": {
+        "budgets": [{"category": "еда", "period": "month", "limit": 30000}],
+        "daily_expense_cap": 5000,
+        "large_amount": 20000,
+        "telegram_chat": "me"
+    }
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+from dedup_index import transaction_key
+from message_parser import DEFAULT_CATEGORY
+from store_io import atomic_write
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ('day', 'week', 'month')
+PERIOD_NAMES = {'day': 'день', 'week': 'неделю', 'month': 'месяц'}
+
+# Share of a budget at which a warning is raised before it is exceeded
+DEFAULT_WARN_AT = 0.8
+# The alert log is trimmed to its newer half once it grows past this size
+MAX_ALERT_LOG_BYTES = 256 * 1024
+
+
+def alerts_path(transactions_file: str) -> str:
+    return os.path.splitext(transactions_file)[0] + '.alerts'
+
+
+def window_start(moment: datetime, period: str) -> datetime:
+    """Start of the day, week (Monday) or month containing moment"""
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def local_time(value) -> Optional[datetime]:
+    """Naive local time of an ISO date (Telegram dates are UTC-aware)"""
+    try:
+        moment = datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def _money(amount: float) -> str:
+    return f"{amount:,.0f}".replace(',', ' ') + ' ₽'
+
+
+class Budget:
+    """Spending limit for one category (or all expenses) per period"""
+
+    def __init__(self, limit: float, period: str = 'month', category: Optional[str] = None, kind: str = 'budget'):
+        if period not in PERIODS:
+            raise ValueError(f"Unknown budget period '{period}', expected one of {', '.join(PERIODS)}")
+        self.limit = float(limit)
+        self.period = period
+        self.category = category
+        self.kind = kind
+        self.start: Optional[datetime] = None
+        self.total = 0.0
+        self.fired = set()
+
+    def covers(self, category: str, moment: datetime) -> bool:
+        return moment >= self.start and (self.category is None or self.category == category)
+
+    def message(self, level: str) -> str:
+        if self.kind == 'daily_cap':
+            what = 'Дневной лимит расходов'
+        else:
+            what = f"Бюджет «{self.category or 'все расходы'}» на {PERIOD_NAMES[self.period]}"
+        state = 'превышен' if level == 'exceeded' else f"израсходован на {self.total / self.limit:.0%}"
+        return f"{what} {state}: {_money(self.total)} из {_money(self.limit)}"
+
+
+class AlertEngine:
+    """
+    Incremental evaluator of the alert rules.
+
+    Rows are tracked by (group_id, message_id) while they fall in a current
+    window, so edits and deletions take back exactly what the row added.
+    Each budget level fires at most once per window.
+
+    Args:
+        budgets: Budget rules
+        large_amount (float): Single expenses from this amount raise an alert
+        warn_at (float): Share of a budget that raises a warning (0 disables warnings)
+        clock: Returns the current local time
+    """
+
+    def __init__(self, budgets: Iterable[Budget] = (), large_amount: Optional[float] = None,
+                 warn_at: float = DEFAULT_WARN_AT, clock: Callable[[], datetime] = datetime.now):
+        self.budgets = list(budgets)
+        self.large_amount = large_amount
+        self.warn_at = warn_at
+        self.clock = clock
+        self.source: Optional[List[int]] = None
+        self._rows: Dict[Tuple[str, str], Tuple[datetime, str, float]] = {}
+        self._horizon: Optional[datetime] = None
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional['AlertEngine']:
+        """Engine for the config's alert rules, or None if there are none or notifications are off"""
+        rules = config.get('alerts')
+        if not rules or not config.get('notifications', True):
+            return None
+        budgets = [Budget(item['limit'], item.get('period', 'month'), item.get('category'))
+                   for item in rules.get('budgets', [])]
+        if rules.get('daily_expense_cap'):
+            budgets.append(Budget(rules['daily_expense_cap'], 'day', kind='daily_cap'))
+        return cls(budgets, rules.get('large_amount'), rules.get('warn_at', DEFAULT_WARN_AT))
+
+    def seed(self, rows: Iterable[Dict], source: Optional[List[int]] = None):
+        """
+        Rebuild the running totals from store rows without raising alerts.
+
+        Levels already reached are marked as fired, so a restart does not repeat them.
+        """
+        self._rows.clear()
+        self._horizon = None
+        for budget in self.budgets:
+            budget.start = None
+        self._roll(self.clock())
+        for row in rows:
+            self._track(transaction_key(row.get('group_id'), row.get('id')), row)
+        self._check()
+        self.source = source
+
+    def apply(self, changes: List[Dict], source: Optional[List[int]] = None) -> List[Dict]:
+        """
+        Account one store write and return the alerts it raises.
+
+        Args:
+            changes: Change journal entries of the write (upserts with unified rows, deletions)
+            source: Store file signature after the write
+        """
+        now = self.clock()
+        self._roll(now)
+        alerts = []
+        for change in changes:
+            key = tuple(change['key'])
+            previous = self._untrack(key)
+            if change['op'] != 'upsert':
+                continue
+            row = change['row']
+            entry = self._track(key, row)
+            if (entry and previous is None and self.large_amount and entry[2] >= self.large_amount and
+                    entry[0] >= window_start(now, 'day')):
+                alerts.append(self._alert('large_amount', 'warning',
+                                          f"Крупный расход: {_money(entry[2])} — {row.get('description', '')[:50]}",
+                                          category=entry[1], amount=entry[2]))
+        alerts.extend(self._check())
+        self.source = source
+        return alerts
+
+    def _roll(self, now: datetime):
+        # Start new windows for budgets whose period ended and forget rows no window covers
+        rolled = []
+        for budget in self.budgets:
+            start = window_start(now, budget.period)
+            if budget.start != start:
+                budget.start = start
+                budget.total = 0.0
+                budget.fired.clear()
+                rolled.append(budget)
+        if not rolled and self._horizon is not None:
+            return
+        self._horizon = min([budget.start for budget in self.budgets] + [window_start(now, 'day')])
+        for key in [key for key, entry in self._rows.items() if entry[0] < self._horizon]:
+            del self._rows[key]
+        # Rows already dated in a new window (e.g. just after midnight) count towards it
+        for entry in self._rows.values():
+            self._add(entry, 1, rolled)
+
+    def _add(self, entry: Tuple[datetime, str, float], sign: int, budgets: Optional[List[Budget]] = None):
+        moment, category, amount = entry
+        for budget in self.budgets if budgets is None else budgets:
+            if budget.covers(category, moment):
+                budget.total += sign * amount
+
+    def _track(self, key: Tuple[str, str], row: Dict) -> Optional[Tuple[datetime, str, float]]:
+        if row.get('type') != 'expense':
+            return None
+        moment = local_time(row.get('date'))
+        if moment is None:
+            return None
+        entry = (moment, row.get('category', DEFAULT_CATEGORY), float(row.get('amount') or 0))
+        if moment >= self._horizon:
+            self._rows[key] = entry
+            self._add(entry, 1)
+        return entry
+
+    def _untrack(self, key: Tuple[str, str]) -> Optional[Tuple[datetime, str, float]]:
+        entry = self._rows.pop(key, None)
+        if entry is not None:
+            self._add(entry, -1)
+        return entry
+
+    def _check(self) -> List[Dict]:
+        alerts = []
+        for budget in self.budgets:
+            if budget.limit <= 0:
+                continue
+            share = budget.total / budget.limit
+            if share >= 1:
+                level = 'exceeded'
+            elif self.warn_at and share >= self.warn_at:
+                level = 'warning'
+            else:
+                continue
+            if level in budget.fired:
+                continue
+            budget.fired.update(('warning', level))
+            alerts.append(self._alert(budget.kind, 'error' if level == 'exceeded' else 'warning',
+                                      budget.message(level), category=budget.category, period=budget.period,
+                                      limit=budget.limit, total=round(budget.total, 2)))
+        return alerts
+
+    def _alert(self, kind: str, level: str, message: str, **details) -> Dict:
+        metrics.ALERTS_FIRED.labels(kind=kind).inc()
+        return {'kind': kind, 'level': level, 'message': message, 'time': self.clock().isoformat(), **details}
+
+
+class AlertLog:
+    """
+    Append-only log of raised alerts, read by the web app.
+
+    Writers must hold the store lock while appending.
+
+    Args:
+        path (str): Log file location
+        max_bytes (int): Size at which the log is trimmed
+    """
+
+    def __init__(self, path: str, max_bytes: int = MAX_ALERT_LOG_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def read_since(self, seq: int = 0) -> List[Dict]:
+        """Alerts newer than seq, oldest first"""
+        if not os.path.exists(self.path):
+            return []
+        alerts = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    alert = json.loads(line)
+                except ValueError:
+                    continue
+                if alert.get('seq', 0) > seq:
+                    alerts.append(alert)
+        return alerts
+
+    def last_seq(self) -> int:
+        alerts = self.read_since(0)
+        return alerts[-1]['seq'] if alerts else 0
+
+    def append(self, alerts: List[Dict]) -> List[Dict]:
+        """Number the alerts after the newest logged one and append them"""
+        seq = self.last_seq()
+        numbered = []
+        for alert in alerts:
+            seq += 1
+            numbered.append({'seq': seq, **alert})
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(alert, ensure_ascii=False) + '\n' for alert in numbered))
+        if os.path.getsize(self.path) > self.max_bytes:
+            with open(self.path, 'rb') as f:
+                lines = f.readlines()
+            atomic_write(self.path, b''.join(lines[len(lines) // 2:]))
+        return numbered
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Analytics
+Summary and breakdown aggregations over the transaction store. When the store
+was loaded from the binary snapshot the aggregations run with NumPy directly
+on its memory-mapped columns, so no per-row Python objects are created;
+otherwise (or without NumPy) they fall back to iterating the row dicts.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+from snapshot import TYPES, Snapshot, SnapshotRows, to_epoch
+
+logger = logging.getLogger(__name__)
+
+BREAKDOWNS = ('category', 'group', 'month')
+
+
+def numpy_or_none():
+    """NumPy, imported on first use so app startup does not pay for it; None if unavailable"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def columnar_source(transactions: Sequence) -> Optional[Snapshot]:
+    """The snapshot backing transactions, if the columnar path can be used"""
+    if isinstance(transactions, SnapshotRows) and numpy_or_none() is not None:
+        return transactions.snapshot
+    return None
+
+
+def summarize(transactions: Sequence) -> Dict:
+    """Income/expense totals and counts"""
+    snapshot = columnar_source(transactions)
+    if snapshot is not None:
+        np = numpy_or_none()
+        amount = snapshot.array('amount')
+        types = snapshot.array('type')
+        income = types == TYPES.index('income')
+        expense = types == TYPES.index('expense')
+        total_income = float(amount[income].sum())
+        total_expense = float(amount[expense].sum())
+        income_count = int(np.count_nonzero(income))
+        expense_count = int(np.count_nonzero(expense))
+    else:
+        total_income = sum(t['amount'] for t in transactions if t['type'] == 'income')
+        total_expense = sum(t['amount'] for t in transactions if t['type'] == 'expense')
+        income_count = len([t for t in transactions if t['type'] == 'income'])
+        expense_count = len([t for t in transactions if t['type'] == 'expense'])
+
+    return {
+        'total_income': total_income,
+        'total_expense': total_expense,
+        'balance': total_income - total_expense,
+        'income_count': income_count,
+        'expense_count': expense_count,
+        'total_count': len(transactions)
+    }
+
+
+def _month(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m')
+
+
+def breakdown(transactions: Sequence, by: str = 'category', transaction_type: Optional[str] = None) -> List[Dict]:
+    """
+    Total amount and count per category, group or month, largest first (months in order).
+
+    Args:
+        transactions: Store rows
+        by (str): One of BREAKDOWNS
+        transaction_type (str): Only count 'income' or 'expense' rows
+    """
+    if by not in BREAKDOWNS:
+        raise ValueError(f"Unknown breakdown '{by}', expected one of {', '.join(BREAKDOWNS)}")
+
+    snapshot = columnar_source(transactions)
+    if snapshot is not None:
+        result = _breakdown_columns(snapshot, by, transaction_type)
+    else:
+        result = _breakdown_rows(transactions, by, transaction_type)
+
+    if by == 'month':
+        return sorted(result, key=lambda item: item['key'])
+    return sorted(result, key=lambda item: item['amount'], reverse=True)
+
+
+def _breakdown_columns(snapshot: Snapshot, by: str, transaction_type: Optional[str]) -> List[Dict]:
+    np = numpy_or_none()
+    amount = snapshot.array('amount')
+    mask = None
+    if transaction_type:
+        mask = snapshot.array('type') == TYPES.index(transaction_type)
+        amount = amount[mask]
+
+    if by == 'month':
+        epoch = snapshot.array('epoch')
+        if mask is not None:
+            epoch = epoch[mask]
+        # Months since 1970 as small ints, so the grouping is a bincount instead of a sort
+        months = epoch.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+        first = int(months.min()) if len(months) else 0
+        codes = months - first
+        keys = [str(np.datetime64(first + offset, 'M')) for offset in range(int(codes.max()) + 1 if len(codes) else 0)]
+    else:
+        codes = snapshot.array(by)
+        if mask is not None:
+            codes = codes[mask]
+        if by == 'category':
+            keys = snapshot.categories
+        else:
+            keys = [group_name for _, group_name in snapshot.groups]
+        group_ids = [group_id for group_id, _ in snapshot.groups]
+
+    totals = np.bincount(codes, weights=amount, minlength=len(keys))
+    counts = np.bincount(codes, minlength=len(keys))
+    result = []
+    for code in np.flatnonzero(counts):
+        item = {'key': keys[code], 'amount': float(totals[code]), 'count': int(counts[code])}
+        if by == 'group':
+            item['group_id'] = group_ids[code]
+        result.append(item)
+    return result
+
+
+def _breakdown_rows(transactions: Sequence, by: str, transaction_type: Optional[str]) -> List[Dict]:
+    totals: Dict = defaultdict(lambda: {'amount': 0, 'count': 0})
+    for t in transactions:
+        if transaction_type and t['type'] != transaction_type:
+            continue
+        if by == 'month':
+            key = (_month(to_epoch(t.get('date'))),)
+        elif by == 'group':
+            key = (t.get('group_name', 'Unknown'), t.get('group_id', ''))
+        else:
+            key = (t.get('category', 'другое'),)
+        totals[key]['amount'] += t['amount']
+        totals[key]['count'] += 1
+
+    result = []
+    for key, total in totals.items():
+        item = {'key': key[0], 'amount': float(total['amount']), 'count': total['count']}
+        if by == 'group':
+            item['group_id'] = key[1]
+        result.append(item)
+    return result
@@ -4,6 +4,11 @@ Telegram Financial Agent - Flask Web Application
 Integrated with real Telegram data parsing
 """
 
+import time
+
+# Startup timing covers the imports below
+IMPORT_STARTED = time.perf_counter()
+
 import asyncio
 import json
 import logging
@@ -13,16 +18,31 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional
 
-from flask import Flask, jsonify, render_template, request
+from flask import Blueprint, Flask, Response, abort, g, jsonify, render_template, request
 
-# Import our Telegram parser
-from telegram_parser import TelegramFinancialParser
+import analytics
+import columnar
+import export
+import metrics
+from alerts import AlertLog, alerts_path
+from assets import ASSETS, accepts_encoding
+from change_journal import ChangeJournal, apply_batches, journal_path
+from dedup_index import transaction_key
+from leader import LeaderElection
+from profiling import PROFILER
+from response_cache import RESPONSE_CACHE
+from scheduler import SCHEDULER
+from snapshot import file_signature, load_snapshot, unify_transactions
+from store_io import write_json
+from workspaces import DEFAULT_WORKSPACE, WorkspaceRegistry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+# static/ is served by static_asset (fingerprinted, precompressed) instead of Flask's static route
+app = Flask(__name__, static_folder=None)
+app.jinja_env.globals['asset_url'] = ASSETS.url
 
 # Try to import flask_cors, but continue if it's not available
 try:
@@ -31,65 +51,182 @@ try:
 except ImportError:
     print("Warning: flask_cors not available, CORS support disabled")
 
+# Seconds a store change may stay unjournaled before it is treated as a foreign rewrite
+JOURNAL_GRACE_SECONDS = 2.0
+
 class FinancialAgentApp:
-    def __init__(self):
-        self.parser = TelegramFinancialParser('config.json')
+    def __init__(self, config_path: str = 'config.json', transactions_file: str = 'transactions.json',
+                 workspace_id: str = DEFAULT_WORKSPACE, base_dir: Optional[str] = None):
+        self.workspace_id = workspace_id
+        self.config_path = config_path
+        self.transactions_file = transactions_file
+        self.base_dir = base_dir
+        self.parser = None
+        self.election = None
         self.transactions = []
         self.is_parsing = False
         self.last_update = None
-        self.load_existing_data()
+        self.startup_seconds = None
+        self.version = 0
+        self.generation = 0
+        self._store_signature = None
+        self._refresh_lock = threading.Lock()
+        self._journal = ChangeJournal(journal_path(transactions_file))
+        self._alerts = AlertLog(alerts_path(transactions_file))
+        self._rows_by_key: Optional[Dict] = None
+        self._summary: Optional[Dict] = None
+        self._pending_since: Optional[float] = None
         
-        # Start background parsing thread
-        self.start_background_parsing()
+        # Load the store and start the parser off the import path so the server answers immediately
+        self.ready = threading.Event()
+        threading.Thread(target=self.warm_up, name=f'warm-up-{workspace_id}', daemon=True).start()
+    
+    def warm_up(self):
+        """Import the parser (and Telethon), load the store and join the leader election"""
+        started = time.perf_counter()
+        try:
+            from telegram_parser import TelegramFinancialParser
+            self.parser = TelegramFinancialParser(self.config_path, base_dir=self.base_dir, workspace=self.workspace_id)
+            parser_loaded = time.perf_counter()
+            
+            self.load_existing_data()
+            store_loaded = time.perf_counter()
+            
+            # Only the worker holding the parser lock talks to Telegram; the others serve reads
+            self.election = LeaderElection(
+                self.parser.data_path('parser.lock'),
+                on_elected=self.start_background_parsing,
+                on_tick=self.check_update_request
+            )
+            self.startup_seconds = time.perf_counter() - started
+            self.ready.set()
+            logger.info(f"Workspace {self.workspace_id} ready in {self.startup_seconds:.3f}s "
+                        f"(parser {parser_loaded - started:.3f}s, store {store_loaded - parser_loaded:.3f}s, "
+                        f"{len(self.transactions)} transactions)")
+            self.election.start()
+        except Exception as e:
+            logger.error(f"Error starting workspace {self.workspace_id}: {e}")
+    
+    @property
+    def status(self) -> str:
+        return 'ready' if self.ready.is_set() else 'warming'
+    
+    def _read_store_signature(self):
+        return file_signature(self.transactions_file)
+    
+    def refresh_if_changed(self) -> bool:
+        """
+        Pick up store changes made by another process (the leader, run_parser.py).
+        
+        Changes recorded in the change journal are applied row by row; the file
+        is reloaded only when the journal does not cover the change (another
+        tool rewrote it) or the rows are served from the snapshot.
+        """
+        if not self.needs_refresh():
+            return False
+        with self._refresh_lock:
+            signature = self._read_store_signature()
+            if signature == self._store_signature:
+                return False
+            
+            batches = self._journal.read_since(self.version)
+            if not batches or batches[-1]['after'] != signature:
+                # Either a parser is between writing the file and journaling it, or a tool that
+                # does not journal rewrote the file; give the former a moment before reloading
+                if self._pending_since is None:
+                    self._pending_since = time.monotonic()
+                if time.monotonic() - self._pending_since < JOURNAL_GRACE_SECONDS:
+                    return False
+                self.load_existing_data()
+            elif (isinstance(self.transactions, list) and
+                  ChangeJournal.is_chain(batches, self.version, self._store_signature, signature)):
+                self.apply_changes(batches)
+                self._store_signature = signature
+            else:
+                self.load_existing_data()
+            
+            self._pending_since = None
+            if signature is not None:
+                self.last_update = datetime.fromtimestamp(signature[0] / 1e9)
+        return True
+    
+    @property
+    def data_version(self):
+        """Changes whenever the rows (or the last update time shown with them) change; keys cached responses"""
+        return (self.generation, self.last_update)
+    
+    def needs_refresh(self) -> bool:
+        """True if the store file changed since it was loaded (a stat, cheap enough for every request)"""
+        return self.ready.is_set() and self._read_store_signature() != self._store_signature
+    
+    def apply_changes(self, batches: List[Dict]):
+        """Apply journaled row changes to the in-memory rows and the running summary"""
+        if self._rows_by_key is None:
+            self._rows_by_key = {transaction_key(t.get('group_id'), t.get('id')): t for t in self.transactions}
+        summary = self._summary
+        
+        def account(old: Optional[Dict], new: Optional[Dict]):
+            if summary is None:
+                return
+            for row, sign in ((old, -1), (new, 1)):
+                if row is not None and row.get('type') in ('income', 'expense'):
+                    summary[f"total_{row['type']}"] += sign * row['amount']
+                    summary[f"{row['type']}_count"] += sign
+                    summary['total_count'] += sign
+        
+        # Ordered like a reload of the store, so patched and reloaded pages match
+        transactions = apply_batches(self.transactions, self._rows_by_key, batches, account)
+        self.version = batches[-1]['seq']
+        
+        if summary is not None:
+            summary['balance'] = summary['total_income'] - summary['total_expense']
+        self.transactions = transactions
+        self.generation += 1
+        metrics.STORE_SIZE.labels(workspace=self.workspace_id).set(len(self.transactions))
+        logger.info(f"Applied {sum(len(batch['changes']) for batch in batches)} journaled changes "
+                    f"(store version {self.version})")
+    
+    def changes_since(self, version: int) -> Optional[List[Dict]]:
+        """Journaled row changes after version, or None if the client has to reload everything"""
+        if version == self.version:
+            return []
+        batches = [batch for batch in self._journal.read_since(version) if batch['seq'] <= self.version]
+        if not batches or batches[0]['seq'] != version + 1 or batches[-1]['seq'] != self.version:
+            return None
+        return [change for batch in batches for change in batch['changes']]
+    
+    def get_alerts(self, since: int = 0) -> Dict:
+        """Alerts the parser raised after sequence number since (the log keeps the recent ones)"""
+        alerts = self._alerts.read_since(since)
+        return {
+            'alerts': alerts,
+            'last_seq': alerts[-1]['seq'] if alerts else max(since, 0)
+        }
     
     def load_existing_data(self):
         """Load existing transactions from file in ParserQ format"""
         try:
-            transactions_file = Path('transactions.json')
-            if transactions_file.exists():
+            # Read the journal position first: a write landing in between shows up as a broken chain
+            version = self._journal.last_seq()
+            self._store_signature = self._read_store_signature()
+            self.version = version
+            self._rows_by_key = None
+            self._summary = None
+            transactions_file = Path(self.transactions_file)
+            snapshot = load_snapshot(self.transactions_file)
+            if snapshot is not None:
+                # Binary snapshot of the same version: columns only, rows decoded on access
+                self.transactions = snapshot.rows()
+                logger.info(f"Loaded {snapshot.count} transactions from snapshot")
+            elif transactions_file.exists():
                 with open(transactions_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                 
                 # Handle both old and new formats
+                self.transactions = unify_transactions(data)
                 if isinstance(data, dict):
-                    # New format with separate income and expense arrays
-                    income_transactions = data.get('income', [])
-                    expense_transactions = data.get('expense', [])
-                    
-                    # Convert to unified format
-                    unified_transactions = []
-                    
-                    # Process income transactions
-                    for t in income_transactions:
-                        unified_transactions.append({
-                            'id': str(t.get('id', '')),
-                            'amount': t.get('amount', 0),
-                            'type': 'income',
-                            'description': t.get('description', t.get('text', '')),
-                            'category': 'другое',  # Default category
-                            'date': t.get('timestamp', t.get('date', datetime.now().isoformat())),
-                            'group_id': t.get('group_id', ''),
-                            'group_name': t.get('group_name', 'Unknown')
-                        })
-                    
-                    # Process expense transactions
-                    for t in expense_transactions:
-                        unified_transactions.append({
-                            'id': str(t.get('id', '')),
-                            'amount': t.get('amount', 0),
-                            'type': 'expense',
-                            'description': t.get('description', t.get('text', '')),
-                            'category': 'другое',  # Default category
-                            'date': t.get('timestamp', t.get('date', datetime.now().isoformat())),
-                            'group_id': t.get('group_id', ''),
-                            'group_name': t.get('group_name', 'Unknown')
-                        })
-                    
-                    self.transactions = unified_transactions
-                    logger.info(f"Loaded {len(income_transactions)} income and {len(expense_transactions)} expense transactions")
+                    logger.info(f"Loaded {len(data.get('income', []))} income and {len(data.get('expense', []))} expense transactions")
                 else:
-                    # Old format - list of transactions
-                    self.transactions = data
                     logger.info(f"Loaded {len(data)} existing transactions")
             else:
                 logger.info("No existing transactions file found")
@@ -97,22 +234,22 @@ class FinancialAgentApp:
         except Exception as e:
             logger.error(f"Error loading existing data: {e}")
             self.transactions = []
+        
+        self.generation += 1
+        metrics.STORE_SIZE.labels(workspace=self.workspace_id).set(len(self.transactions))
     
     def start_background_parsing(self):
-        """Start background parsing in a separate thread"""
-        def parse_worker():
+        """Start background parsing on the scheduler loop shared by all workspaces"""
+        async def parse_worker():
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
                 self.is_parsing = True
-                logger.info("Starting background Telegram parsing...")
+                logger.info(f"Starting background Telegram parsing for workspace {self.workspace_id}...")
                 
-                success = loop.run_until_complete(self.parser.start_parsing())
+                success = await self.parser.start_parsing()
                 
                 if success:
-                    # Reload transactions after parsing
-                    self.load_existing_data()
+                    # Pick up the new rows, off the loop so other workspaces keep parsing
+                    await asyncio.get_running_loop().run_in_executor(None, self.refresh_if_changed)
                     self.last_update = datetime.now()
                     logger.info("Background parsing completed successfully")
                 else:
@@ -124,35 +261,220 @@ class FinancialAgentApp:
                 logger.error(f"Error in background parsing: {e}")
                 self.is_parsing = False
         
-        # Start parsing thread only if not already parsing
+        # Start parsing only if not already parsing
         if not self.is_parsing:
-            thread = threading.Thread(target=parse_worker, daemon=True)
-            thread.start()
+            SCHEDULER.submit(parse_worker())
     
     def force_update(self):
         """Force immediate data update"""
+        if not self.ready.is_set():
+            return False
+        
+        if not self.election.is_leader:
+            # Hand the request to the leader, which checks for it on its next tick
+            Path(self.parser.data_path('update.request')).touch()
+            return True
+        
         # Always start parsing, even if already parsing (will be queued)
         self.start_background_parsing()
         return True
     
+    def check_update_request(self):
+        """Run a parse requested by a follower worker"""
+        request_file = Path(self.parser.data_path('update.request'))
+        if request_file.exists():
+            request_file.unlink()
+            logger.info(f"Update requested by a follower worker for workspace {self.workspace_id}")
+            self.start_background_parsing()
+    
     def get_transactions_summary(self) -> Dict:
         """Get transactions summary statistics"""
-        total_income = sum(t['amount'] for t in self.transactions if t['type'] == 'income')
-        total_expense = sum(t['amount'] for t in self.transactions if t['type'] == 'expense')
+        if self._summary is None:
+            self._summary = analytics.summarize(self.transactions)
+        summary = dict(self._summary)
+        summary['last_update'] = self.last_update.isoformat() if self.last_update else None
+        return summary
+    
+    def get_transactions(self, limit: Optional[int] = None, offset: int = 0,
+                         transaction_type: Optional[str] = None, wire_format: Optional[str] = None) -> Dict:
+        """
+        One page of transactions with the store size and version.
+        
+        With wire_format='columnar' the page is encoded by columnar.encode_transactions
+        instead of as a list of row objects.
+        """
+        if wire_format == columnar.FORMAT:
+            data = columnar.encode_transactions(self.transactions, limit, offset, transaction_type)
+            return {
+                'format': columnar.FORMAT,
+                'data': data,
+                'total': len(self.transactions),
+                'filtered': data['count'],
+                'version': self.version
+            }
+        if wire_format not in (None, '', 'rows'):
+            raise ValueError(f"Unknown format '{wire_format}', expected 'rows' or '{columnar.FORMAT}'")
+        
+        filtered_transactions = self.transactions
+        
+        if transaction_type:
+            filtered_transactions = [t for t in filtered_transactions if t['type'] == transaction_type]
+        
+        # Apply pagination
+        if limit:
+            filtered_transactions = filtered_transactions[offset:offset + limit]
+        else:
+            filtered_transactions = filtered_transactions[offset:]
+        
+        return {
+            'data': filtered_transactions,
+            'total': len(self.transactions),
+            'filtered': len(filtered_transactions),
+            'version': self.version
+        }
+    
+    def get_last_update(self) -> Dict:
+        return {
+            'last_update': self.last_update.isoformat() if self.last_update else None,
+            'transaction_count': len(self.transactions),
+            'is_parsing': self.is_parsing
+        }
+    
+    def get_status(self) -> Dict:
+        return {
+            'is_parsing': self.is_parsing,
+            'last_update': self.last_update.isoformat() if self.last_update else None,
+            'transaction_count': len(self.transactions),
+            'workspace': self.workspace_id,
+            'status': self.status,
+            'role': self.election.role if self.election else None,
+            'startup_seconds': self.startup_seconds,
+            'cache': RESPONSE_CACHE.stats(self.workspace_id),
+            'parse_cache': self.parser.parse_cache.stats() if self.parser else None,
+            'ingest': self.parser.ingest.stats() if self.parser and self.parser.ingest is not None else None,
+            'server_time': datetime.now().isoformat()
+        }
+    
+    def get_settings(self) -> Optional[Dict]:
+        """Settings safe to show in the UI (without credentials); None if there is no config file"""
+        config_path = Path(self.config_path)
+        if not config_path.exists():
+            return None
+        
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
         
         return {
-            'total_income': total_income,
-            'total_expense': total_expense,
-            'balance': total_income - total_expense,
-            'income_count': len([t for t in self.transactions if t['type'] == 'income']),
-            'expense_count': len([t for t in self.transactions if t['type'] == 'expense']),
-            'total_count': len(self.transactions),
-            'last_update': self.last_update.isoformat() if self.last_update else None
+            'currency': config.get('currency', 'RUB'),
+            'notifications': config.get('notifications', True),
+            'auto_update': config.get('auto_update', True),
+            'update_interval': config.get('update_interval', 30),
+            'group_ids': config.get('group_ids', [])
         }
+    
+    def update_settings(self, new_settings: Dict):
+        """Merge new settings into the config file"""
+        config_path = Path(self.config_path)
+        if config_path.exists():
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        else:
+            config = {}
+        
+        # Update config with new settings
+        config.update(new_settings)
+        
+        # Save updated config
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=4, ensure_ascii=False)
+    
+    def clear_data(self):
+        """Empty the transaction store"""
+        transactions_file = Path(self.transactions_file)
+        if transactions_file.exists():
+            # Create empty structure
+            empty_data = {"income": [], "expense": []}
+            write_json(str(transactions_file), empty_data)
+        
+        # Update app state
+        self.load_existing_data()
+        self.last_update = datetime.now()
 
 # Initialize the app
 financial_app = FinancialAgentApp()
 
+def _load_workspaces_dir() -> str:
+    try:
+        with open('config.json', 'r', encoding='utf-8') as f:
+            return json.load(f).get('workspaces_dir', 'workspaces')
+    except Exception:
+        return 'workspaces'
+
+# Additional ledgers served by this process, one directory per workspace
+workspaces = WorkspaceRegistry(
+    os.environ.get('FINANCE_AGENT_WORKSPACES', _load_workspaces_dir()),
+    lambda workspace_id, config_path, transactions_file, base_dir: FinancialAgentApp(
+        config_path, transactions_file, workspace_id, base_dir),
+    default=financial_app
+)
+
+# API routes, served for the default workspace under / and for every
+# workspace under /w/<workspace_id>/
+api = Blueprint('api', __name__)
+
+@api.url_value_preprocessor
+def pull_workspace_id(endpoint, values):
+    g.workspace_id = values.pop('workspace_id', DEFAULT_WORKSPACE) if values else DEFAULT_WORKSPACE
+
+@api.before_request
+def resolve_workspace():
+    g.workspace = workspaces.get(g.workspace_id)
+    if g.workspace is None:
+        return jsonify({
+            'success': False,
+            'error': f"Workspace '{g.workspace_id}' not found"
+        }), 404
+    g.workspace.refresh_if_changed()
+
+def current_workspace() -> FinancialAgentApp:
+    """App state of the workspace addressed by the current request"""
+    return g.get('workspace') or financial_app
+
+def cached_json(endpoint: str, build) -> Response:
+    """JSON response for the current request, served from the response cache while the data is unchanged"""
+    workspace = current_workspace()
+    body = RESPONSE_CACHE.get_or_compute(
+        workspace.workspace_id, endpoint, request.args.items(multi=True), workspace.data_version,
+        # Compact, like the jsonify responses of the uncached endpoints
+        lambda: app.json.dumps(build(), separators=(',', ':')).encode('utf-8')
+    )
+    return Response(body, content_type='application/json')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if PROFILER.enabled:
+        g.profile_session = PROFILER.start(f"{request.method} {request.path}")
+
+@app.teardown_request
+def stop_request_profile(exc):
+    session = g.pop('profile_session', None)
+    if session is not None:
+        session.stop()
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.API_REQUEST_SECONDS.labels(route=route, method=request.method).observe(time.perf_counter() - started)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose metrics in Prometheus text format"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/')
 def index():
     """Serve the main application"""
@@ -200,32 +522,64 @@ def telegram_app():
     """Serve the Telegram Mini App version"""
     return render_template('telegram_index.html')
 
-@app.route('/api/transactions')
-def api_transactions():
-    """Get all transactions"""
+@app.route('/w/<workspace_id>/')
+def workspace_index(workspace_id):
+    """Serve the main application for a workspace"""
+    if not workspaces.exists(workspace_id):
+        return jsonify({'success': False, 'error': f"Workspace '{workspace_id}' not found"}), 404
+    return render_template('index.html', api_base=f'/w/{workspace_id}')
+
+@app.route('/w/<workspace_id>/telegram')
+def workspace_telegram_app(workspace_id):
+    """Serve the Telegram Mini App version for a workspace"""
+    if not workspaces.exists(workspace_id):
+        return jsonify({'success': False, 'error': f"Workspace '{workspace_id}' not found"}), 404
+    return render_template('telegram_index.html', api_base=f'/w/{workspace_id}')
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+def api_admin_profiling():
+    """Get or change the on-demand profiling settings"""
+    admin_token = os.environ.get('FINANCE_AGENT_ADMIN_TOKEN')
+    # Without a configured token the endpoint stays closed
+    if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+        return jsonify({
+            'success': False,
+            'error': 'Forbidden'
+        }), 403
+    
     try:
-        # Get query parameters
-        limit = request.args.get('limit', type=int)
-        offset = request.args.get('offset', type=int, default=0)
-        transaction_type = request.args.get('type')
-        
-        # Filter transactions
-        filtered_transactions = financial_app.transactions
-        
-        if transaction_type:
-            filtered_transactions = [t for t in filtered_transactions if t['type'] == transaction_type]
-        
-        # Apply pagination
-        if limit:
-            filtered_transactions = filtered_transactions[offset:offset + limit]
-        else:
-            filtered_transactions = filtered_transactions[offset:]
+        if request.method == 'POST':
+            settings = request.get_json(silent=True) or {}
+            PROFILER.configure(
+                enabled=settings.get('enabled'),
+                sample_rate=settings.get('sample_rate'),
+                top_n=settings.get('top_n')
+            )
         
         return jsonify({
             'success': True,
-            'data': filtered_transactions,
-            'total': len(financial_app.transactions),
-            'filtered': len(filtered_transactions)
+            'data': PROFILER.status()
+        })
+    except Exception as e:
+        logger.error(f"Error in api_admin_profiling: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@api.route('/api/transactions')
+def api_transactions():
+    """Get all transactions"""
+    workspace = current_workspace()
+    try:
+        return cached_json('transactions', lambda: {
+            'success': True,
+            **workspace.get_transactions(
+                limit=request.args.get('limit', type=int),
+                offset=request.args.get('offset', type=int, default=0),
+                transaction_type=request.args.get('type'),
+                wire_format=request.args.get('format')
+            )
         })
     
     except Exception as e:
@@ -236,37 +590,82 @@ def api_transactions():
             'data': []
         })
 
-@app.route('/api/transactions/income')
+@api.route('/api/changes')
+def api_changes():
+    """Get row changes (upserts and deletions keyed by [group_id, id]) since a store version"""
+    workspace = current_workspace()
+    try:
+        since = request.args.get('since', type=int, default=0)
+        changes = workspace.changes_since(since)
+        return jsonify({
+            'success': True,
+            'data': {
+                'version': workspace.version,
+                'reset': changes is None,
+                'changes': changes or []
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error in api_changes: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@api.route('/api/alerts')
+def api_alerts():
+    """Get budget and large-expense alerts raised after a sequence number"""
+    workspace = current_workspace()
+    try:
+        return jsonify({
+            'success': True,
+            'data': workspace.get_alerts(request.args.get('since', type=int, default=0))
+        })
+    except Exception as e:
+        logger.error(f"Error in api_alerts: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@api.route('/api/transactions/income')
 def api_transactions_income():
     """Get income transactions only"""
-    income_transactions = [t for t in financial_app.transactions if t['type'] == 'income']
-    return jsonify({
-        'success': True,
-        'data': income_transactions,
-        'count': len(income_transactions)
-    })
+    workspace = current_workspace()
+    
+    def build():
+        income_transactions = [t for t in workspace.transactions if t['type'] == 'income']
+        return {
+            'success': True,
+            'data': income_transactions,
+            'count': len(income_transactions)
+        }
+    
+    return cached_json('transactions/income', build)
 
-@app.route('/api/transactions/expense')
+@api.route('/api/transactions/expense')
 def api_transactions_expense():
     """Get expense transactions only"""
-    expense_transactions = [t for t in financial_app.transactions if t['type'] == 'expense']
-    return jsonify({
-        'success': True,
-        'data': expense_transactions,
-        'count': len(expense_transactions)
-    })
+    workspace = current_workspace()
+    
+    def build():
+        expense_transactions = [t for t in workspace.transactions if t['type'] == 'expense']
+        return {
+            'success': True,
+            'data': expense_transactions,
+            'count': len(expense_transactions)
+        }
+    
+    return cached_json('transactions/expense', build)
 
-@app.route('/api/transactions/last-update')
+@api.route('/api/transactions/last-update')
 def api_transactions_last_update():
     """Get timestamp of last data update"""
+    workspace = current_workspace()
     try:
         return jsonify({
             'success': True,
-            'data': {
-                'last_update': financial_app.last_update.isoformat() if financial_app.last_update else None,
-                'transaction_count': len(financial_app.transactions),
-                'is_parsing': financial_app.is_parsing
-            }
+            'data': workspace.get_last_update()
         })
     except Exception as e:
         logger.error(f"Error in api_transactions_last_update: {e}")
@@ -275,14 +674,14 @@ def api_transactions_last_update():
             'error': str(e)
         })
 
-@app.route('/api/summary')
+@api.route('/api/summary')
 def api_summary():
     """Get transactions summary"""
+    workspace = current_workspace()
     try:
-        summary = financial_app.get_transactions_summary()
-        return jsonify({
+        return cached_json('summary', lambda: {
             'success': True,
-            'data': summary
+            'data': workspace.get_transactions_summary()
         })
     except Exception as e:
         logger.error(f"Error in api_summary: {e}")
@@ -291,24 +690,64 @@ def api_summary():
             'error': str(e)
         })
 
-@app.route('/api/settings', methods=['GET'])
+@api.route('/api/analytics')
+def api_analytics():
+    """Get totals per category, group or month"""
+    workspace = current_workspace()
+    try:
+        return cached_json('analytics', lambda: {
+            'success': True,
+            'data': analytics.breakdown(
+                workspace.transactions,
+                by=request.args.get('by', 'category'),
+                transaction_type=request.args.get('type')
+            )
+        })
+    except Exception as e:
+        logger.error(f"Error in api_analytics: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@api.route('/api/export')
+def api_export():
+    """Stream transactions as CSV or Parquet (format=csv|parquet, from=, to=, type=)"""
+    workspace = current_workspace()
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format == 'parquet' and not export.parquet_available():
+            raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+        
+        rows = export.iter_rows(
+            workspace.transactions,
+            date_from=export.parse_bound(request.args.get('from')),
+            date_to=export.parse_bound(request.args.get('to'), end=True),
+            transaction_type=request.args.get('type')
+        )
+        chunks = export.logged_stream(export.stream_export(export_format, rows), f'{export_format} export')
+        headers = {'Content-Disposition': f'attachment; filename="transactions.{export_format}"'}
+        
+        if accepts_encoding(request.headers.get('Accept-Encoding', ''), 'gzip'):
+            chunks = export.gzip_stream(chunks)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+        
+        return Response(chunks, content_type=export.CONTENT_TYPES[export_format], headers=headers)
+    except Exception as e:
+        logger.error(f"Error in api_export: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@api.route('/api/settings', methods=['GET'])
 def api_settings_get():
     """Get current settings"""
+    workspace = current_workspace()
     try:
-        config_path = Path('config.json')
-        if config_path.exists():
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            
-            # Return safe config (without sensitive data)
-            safe_config = {
-                'currency': config.get('currency', 'RUB'),
-                'notifications': config.get('notifications', True),
-                'auto_update': config.get('auto_update', True),
-                'update_interval': config.get('update_interval', 30),
-                'group_ids': config.get('group_ids', [])
-            }
-            
+        safe_config = workspace.get_settings()
+        if safe_config is not None:
             return jsonify({
                 'success': True,
                 'data': safe_config
@@ -326,25 +765,12 @@ def api_settings_get():
             'error': str(e)
         })
 
-@app.route('/api/settings', methods=['POST'])
+@api.route('/api/settings', methods=['POST'])
 def api_settings_post():
     """Update settings"""
+    workspace = current_workspace()
     try:
-        new_settings = request.get_json()
-        
-        config_path = Path('config.json')
-        if config_path.exists():
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-        else:
-            config = {}
-        
-        # Update config with new settings
-        config.update(new_settings)
-        
-        # Save updated config
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        workspace.update_settings(request.get_json())
         
         return jsonify({
             'success': True,
@@ -358,11 +784,12 @@ def api_settings_post():
             'error': str(e)
         })
 
-@app.route('/api/update', methods=['POST'])
+@api.route('/api/update', methods=['POST'])
 def api_force_update():
     """Force data update"""
+    workspace = current_workspace()
     try:
-        if financial_app.force_update():
+        if workspace.force_update():
             return jsonify({
                 'success': True,
                 'message': 'Update started in background'
@@ -370,7 +797,7 @@ def api_force_update():
         else:
             return jsonify({
                 'success': False,
-                'message': 'Update already in progress'
+                'message': 'Update already in progress' if workspace.ready.is_set() else 'Still loading data, try again shortly'
             })
     except Exception as e:
         logger.error(f"Error in api_force_update: {e}")
@@ -379,34 +806,21 @@ def api_force_update():
             'error': str(e)
         })
 
-@app.route('/api/status')
+@api.route('/api/status')
 def api_status():
     """Get application status"""
+    workspace = current_workspace()
     return jsonify({
         'success': True,
-        'data': {
-            'is_parsing': financial_app.is_parsing,
-            'last_update': financial_app.last_update.isoformat() if financial_app.last_update else None,
-            'transaction_count': len(financial_app.transactions),
-            'server_time': datetime.now().isoformat()
-        }
+        'data': workspace.get_status()
     })
 
-@app.route('/api/clear-data', methods=['POST'])
+@api.route('/api/clear-data', methods=['POST'])
 def api_clear_data():
     """Clear all transaction data"""
+    workspace = current_workspace()
     try:
-        # Clear transactions file
-        transactions_file = Path('transactions.json')
-        if transactions_file.exists():
-            # Create empty structure
-            empty_data = {"income": [], "expense": []}
-            with open(transactions_file, 'w', encoding='utf-8') as f:
-                json.dump(empty_data, f, indent=2, ensure_ascii=False)
-        
-        # Update app state
-        financial_app.transactions = []
-        financial_app.last_update = datetime.now()  # type: ignore
+        workspace.clear_data()
         
         return jsonify({
             'success': True,
@@ -419,16 +833,40 @@ def api_clear_data():
             'error': str(e)
         })
 
+@app.route('/api/workspaces')
+def api_workspaces():
+    """List the workspaces served by this process"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'workspaces': workspaces.ids(),
+            'loaded': workspaces.loaded()
+        }
+    })
+
+app.register_blueprint(api)
+app.register_blueprint(api, url_prefix='/w/<workspace_id>', name='workspace_api')
+
 # Static file serving
+def asset_response(filename: str) -> Response:
+    result = ASSETS.respond(filename, request.headers.get('Accept-Encoding', ''),
+                            request.headers.get('If-None-Match', ''))
+    if result is None:
+        abort(404)
+    status, body, headers = result
+    return Response(body, status=status, headers=headers)
+
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Serve a file from static/ (cached for good when requested by its fingerprinted name)"""
+    return asset_response(filename)
+
 @app.route('/<path:filename>')
 def static_files(filename):
     """Serve static files"""
-    if filename.endswith('.js'):
-        return app.send_static_file(filename)
-    elif filename.endswith('.css'):
-        return app.send_static_file(filename)
-    else:
-        return app.send_static_file(filename)
+    return asset_response(filename)
+
+logger.info(f"app.py imported in {time.perf_counter() - IMPORT_STARTED:.3f}s")
 
 def run_app(host='0.0.0.0', port=8080, debug=False):
     """Run the Flask application"""
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - ASGI server
+Serves the same pages and /api/* routes as app.py from FastAPI/uvicorn.
+Handlers are coroutines on the server's event loop, and the background
+scheduler runs the Telethon clients on that same loop, so many concurrent
+mini-app connections (including the /api/events Server-Sent Events stream)
+do not each hold a thread. Work that walks the whole store (filtering,
+serializing, file I/O) is handed to the bounded thread pool.
+
+Run `python asgi_app.py [port] [host]` or `uvicorn asgi_app:asgi`.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import AsyncIterator, Dict, Optional
+
+from scheduler import SCHEDULER
+
+# Background Telegram work waits for the server's loop instead of starting a thread of its own
+SCHEDULER.expect_loop()
+
+from fastapi import APIRouter, Depends, FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from starlette.concurrency import run_in_threadpool
+
+import analytics
+import export
+import metrics
+from app import FinancialAgentApp, workspaces
+from assets import ASSETS, accepts_encoding
+from response_cache import RESPONSE_CACHE
+from workspaces import DEFAULT_WORKSPACE
+
+logger = logging.getLogger(__name__)
+
+# Seconds between store checks while clients are subscribed to /api/events
+FEED_INTERVAL = 1.0
+# Seconds of silence after which an event stream sends a keep-alive comment
+KEEPALIVE_SECONDS = 15.0
+
+templates = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')),
+    autoescape=select_autoescape(['html'])
+)
+templates.globals['asset_url'] = ASSETS.url
+
+asgi = FastAPI(title='Telegram Financial Agent', docs_url=None, redoc_url=None)
+
+
+class WorkspaceNotFound(Exception):
+    def __init__(self, workspace_id: str):
+        super().__init__(f"Workspace '{workspace_id}' not found")
+        self.workspace_id = workspace_id
+
+
+class ChangeFeed:
+    """
+    Wakes the event streams of one workspace when its store version changes.
+
+    A single poller per workspace checks the store file, however many
+    clients are subscribed, and stops when the last one disconnects.
+
+    Args:
+        workspace (FinancialAgentApp): Workspace to watch
+        interval (float): Seconds between store checks
+    """
+
+    def __init__(self, workspace: FinancialAgentApp, interval: float = FEED_INTERVAL):
+        self.workspace = workspace
+        self.interval = interval
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _poll(self):
+        version = self.workspace.version
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            if self.workspace.needs_refresh():
+                await run_in_threadpool(self.workspace.refresh_if_changed)
+            if self.workspace.version != version:
+                version = self.workspace.version
+                changed, self._changed = self._changed, asyncio.Event()
+                changed.set()
+        self._task = None
+
+    async def subscribe(self, since: int) -> AsyncIterator[Optional[Dict]]:
+        """
+        Yield {version, reset, changes} updates after version since, or None as a keep-alive.
+
+        Args:
+            since (int): Store version the client already has
+        """
+        self.subscribers += 1
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._poll())
+        try:
+            version = since
+            while True:
+                if self.workspace.version != version:
+                    # Read first: changes_since may include newer batches, which clients apply idempotently
+                    target = self.workspace.version
+                    changes = await run_in_threadpool(self.workspace.changes_since, version)
+                    yield {'version': target, 'reset': changes is None, 'changes': changes or []}
+                    version = target
+                    continue
+                try:
+                    await asyncio.wait_for(self._changed.wait(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.subscribers -= 1
+
+
+_feeds: Dict[str, ChangeFeed] = {}
+
+
+def change_feed(workspace: FinancialAgentApp) -> ChangeFeed:
+    feed = _feeds.get(workspace.workspace_id)
+    if feed is None:
+        feed = _feeds[workspace.workspace_id] = ChangeFeed(workspace)
+    return feed
+
+
+async def current_workspace(request: Request) -> FinancialAgentApp:
+    """Workspace addressed by the request path, with store changes picked up"""
+    workspace_id = request.path_params.get('workspace_id', DEFAULT_WORKSPACE)
+    workspace = workspaces.get(workspace_id)
+    if workspace is None:
+        raise WorkspaceNotFound(workspace_id)
+    if workspace.needs_refresh():
+        await run_in_threadpool(workspace.refresh_if_changed)
+    return workspace
+
+
+async def json_response(payload: Dict) -> Response:
+    """JSON response serialized in the thread pool (for payloads that grow with the store)"""
+    body = await run_in_threadpool(json.dumps, payload, ensure_ascii=False, default=str)
+    return Response(body, media_type='application/json')
+
+
+async def cached_json(request: Request, workspace: FinancialAgentApp, endpoint: str, build) -> Response:
+    """JSON response served from the response cache while the workspace's data is unchanged"""
+    body = await run_in_threadpool(
+        RESPONSE_CACHE.get_or_compute,
+        workspace.workspace_id, endpoint, request.query_params.multi_items(), workspace.data_version,
+        lambda: json.dumps(build(), ensure_ascii=False, default=str, separators=(',', ':')).encode('utf-8')
+    )
+    return Response(body, media_type='application/json')
+
+
+def error_response(handler: str, e: Exception) -> JSONResponse:
+    logger.error(f"Error in {handler}: {e}")
+    return JSONResponse({
+        'success': False,
+        'error': str(e)
+    })
+
+
+@asgi.on_event('startup')
+async def attach_scheduler():
+    SCHEDULER.use_loop(asyncio.get_running_loop())
+
+
+@asgi.exception_handler(WorkspaceNotFound)
+async def workspace_not_found(request: Request, exc: WorkspaceNotFound):
+    return JSONResponse({
+        'success': False,
+        'error': str(exc)
+    }, status_code=404)
+
+
+@asgi.middleware('http')
+async def observe_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    metrics.API_REQUEST_SECONDS.labels(
+        route=getattr(route, 'path', 'unmatched'), method=request.method
+    ).observe(time.perf_counter() - started)
+    return response
+
+
+# API routes, served for the default workspace under / and for every
+# workspace under /w/{workspace_id}/
+api = APIRouter()
+
+
+@api.get('/api/transactions')
+async def api_transactions(request: Request, limit: Optional[int] = None, offset: int = 0,
+                           type: Optional[str] = None, format: Optional[str] = None,
+                           workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get all transactions"""
+    try:
+        return await cached_json(request, workspace, 'transactions', lambda: {
+            'success': True,
+            **workspace.get_transactions(limit, offset, type, format)
+        })
+    except Exception as e:
+        return error_response('api_transactions', e)
+
+
+@api.get('/api/changes')
+async def api_changes(since: int = 0, workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get row changes (upserts and deletions keyed by [group_id, id]) since a store version"""
+    try:
+        changes = await run_in_threadpool(workspace.changes_since, since)
+        return await json_response({
+            'success': True,
+            'data': {
+                'version': workspace.version,
+                'reset': changes is None,
+                'changes': changes or []
+            }
+        })
+    except Exception as e:
+        return error_response('api_changes', e)
+
+
+@api.get('/api/events')
+async def api_events(request: Request, since: Optional[int] = None,
+                     workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Stream row changes as Server-Sent Events ('changes' events with the /api/changes payload)"""
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id and last_event_id.isdigit():
+        # Reconnecting EventSource: resume after the last update it received
+        since = int(last_event_id)
+    if since is None:
+        since = workspace.version
+
+    async def stream():
+        yield 'retry: 3000\n\n'
+        async for update in change_feed(workspace).subscribe(since):
+            if update is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield f"id: {update['version']}\nevent: changes\ndata: {json.dumps(update, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@api.get('/api/alerts')
+async def api_alerts(since: int = 0, workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get budget and large-expense alerts raised after a sequence number"""
+    try:
+        return await json_response({
+            'success': True,
+            'data': await run_in_threadpool(workspace.get_alerts, since)
+        })
+    except Exception as e:
+        return error_response('api_alerts', e)
+
+
+@api.get('/api/transactions/income')
+async def api_transactions_income(request: Request, workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get income transactions only"""
+    def build():
+        page = workspace.get_transactions(transaction_type='income')
+        return {
+            'success': True,
+            'data': page['data'],
+            'count': page['filtered']
+        }
+
+    return await cached_json(request, workspace, 'transactions/income', build)
+
+
+@api.get('/api/transactions/expense')
+async def api_transactions_expense(request: Request, workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get expense transactions only"""
+    def build():
+        page = workspace.get_transactions(transaction_type='expense')
+        return {
+            'success': True,
+            'data': page['data'],
+            'count': page['filtered']
+        }
+
+    return await cached_json(request, workspace, 'transactions/expense', build)
+
+
+@api.get('/api/transactions/last-update')
+async def api_transactions_last_update(workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get timestamp of last data update"""
+    try:
+        return {
+            'success': True,
+            'data': workspace.get_last_update()
+        }
+    except Exception as e:
+        return error_response('api_transactions_last_update', e)
+
+
+@api.get('/api/summary')
+async def api_summary(request: Request, workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get transactions summary"""
+    try:
+        return await cached_json(request, workspace, 'summary', lambda: {
+            'success': True,
+            'data': workspace.get_transactions_summary()
+        })
+    except Exception as e:
+        return error_response('api_summary', e)
+
+
+@api.get('/api/analytics')
+async def api_analytics(request: Request, by: str = 'category', type: Optional[str] = None,
+                        workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get totals per category, group or month"""
+    try:
+        return await cached_json(request, workspace, 'analytics', lambda: {
+            'success': True,
+            'data': analytics.breakdown(workspace.transactions, by, type)
+        })
+    except Exception as e:
+        return error_response('api_analytics', e)
+
+
+@api.get('/api/export')
+async def api_export(request: Request, format: str = 'csv', type: Optional[str] = None,
+                     workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Stream transactions as CSV or Parquet (format=csv|parquet, from=, to=, type=)"""
+    try:
+        if format == 'parquet' and not export.parquet_available():
+            raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+
+        rows = export.iter_rows(
+            workspace.transactions,
+            date_from=export.parse_bound(request.query_params.get('from')),
+            date_to=export.parse_bound(request.query_params.get('to'), end=True),
+            transaction_type=type
+        )
+        chunks = export.logged_stream(export.stream_export(format, rows), f'{format} export')
+        headers = {'Content-Disposition': f'attachment; filename="transactions.{format}"'}
+
+        if accepts_encoding(request.headers.get('Accept-Encoding', ''), 'gzip'):
+            chunks = export.gzip_stream(chunks)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+
+        # A plain iterator: Starlette encodes each chunk in the thread pool
+        return StreamingResponse(chunks, media_type=export.CONTENT_TYPES[format], headers=headers)
+    except Exception as e:
+        return error_response('api_export', e)
+
+
+@api.get('/api/settings')
+async def api_settings_get(workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get current settings"""
+    try:
+        safe_config = await run_in_threadpool(workspace.get_settings)
+        if safe_config is None:
+            return {
+                'success': False,
+                'error': 'Config file not found'
+            }
+        return {
+            'success': True,
+            'data': safe_config
+        }
+    except Exception as e:
+        return error_response('api_settings_get', e)
+
+
+@api.post('/api/settings')
+async def api_settings_post(request: Request, workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Update settings"""
+    try:
+        await run_in_threadpool(workspace.update_settings, await request.json())
+        return {
+            'success': True,
+            'message': 'Settings updated successfully'
+        }
+    except Exception as e:
+        return error_response('api_settings_post', e)
+
+
+@api.post('/api/update')
+async def api_force_update(workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Force data update"""
+    try:
+        if workspace.force_update():
+            return {
+                'success': True,
+                'message': 'Update started in background'
+            }
+        return {
+            'success': False,
+            'message': 'Update already in progress' if workspace.ready.is_set() else 'Still loading data, try again shortly'
+        }
+    except Exception as e:
+        return error_response('api_force_update', e)
+
+
+@api.get('/api/status')
+async def api_status(workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Get application status"""
+    return {
+        'success': True,
+        'data': workspace.get_status()
+    }
+
+
+@api.post('/api/clear-data')
+async def api_clear_data(workspace: FinancialAgentApp = Depends(current_workspace)):
+    """Clear all transaction data"""
+    try:
+        await run_in_threadpool(workspace.clear_data)
+        return {
+            'success': True,
+            'message': 'Все данные успешно очищены'
+        }
+    except Exception as e:
+        return error_response('api_clear_data', e)
+
+
+asgi.include_router(api)
+asgi.include_router(api, prefix='/w/{workspace_id}')
+
+
+@asgi.get('/api/workspaces')
+async def api_workspaces():
+    """List the workspaces served by this process"""
+    return {
+        'success': True,
+        'data': {
+            'workspaces': workspaces.ids(),
+            'loaded': workspaces.loaded()
+        }
+    }
+
+
+@asgi.get('/metrics')
+async def metrics_endpoint():
+    """Expose metrics in Prometheus text format"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@asgi.get('/static/{filename:path}')
+async def static_asset(request: Request, filename: str):
+    """Serve a file from static/ (cached for good when requested by its fingerprinted name)"""
+    result = ASSETS.respond(filename, request.headers.get('accept-encoding', ''),
+                            request.headers.get('if-none-match', ''))
+    if result is None:
+        return JSONResponse({'success': False, 'error': 'Not found'}, status_code=404)
+    status, body, headers = result
+    return Response(body, status_code=status, headers=dict(headers))
+
+
+def render_page(template: str, workspace_id: Optional[str] = None) -> Response:
+    if workspace_id is not None and not workspaces.exists(workspace_id):
+        raise WorkspaceNotFound(workspace_id)
+    api_base = f'/w/{workspace_id}' if workspace_id is not None else ''
+    return HTMLResponse(templates.get_template(template).render(api_base=api_base))
+
+
+@asgi.get('/')
+async def index():
+    """Serve the main application"""
+    return render_page('index.html')
+
+
+@asgi.get('/telegram')
+async def telegram_app():
+    """Serve the Telegram Mini App version"""
+    return render_page('telegram_index.html')
+
+
+@asgi.get('/w/{workspace_id}/')
+async def workspace_index(workspace_id: str):
+    """Serve the main application for a workspace"""
+    return render_page('index.html', workspace_id)
+
+
+@asgi.get('/w/{workspace_id}/telegram')
+async def workspace_telegram_app(workspace_id: str):
+    """Serve the Telegram Mini App version for a workspace"""
+    return render_page('telegram_index.html', workspace_id)
+
+
+def run_asgi(host='0.0.0.0', port=8080):
+    """Run the ASGI application with uvicorn"""
+    import uvicorn
+
+    uvicorn.run(asgi, host=host, port=port)
+
+
+if __name__ == '__main__':
+    host = '0.0.0.0'
+    port = 8080
+
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+
+    if len(sys.argv) > 2:
+        host = sys.argv[2]
+
+    print(f"Starting Telegram Financial Agent (ASGI) on http://{host}:{port}")
+    run_asgi(host, port)
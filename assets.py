@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Static assets
+Build-free asset pipeline for the files in static/. On first use every file
+is hashed and gets a fingerprinted name (dashboard.js ->
+dashboard.3f9a1c2b7d.js); text assets are compressed once with gzip and,
+if the brotli package is installed, brotli. Templates link assets through
+asset_url(), so a changed file gets a new URL and fingerprinted responses
+can be cached by the browser forever (Cache-Control: immutable). Requests
+for the plain name are still served, but revalidated with an ETag.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+URL_PREFIX = '/static/'
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# Extensions worth compressing; images and fonts are already compressed
+COMPRESSIBLE = ('.js', '.css', '.svg', '.json', '.html', '.txt', '.map')
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Content codings of an Accept-Encoding header with their q-values"""
+    codings = {}
+    for part in (accept_encoding or '').lower().split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """True if the header allows encoding (listed or covered by '*', and not with q=0)"""
+    codings = accepted_encodings(accept_encoding)
+    return codings.get(encoding, codings.get('*', 0.0)) > 0
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class Asset:
+    """One static file with its fingerprinted name and precompressed variants"""
+
+    def __init__(self, name: str, body: bytes):
+        self.name = name
+        self.body = body
+        digest = hashlib.blake2b(body, digest_size=5).hexdigest()
+        stem, extension = os.path.splitext(name)
+        self.fingerprinted = f'{stem}.{digest}{extension}'
+        self.digest = digest
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'application/json'):
+            self.content_type += '; charset=utf-8'
+        # Content-Encoding -> body, only where it is smaller than the original
+        self.encodings: Dict[str, bytes] = {}
+        if extension in COMPRESSIBLE:
+            brotli = _brotli()
+            if brotli is not None:
+                self._add_encoding('br', brotli.compress(body, quality=11))
+            self._add_encoding('gzip', gzip.compress(body, compresslevel=9, mtime=0))
+
+    def _add_encoding(self, encoding: str, data: bytes):
+        if len(data) < len(self.body):
+            self.encodings[encoding] = data
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        """Validator of one variant; each encoding has its own, as the bytes differ"""
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def negotiate(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """Smallest variant the client accepts, with its Content-Encoding"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and accepts_encoding(accept_encoding, encoding):
+                return self.encodings[encoding], encoding
+        return self.body, None
+
+
+class AssetManifest:
+    """
+    Fingerprinted assets of one directory, built on first use.
+
+    Args:
+        directory (str): Directory holding the assets (subdirectories included)
+        prefix (str): URL prefix the assets are served under
+    """
+
+    def __init__(self, directory: str = STATIC_DIR, prefix: str = URL_PREFIX):
+        self.directory = directory
+        self.prefix = prefix
+        self._assets: Optional[Dict[str, Asset]] = None
+        self._by_fingerprint: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+
+    def _build(self) -> Dict[str, Asset]:
+        with self._lock:
+            if self._assets is not None:
+                return self._assets
+            assets = {}
+            for root, _, files in os.walk(self.directory):
+                for filename in sorted(files):
+                    path = os.path.join(root, filename)
+                    name = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                    with open(path, 'rb') as f:
+                        assets[name] = Asset(name, f.read())
+            self._by_fingerprint = {asset.fingerprinted: asset for asset in assets.values()}
+            self._assets = assets
+            compressed = sum(1 for asset in assets.values() if asset.encodings)
+            logger.info(f"Fingerprinted {len(assets)} static assets ({compressed} precompressed"
+                        f"{', brotli unavailable' if _brotli() is None else ''})")
+            return assets
+
+    @property
+    def assets(self) -> Dict[str, Asset]:
+        return self._assets if self._assets is not None else self._build()
+
+    def url(self, name: str) -> str:
+        """URL of an asset for templates: the fingerprinted name if the file exists"""
+        asset = self.assets.get(name)
+        return self.prefix + (asset.fingerprinted if asset else name)
+
+    def lookup(self, filename: str) -> Tuple[Optional[Asset], bool]:
+        """The asset requested as filename, and whether it was requested by its fingerprinted name"""
+        assets = self.assets
+        asset = self._by_fingerprint.get(filename)
+        if asset is not None:
+            return asset, True
+        return assets.get(filename), False
+
+    def respond(self, filename: str, accept_encoding: str = '',
+                if_none_match: str = '') -> Optional[Tuple[int, bytes, List[Tuple[str, str]]]]:
+        """
+        Status, body and headers answering a request for filename, or None if there is no such asset.
+
+        Args:
+            filename (str): Path below the URL prefix
+            accept_encoding (str): The request's Accept-Encoding header
+            if_none_match (str): The request's If-None-Match header
+        """
+        asset, fingerprinted = self.lookup(filename)
+        if asset is None:
+            return None
+        body, encoding = asset.negotiate(accept_encoding)
+        etag = asset.etag(encoding)
+        headers = [
+            ('Cache-Control', IMMUTABLE if fingerprinted else REVALIDATE),
+            ('ETag', etag),
+            ('Vary', 'Accept-Encoding')
+        ]
+        if etag in (if_none_match or ''):
+            return 304, b'', headers
+        headers.append(('Content-Type', asset.content_type))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        return 200, body, headers
+
+
+# Assets in static/, shared by app.py, asgi_app.py and telegram_server.py
+ASSETS = AssetManifest()
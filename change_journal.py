@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Store change journal
+Append-only log (transactions.changes, JSON lines) of the row-level changes
+each store write made: upserts of new or edited transactions and deletions.
+Every batch carries the store file signature before and after the write, so
+a reader holding the "before" version can apply the batch instead of
+reloading the file, and can tell when the chain is broken (another tool
+rewrote the file) and a full reload is needed.
+
+Run `python change_journal.py` to check that replaying the journal gives the
+same rows, in the same order, as reloading the store.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dedup_index import transaction_key
+from snapshot import TYPES
+from store_io import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# The journal is trimmed to its newer half once it grows past this size
+MAX_JOURNAL_BYTES = 4 * 1024 * 1024
+
+SEQ_PREFIX = '{"seq": '
+
+
+def journal_path(transactions_file: str) -> str:
+    return os.path.splitext(transactions_file)[0] + '.changes'
+
+
+def _last_line(path: str) -> Optional[bytes]:
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        position = end
+        buffer = b''
+        while position > 0:
+            step = min(65536, position)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+            lines = buffer.rstrip(b'\n').rsplit(b'\n', 1)
+            if len(lines) == 2 or position == 0:
+                return lines[-1] or None
+    return None
+
+
+class ChangeJournal:
+    """
+    Writer and reader of a store's change journal.
+
+    Writers must hold the store lock while appending.
+
+    Args:
+        path (str): Journal file location
+        max_bytes (int): Size at which the journal is trimmed
+    """
+
+    def __init__(self, path: str, max_bytes: int = MAX_JOURNAL_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def last_seq(self) -> int:
+        """Sequence number of the newest batch (0 if there is none)"""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            line = _last_line(self.path)
+            return json.loads(line)['seq'] if line else 0
+        except Exception as e:
+            logger.warning(f"Error reading change journal {self.path}: {e}")
+            return 0
+
+    def append(self, changes: List[Dict], before: Optional[List[int]], after: Optional[List[int]]) -> int:
+        """
+        Record one store write.
+
+        Args:
+            changes: {'op': 'upsert', 'key': [group_id, message_id], 'row': {...}}
+                or {'op': 'delete', 'key': [group_id, message_id]} entries
+            before: Store file signature before the write
+            after: Store file signature after the write
+        Returns:
+            The batch's sequence number
+        """
+        seq = self.last_seq() + 1
+        line = json.dumps({'seq': seq, 'before': before, 'after': after, 'changes': changes},
+                          ensure_ascii=False) + '\n'
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+        if os.path.getsize(self.path) > self.max_bytes:
+            self._trim()
+        return seq
+
+    def _trim(self):
+        with open(self.path, 'rb') as f:
+            lines = f.readlines()
+        atomic_write(self.path, b''.join(lines[len(lines) // 2:]))
+
+    def read_since(self, seq: int) -> List[Dict]:
+        """Batches newer than seq, oldest first"""
+        if not os.path.exists(self.path):
+            return []
+        batches = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                # Lines start with '{"seq": N,' so old batches are skipped without decoding them
+                try:
+                    if int(line[len(SEQ_PREFIX):line.index(',')]) <= seq:
+                        continue
+                    batches.append(json.loads(line))
+                except ValueError:
+                    continue
+        return batches
+
+    @staticmethod
+    def is_chain(batches: List[Dict], since_seq: int, start: Optional[List[int]], end: Optional[List[int]]) -> bool:
+        """True if batches lead without gaps from the store version start (at since_seq) to end"""
+        if not batches or batches[0]['seq'] != since_seq + 1 or batches[0]['before'] != start:
+            return False
+        for previous, batch in zip(batches, batches[1:]):
+            if batch['seq'] != previous['seq'] + 1 or batch['before'] != previous['after']:
+                return False
+        return batches[-1]['after'] == end
+
+
+def apply_batches(transactions: List[Dict], rows_by_key: Dict[Tuple[str, str], Dict], batches: List[Dict],
+                  on_change: Optional[Callable[[Optional[Dict], Optional[Dict]], None]] = None) -> List[Dict]:
+    """
+    Apply journaled batches to in-memory rows.
+
+    The result is ordered the way a reload of the store orders it: per type,
+    rows added (or moved to the type) by a write come first in the order the
+    write lists them, newer writes before older ones, followed by the
+    remaining rows in their previous order.
+
+    Args:
+        transactions: Rows in their current order (in the app's row format)
+        rows_by_key: The same rows by (group_id, message_id); updated in place
+        batches: Journal batches, oldest first
+        on_change: Called as on_change(old_row, new_row) for every change (None for a missing side)
+    Returns:
+        The rows after the batches
+    """
+    # Type -> keys placed at the front of the type, newest write first
+    fronts: Dict[str, List[Tuple[str, str]]] = {transaction_type: [] for transaction_type in TYPES}
+    for batch in batches:
+        added: Dict[str, List[Tuple[str, str]]] = {transaction_type: [] for transaction_type in TYPES}
+        for change in batch['changes']:
+            key = tuple(change['key'])
+            old = rows_by_key.pop(key, None) if change['op'] == 'delete' else rows_by_key.get(key)
+            new = change.get('row') if change['op'] == 'upsert' else None
+            if new is not None:
+                rows_by_key[key] = new
+                if (old is None or old.get('type') != new.get('type')) and new.get('type') in added:
+                    added[new['type']].append(key)
+            if on_change is not None:
+                on_change(old, new)
+        for transaction_type in TYPES:
+            fronts[transaction_type] = added[transaction_type] + fronts[transaction_type]
+
+    placed = set()
+    kept: Dict[str, List[Dict]] = {transaction_type: [] for transaction_type in TYPES}
+    for transaction_type in TYPES:
+        for key in fronts[transaction_type]:
+            row = rows_by_key.get(key)
+            if key not in placed and row is not None and row.get('type') == transaction_type:
+                placed.add(key)
+                kept[transaction_type].append(row)
+    for t in transactions:
+        key = transaction_key(t.get('group_id'), t.get('id'))
+        row = rows_by_key.get(key)
+        if key not in placed and row is not None and row.get('type') in kept:
+            placed.add(key)
+            kept[row['type']].append(row)
+    return [row for transaction_type in TYPES for row in kept[transaction_type]]
+
+
+def check_replay(workdir: str) -> bool:
+    """Write a store through the parser and compare the journal replay with a reload after every write"""
+    from snapshot import load_snapshot, unify_transactions
+    from store_io import read_json
+    from telegram_parser import TelegramFinancialParser
+
+    config_path = os.path.join(workdir, 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'group_types': {'-1': 'expense', '-2': 'income'}}, f)
+    parser = TelegramFinancialParser(config_path, base_dir=workdir)
+
+    def message(message_id: int, group_id: str, amount: int, text: str = 'обед') -> Dict:
+        return {'id': message_id, 'group_id': group_id, 'group_name': group_id, 'amount': amount,
+                'type': 'expense' if group_id == '-1' else 'income', 'description': f'{text} {amount}',
+                'category': 'еда', 'date': f'2026-01-01T10:{message_id % 60:02d}:00+00:00'}
+
+    writes = [
+        ('save', lambda: parser.save_transactions([message(i, '-1' if i % 3 else '-2', 100 + i) for i in range(1, 11)])),
+        ('save', lambda: parser.save_transactions([message(i, '-1', 200 + i) for i in range(11, 14)])),
+        ('edit', lambda: parser.update_transactions([message(4, '-1', 999, 'ужин')], [])),
+        ('retype', lambda: parser.update_transactions([dict(message(5, '-1', 105), type='income')], [])),
+        ('insert', lambda: parser.update_transactions([message(20, '-2', 50), message(21, '-2', 60)], [])),
+        ('delete', lambda: parser.update_transactions([], [('-1', '2'), ('-2', '3')])),
+        ('mixed', lambda: parser.update_transactions([message(2, '-1', 7), message(6, '-1', 8)], [('-1', '12')]))
+    ]
+
+    transactions = []
+    rows_by_key = {}
+    seq = 0
+    journal = ChangeJournal(journal_path(parser.transactions_file))
+    ok = True
+    for name, write in writes:
+        write()
+        batches = journal.read_since(seq)
+        seq = batches[-1]['seq'] if batches else seq
+        transactions = apply_batches(transactions, rows_by_key, batches)
+        reloaded = unify_transactions(read_json(parser.transactions_file))
+        snapshot = load_snapshot(parser.transactions_file)
+        same = transactions == reloaded and (snapshot is None or list(snapshot.rows()) == reloaded)
+        ok = ok and same
+        print(f"{name:<7} {len(transactions):3d} rows: {'OK' if same else 'MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that replaying the change journal matches a store reload')
+    parser.add_argument('--workdir', help='Directory for the store (default: a temporary directory)')
+    args = parser.parse_args()
+    if args.workdir:
+        return 0 if check_replay(args.workdir) else 1
+    with tempfile.TemporaryDirectory() as workdir:
+        return 0 if check_replay(workdir) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Columnar wire format
+Compact encoding of transaction pages for `/api/transactions?format=columnar`.
+Instead of one object per row repeating every key, the response carries one
+array per field: types, categories and groups as small-int codes into
+dictionaries of the values on the page, and dates as epoch seconds
+delta-encoded against the previous row (rows are stored roughly in date
+order, so the deltas are short numbers). The dashboards decode it back into
+the usual row objects with a few lines of JavaScript.
+
+    {"count": 2,
+     "dictionaries": {"type": ["expense"], "category": ["еда"], "group": [["-100", "Расходы"]]},
+     "columns": {"id": ["7", "6"], "amount": [700.0, 500.0], "description": ["обед 700", "обед 500"],
+                 "type": [0, 0], "category": [0, 0], "group": [0, 0], "date": [1759312800, -3600]}}
+
+Run `python columnar.py --rows 100000` to compare its size and encode time with the row format.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from analytics import columnar_source, numpy_or_none
+from snapshot import DEFAULT_CATEGORY, TYPES, to_epoch
+
+FORMAT = 'columnar'
+
+
+def _deltas(values: Iterable[int]) -> List[int]:
+    deltas = []
+    previous = 0
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+
+def encode_rows(rows: Iterable[Dict]) -> Dict:
+    """Columnar encoding of rows in the app's dict format"""
+    types: Dict[str, int] = {}
+    categories: Dict[str, int] = {}
+    groups: Dict[tuple, int] = {}
+    columns = {'id': [], 'amount': [], 'description': [], 'type': [], 'category': [], 'group': [], 'date': []}
+    for row in rows:
+        columns['id'].append(str(row.get('id', '')))
+        columns['amount'].append(row.get('amount', 0))
+        columns['description'].append(row.get('description', ''))
+        columns['type'].append(types.setdefault(row.get('type', ''), len(types)))
+        columns['category'].append(categories.setdefault(row.get('category', DEFAULT_CATEGORY), len(categories)))
+        group_key = (row.get('group_id', ''), row.get('group_name', 'Unknown'))
+        columns['group'].append(groups.setdefault(group_key, len(groups)))
+        columns['date'].append(to_epoch(row.get('date')))
+    columns['date'] = _deltas(columns['date'])
+    return {
+        'count': len(columns['id']),
+        'dictionaries': {
+            'type': list(types),
+            'category': list(categories),
+            'group': [list(key) for key in groups]
+        },
+        'columns': columns
+    }
+
+
+def _encode_snapshot(transactions, snapshot, limit: Optional[int], offset: int,
+                     transaction_type: Optional[str]) -> Dict:
+    # Codes, amounts and dates come straight from the snapshot columns; only ids and
+    # descriptions of the selected rows are decoded
+    np = numpy_or_none()
+    types = snapshot.array('type')
+    if transaction_type:
+        indices = np.flatnonzero(types == (TYPES.index(transaction_type) if transaction_type in TYPES else -2))
+    else:
+        indices = np.arange(snapshot.count)
+    indices = indices[offset:offset + limit] if limit else indices[offset:]
+
+    dictionaries = {}
+    columns = {
+        'id': transactions.strings('id', indices.tolist()),
+        'amount': snapshot.array('amount')[indices].tolist(),
+        'description': transactions.strings('description', indices.tolist())
+    }
+    for field, values in (('type', snapshot.types), ('category', snapshot.categories), ('group', snapshot.groups)):
+        # Only the dictionary entries used on this page are sent
+        used, codes = np.unique(snapshot.array(field)[indices], return_inverse=True)
+        dictionaries[field] = [values[code] if code >= 0 else '' for code in used.tolist()]
+        columns[field] = codes.tolist()
+    columns['date'] = np.diff(snapshot.array('epoch')[indices], prepend=0).tolist()
+    return {'count': len(indices), 'dictionaries': dictionaries, 'columns': columns}
+
+
+def encode_transactions(transactions: Sequence, limit: Optional[int] = None, offset: int = 0,
+                        transaction_type: Optional[str] = None) -> Dict:
+    """
+    Columnar encoding of one page of transactions.
+
+    Args:
+        transactions: Store rows (a list or snapshot rows)
+        limit (int): Rows on the page (default: all after offset)
+        offset (int): Rows skipped
+        transaction_type (str): Only 'income' or 'expense' rows
+    """
+    snapshot = columnar_source(transactions)
+    if snapshot is not None:
+        return _encode_snapshot(transactions, snapshot, limit, offset, transaction_type)
+    rows = transactions
+    if transaction_type:
+        rows = [t for t in rows if t['type'] == transaction_type]
+    rows = rows[offset:offset + limit] if limit else rows[offset:]
+    return encode_rows(rows)
+
+
+def decode(payload: Dict) -> List[Dict]:
+    """Rows of a columnar payload (the inverse of encode_rows, with dates as UTC ISO strings)"""
+    from datetime import datetime, timezone
+
+    dictionaries = payload['dictionaries']
+    columns = payload['columns']
+    rows = []
+    epoch = 0
+    for index in range(payload['count']):
+        epoch += columns['date'][index]
+        group_id, group_name = dictionaries['group'][columns['group'][index]]
+        rows.append({
+            'id': columns['id'][index],
+            'amount': columns['amount'][index],
+            'type': dictionaries['type'][columns['type'][index]],
+            'description': columns['description'][index],
+            'category': dictionaries['category'][columns['category'][index]],
+            'date': datetime.fromtimestamp(epoch, timezone.utc).isoformat(),
+            'group_id': group_id,
+            'group_name': group_name
+        })
+    return rows
+
+
+def benchmark(rows: int, workdir: str):
+    """Encode a synthetic store as rows and as columns and compare JSON size, encode and parse time"""
+    import gzip
+
+    from snapshot import benchmark as write_store, load_snapshot, unify_transactions
+
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            write_store(rows, workdir)
+        finally:
+            sys.stdout = stdout
+    transactions_file = os.path.join(workdir, 'transactions.json')
+    with open(transactions_file, 'r', encoding='utf-8') as f:
+        list_rows = unify_transactions(json.load(f))
+    snapshot_rows = load_snapshot(transactions_file).rows()
+
+    encoders = [('rows', lambda: list_rows),
+                ('columnar', lambda: encode_transactions(list_rows)),
+                ('columnar/snapshot', lambda: encode_transactions(snapshot_rows))]
+    for label, encode in encoders:
+        started = time.perf_counter()
+        body = json.dumps(encode(), ensure_ascii=False).encode('utf-8')
+        seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        payload = json.loads(body)
+        parse_seconds = time.perf_counter() - started
+        if label != 'rows':
+            assert len(decode(payload)) == len(list_rows)
+        print(f"{label:<18} {len(body) / 1e6:6.1f} MB ({len(gzip.compress(body, 6)) / 1e6:5.1f} MB gzip), "
+              f"encode {seconds:.2f}s, parse {parse_seconds:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the row and columnar transaction formats')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmark(args.rows, workdir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
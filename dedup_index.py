@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Deduplication index
+Persistent set of the (group_id, message_id) pairs already in the store, so
+saves no longer rebuild ID sets from the whole file and messages with the
+same ID in different chats no longer collide. Keys live in a small SQLite
+table; an in-memory Bloom filter answers most lookups (every new message)
+without touching it.
+"""
+
+import hashlib
+import logging
+import math
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 100000
+DEFAULT_ERROR_RATE = 0.001
+
+
+def transaction_key(group_id, message_id) -> Tuple[str, str]:
+    """Normalized (group_id, message_id) key of a stored or new transaction"""
+    return (str(group_id if group_id is not None else ''), str(message_id))
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over string keys.
+
+    Args:
+        capacity (int): Number of keys the filter is sized for
+        error_rate (float): False positive probability at capacity
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+
+class DedupIndex:
+    """
+    Persistent index of stored transactions keyed by (group_id, message_id).
+
+    The index also remembers the signature of the store file it describes;
+    when another writer changed the file in between, the caller rebuilds it
+    from the file contents.
+
+    Args:
+        path (str): SQLite database file
+        error_rate (float): Bloom filter false positive rate
+    """
+
+    def __init__(self, path: str = 'dedup_index.sqlite', error_rate: float = DEFAULT_ERROR_RATE):
+        self.path = path
+        self.error_rate = error_rate
+        self.lookups = 0
+        self.filtered = 0
+        self.false_positives = 0
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS keys ('
+                         'group_id TEXT NOT NULL, message_id TEXT NOT NULL, type TEXT, '
+                         'PRIMARY KEY (group_id, message_id)) WITHOUT ROWID')
+        self._db.execute('CREATE INDEX IF NOT EXISTS keys_by_message ON keys (message_id)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self._db.commit()
+        self._load_filter()
+
+    def _load_filter(self):
+        count = self._db.execute('SELECT COUNT(*) FROM keys').fetchone()[0]
+        self.bloom = BloomFilter(max(DEFAULT_CAPACITY, count * 2), self.error_rate)
+        for group_id, message_id in self._db.execute('SELECT group_id, message_id FROM keys'):
+            self.bloom.add(f'{group_id}:{message_id}')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM keys').fetchone()[0]
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        with self._lock:
+            self.lookups += 1
+            if f'{key[0]}:{key[1]}' not in self.bloom:
+                self.filtered += 1
+                return False
+            found = self._db.execute('SELECT 1 FROM keys WHERE group_id = ? AND message_id = ?', key).fetchone()
+            if found is None:
+                self.false_positives += 1
+            return found is not None
+
+    def add_many(self, entries: Iterable[Tuple[str, str, str]]):
+        """Record (group_id, message_id, type) entries"""
+        with self._lock:
+            entries = list(entries)
+            self._db.executemany('INSERT OR REPLACE INTO keys (group_id, message_id, type) VALUES (?, ?, ?)', entries)
+            self._db.commit()
+            for group_id, message_id, _ in entries:
+                self.bloom.add(f'{group_id}:{message_id}')
+            if self.bloom.full:
+                self._load_filter()
+
+    def groups_for(self, message_id) -> List[str]:
+        """Groups holding a stored message with this ID (for deletions that do not name the chat)"""
+        with self._lock:
+            rows = self._db.execute('SELECT group_id FROM keys WHERE message_id = ?', (str(message_id),)).fetchall()
+        return [row[0] for row in rows]
+
+    def remove(self, key: Tuple[str, str]):
+        """Forget a key (the Bloom filter keeps it; the table lookup then answers no)"""
+        with self._lock:
+            self._db.execute('DELETE FROM keys WHERE group_id = ? AND message_id = ?', key)
+            self._db.commit()
+
+    def rebuild(self, entries: Iterable[Tuple[str, str, str]], source: Optional[List[int]] = None):
+        """Replace the whole index, e.g. after another writer changed the store"""
+        with self._lock:
+            self._db.execute('DELETE FROM keys')
+            self._db.executemany('INSERT OR REPLACE INTO keys (group_id, message_id, type) VALUES (?, ?, ?)', entries)
+            self._db.commit()
+            self._load_filter()
+            self.set_source(source)
+
+    @property
+    def source(self) -> Optional[List[int]]:
+        """Signature of the store file this index was last synced with"""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'source'").fetchone()
+        return [int(part) for part in row[0].split(':')] if row and row[0] else None
+
+    def set_source(self, source: Optional[List[int]]):
+        with self._lock:
+            value = ':'.join(str(part) for part in source) if source else ''
+            self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('source', ?)", (value,))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        return {
+            'lookups': self.lookups,
+            'filtered': self.filtered,
+            'false_positives': self.false_positives,
+            'bloom_bytes': len(self.bloom._bits)
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Persistent entity cache
+Maps group IDs to the peer data Telethon needs for requests (ID, access hash,
+type) plus the group title, so parse cycles address groups directly instead
+of calling get_entity every time. Entries are refreshed after a TTL.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telethon import utils
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 24 * 60 * 60
+
+_PEER_TYPES = {
+    'PeerChannel': 'channel',
+    'PeerChat': 'chat',
+    'PeerUser': 'user',
+}
+
+
+class EntityCache:
+    """
+    JSON-backed cache of resolved Telegram entities.
+
+    Access hashes are only valid for the account that resolved them, so
+    entries are stored per scope (the session name).
+
+    Args:
+        path (str): Cache file location
+        scope (str): Session the entries belong to
+        ttl (int): Seconds before an entry is resolved again
+    """
+
+    def __init__(self, path: str = 'entity_cache.json', scope: str = 'default', ttl: int = DEFAULT_TTL):
+        self.path = path
+        self.scope = scope
+        self.ttl = ttl
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._load().get(scope, {})
+
+    def _load(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            logger.warning(f"Error loading entity cache {self.path}: {e}")
+            return {}
+
+    def save(self):
+        """Write this scope's entries, keeping other scopes written by other sessions"""
+        with self._lock:
+            data = self._load()
+            data[self.scope] = self._entries
+            directory = os.path.dirname(os.path.abspath(self.path))
+            try:
+                fd, tmp_path = tempfile.mkstemp(prefix='.entity_cache-', dir=directory)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.warning(f"Error saving entity cache {self.path}: {e}")
+
+    def get(self, group_id) -> Optional[Dict]:
+        """Return the cached entry for group_id if it is still fresh"""
+        entry = self._entries.get(str(group_id))
+        if entry and time.time() - entry.get('resolved_at', 0) < self.ttl:
+            return entry
+        return None
+
+    def title(self, group_id, default: str = 'Unknown Group') -> str:
+        entry = self._entries.get(str(group_id))
+        return entry.get('title', default) if entry else default
+
+    def put(self, group_id, entity) -> Dict:
+        """Cache the resolved entity for group_id"""
+        try:
+            marked_id = int(group_id)
+        except (TypeError, ValueError):
+            # Usernames are cached under the name but addressed by peer ID
+            marked_id = utils.get_peer_id(entity)
+        real_id, peer_type = utils.resolve_id(marked_id)
+        entry = {
+            'id': real_id,
+            'access_hash': getattr(entity, 'access_hash', None) or 0,
+            'type': _PEER_TYPES.get(peer_type.__name__, 'chat'),
+            'title': getattr(entity, 'title', None) or getattr(entity, 'first_name', None) or 'Unknown Group',
+            'resolved_at': time.time()
+        }
+        self._entries[str(group_id)] = entry
+        return entry
+
+    def update_title(self, group_id, title: Optional[str]) -> bool:
+        """Record a title seen on an incoming message; returns True when it changed"""
+        entry = self._entries.get(str(group_id))
+        if not entry or not title or entry.get('title') == title:
+            return False
+        entry['title'] = title
+        return True
+
+    @staticmethod
+    def input_peer(entry: Dict):
+        """Build the input peer Telethon accepts in place of a resolved entity"""
+        if entry['type'] == 'channel':
+            return InputPeerChannel(entry['id'], entry['access_hash'])
+        if entry['type'] == 'user':
+            return InputPeerUser(entry['id'], entry['access_hash'])
+        return InputPeerChat(entry['id'])
+
+    async def resolve(self, group_id, get_entity: Callable[[Any], Awaitable[Any]]) -> Tuple[Any, str]:
+        """
+        Return (input peer, title) for group_id, calling get_entity only on a miss or expired entry.
+
+        Args:
+            group_id: Group ID or username from the config
+            get_entity: Coroutine function performing the network lookup
+        """
+        self.lookups += 1
+        entry = self.get(group_id)
+        if entry is not None:
+            self.hits += 1
+            return self.input_peer(entry), entry['title']
+
+        entity = await get_entity(group_id)
+        entry = self.put(group_id, entity)
+        self.save()
+        logger.info(f"Resolved group {group_id} ({entry['title']}) and cached it for {self.ttl}s")
+        return self.input_peer(entry), entry['title']
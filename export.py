@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Ledger export
+Streams store rows as CSV or Parquet for /api/export. Rows are filtered and
+encoded in chunks and handed to the response as they are produced, so the
+memory used does not grow with the export: CSV goes out in blocks of lines,
+Parquet one row group at a time. With the binary snapshot the date and type
+filters run on its columns and only the selected rows are decoded.
+
+Run `python export.py --rows 1000000` to measure export throughput and peak memory.
+"""
+
+import argparse
+import csv
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from analytics import columnar_source, numpy_or_none
+from snapshot import TYPES, to_epoch
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'parquet')
+COLUMNS = ['id', 'date', 'type', 'amount', 'category', 'description', 'group_id', 'group_name']
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Rows encoded per chunk (CSV block / Parquet row group)
+CHUNK_ROWS = 10000
+# CSV bytes buffered before they are sent
+CSV_FLUSH_BYTES = 64 * 1024
+
+
+def parse_bound(value: Optional[str], end: bool = False) -> Optional[int]:
+    """
+    Epoch of a from/to query value (ISO date or datetime).
+
+    A bare date as the upper bound covers that whole day.
+    """
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD or an ISO datetime")
+    if end and len(value) <= 10:
+        moment += timedelta(days=1)
+    return int(moment.timestamp())
+
+
+def _row_indices(transactions: Sequence, date_from: Optional[int], date_to: Optional[int],
+                 transaction_type: Optional[str]) -> Iterable[int]:
+    snapshot = columnar_source(transactions)
+    if snapshot is None:
+        return range(len(transactions))
+    return _masked_indices(snapshot, date_from, date_to, transaction_type)
+
+
+def _masked_indices(snapshot, date_from: Optional[int], date_to: Optional[int],
+                    transaction_type: Optional[str]) -> Iterator[int]:
+    # Filters are evaluated one block of rows at a time so the masks stay small
+    np = numpy_or_none()
+    types = snapshot.array('type')
+    epoch = snapshot.array('epoch')
+    for start in range(0, snapshot.count, CHUNK_ROWS):
+        end = start + CHUNK_ROWS
+        mask = np.ones(len(types[start:end]), dtype=bool)
+        if transaction_type:
+            mask &= types[start:end] == TYPES.index(transaction_type)
+        if date_from is not None:
+            mask &= epoch[start:end] >= date_from
+        if date_to is not None:
+            mask &= epoch[start:end] < date_to
+        for index in np.flatnonzero(mask).tolist():
+            yield start + index
+
+
+def iter_rows(transactions: Sequence, date_from: Optional[int] = None, date_to: Optional[int] = None,
+              transaction_type: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Store rows matching the filters, in store order.
+
+    Args:
+        transactions: Store rows (a list or snapshot rows)
+        date_from: Inclusive lower bound (epoch seconds)
+        date_to: Exclusive upper bound (epoch seconds)
+        transaction_type (str): Only 'income' or 'expense' rows
+    """
+    # Validated here rather than in the generator, so bad parameters fail before a response starts
+    if transaction_type and transaction_type not in TYPES:
+        raise ValueError(f"Unknown type '{transaction_type}', expected one of {', '.join(TYPES)}")
+    return _iter_rows(transactions, date_from, date_to, transaction_type)
+
+
+def _iter_rows(transactions: Sequence, date_from: Optional[int], date_to: Optional[int],
+               transaction_type: Optional[str]) -> Iterator[Dict]:
+    columnar = columnar_source(transactions) is not None
+    check_dates = not columnar and (date_from is not None or date_to is not None)
+    for index in _row_indices(transactions, date_from, date_to, transaction_type):
+        if columnar:
+            # Decoded without being cached on the shared rows
+            yield transactions.decode(index)
+            continue
+        row = transactions[index]
+        if transaction_type and row.get('type') != transaction_type:
+            continue
+        if check_dates:
+            epoch = to_epoch(row.get('date'))
+            if (date_from is not None and epoch < date_from) or (date_to is not None and epoch >= date_to):
+                continue
+        yield row
+
+
+def _chunks(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_csv(rows: Iterable[Dict]) -> Iterator[bytes]:
+    """CSV (with a UTF-8 BOM so spreadsheets detect the encoding) in blocks of about CSV_FLUSH_BYTES"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow([row.get(column, '') for column in COLUMNS])
+        if buffer.tell() >= CSV_FLUSH_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that collects what the Parquet writer emits until it is taken"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(rows: Iterable[Dict], row_group_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """Parquet file written one row group per chunk of rows; each group is sent as soon as it is encoded"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.string()),
+        ('date', pa.string()),
+        ('type', pa.dictionary(pa.int8(), pa.string())),
+        ('amount', pa.float64()),
+        ('category', pa.dictionary(pa.int16(), pa.string())),
+        ('description', pa.string()),
+        ('group_id', pa.string()),
+        ('group_name', pa.dictionary(pa.int16(), pa.string()))
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for chunk in _chunks(rows, row_group_rows):
+            columns = {column: [row.get(column) for row in chunk] for column in COLUMNS}
+            columns['id'] = [str(value) for value in columns['id']]
+            columns['group_id'] = [str(value) for value in columns['group_id']]
+            columns['amount'] = [float(value or 0) for value in columns['amount']]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def stream_export(export_format: str, rows: Iterable[Dict]) -> Iterator[bytes]:
+    if export_format == 'csv':
+        return stream_csv(rows)
+    if export_format == 'parquet':
+        return stream_parquet(rows)
+    raise ValueError(f"Unknown format '{export_format}', expected one of {', '.join(FORMATS)}")
+
+
+def logged_stream(chunks: Iterable[bytes], label: str = 'export') -> Iterator[bytes]:
+    """
+    Pass chunks through, logging an error raised while producing them.
+
+    The response status is sent before the first chunk, so such an error can only
+    truncate the download; the log is where it shows up.
+    """
+    try:
+        yield from chunks
+    except Exception as e:
+        logger.error(f"Error streaming {label}, the response was truncated: {e}")
+        raise
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a byte stream chunk by chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def benchmark(rows: int, workdir: str):
+    """Export a synthetic snapshot-backed store and report time and peak Python memory per format"""
+    from snapshot import benchmark as write_store, load_snapshot
+
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            write_store(rows, workdir)
+        finally:
+            sys.stdout = stdout
+    transactions = load_snapshot(os.path.join(workdir, 'transactions.json')).rows()
+
+    formats = [('csv', False), ('csv', True)]
+    if parquet_available():
+        formats.append(('parquet', False))
+    def run(export_format: str, compressed: bool) -> int:
+        chunks = stream_export(export_format, iter_rows(transactions))
+        if compressed:
+            chunks = gzip_stream(chunks)
+        return sum(len(chunk) for chunk in chunks)
+
+    for export_format, compressed in formats:
+        started = time.perf_counter()
+        size = run(export_format, compressed)
+        seconds = time.perf_counter() - started
+        # Second pass under tracemalloc, which slows the export down too much to time it
+        tracemalloc.start()
+        run(export_format, compressed)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        label = export_format + (' + gzip' if compressed else '')
+        print(f"{label:<14} {rows} rows, {size / 1e6:.1f} MB in {seconds:.2f}s, peak memory {peak / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure streaming export throughput and memory')
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmark(args.rows, workdir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
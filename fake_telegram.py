@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Offline Telegram client
+In-process stand-in for TelegramClient that serves entities, history and
+NewMessage/MessageEdited/MessageDeleted events from a fixture corpus, so the parser and the web app can be
+exercised and load-tested without network access or a Telegram account.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from telethon import utils
+from telethon.errors import FloodWaitError
+from telethon.tl.tlobject import TLObject
+
+logger = logging.getLogger(__name__)
+
+# Telethon fetches history in requests of at most 100 messages
+HISTORY_CHUNK_SIZE = 100
+
+
+class FakeEntity:
+    """Group/channel entity as returned by get_entity"""
+
+    def __init__(self, entity_id: int, title: str):
+        self.id = entity_id
+        self.title = title
+
+
+class FakeMessage:
+    """Subset of telethon.tl.types.Message used by the parsers"""
+
+    def __init__(self, message_id: int, text: str, date: datetime, chat_id: int, sender_id: int = 0):
+        self.id = message_id
+        self.text = text
+        self.message = text
+        self.date = date
+        self.chat_id = chat_id
+        self.sender_id = sender_id
+        self.reply_to_msg_id = None
+
+
+class FakeNewMessageEvent:
+    """Subset of events.NewMessage.Event used by the real-time handlers"""
+
+    def __init__(self, message: FakeMessage, chat: FakeEntity):
+        self.message = message
+        self.chat_id = message.chat_id
+        self.chat = chat
+
+    async def get_chat(self):
+        return self.chat
+
+
+class FakeMessageDeletedEvent:
+    """Subset of events.MessageDeleted.Event; chat_id is None outside channels, as in Telegram"""
+
+    def __init__(self, deleted_ids: List[int], chat_id: Optional[int]):
+        self.deleted_ids = deleted_ids
+        self.deleted_id = deleted_ids[0] if deleted_ids else None
+        self.chat_id = chat_id
+
+
+class _CompletedAwaitable:
+    """Lets disconnect() be called both with and without await, like Telethon"""
+
+    def __await__(self):
+        return iter(())
+
+
+def _parse_date(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return datetime.now(timezone.utc)
+
+
+def load_corpus(path: str) -> Dict[int, Dict]:
+    """
+    Load a fixture corpus into {chat_id: {'title': str, 'messages': [FakeMessage]}}.
+
+    Accepts either the ParserQ transactions format ({'income': [...],
+    'expense': [...]}) or an explicit {'groups': [{'id', 'title', 'messages'}]}
+    layout where each message has 'id', 'text' and 'date'.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    groups: Dict[int, Dict] = {}
+
+    def add_message(group_id, title, message_id, text, date):
+        chat_id = int(group_id)
+        group = groups.setdefault(chat_id, {'title': title or 'Unknown Group', 'messages': []})
+        group['messages'].append(FakeMessage(int(message_id), text, _parse_date(date), chat_id))
+
+    if isinstance(data, dict) and 'groups' in data:
+        for group in data['groups']:
+            groups.setdefault(int(group['id']), {'title': group.get('title', 'Unknown Group'), 'messages': []})
+            for m in group.get('messages', []):
+                add_message(group['id'], group.get('title'), m['id'], m.get('text', ''), m.get('date'))
+    elif isinstance(data, dict):
+        for t in data.get('income', []) + data.get('expense', []):
+            add_message(t.get('group_id'), t.get('group_title'), t.get('id'),
+                        t.get('text', t.get('description', '')), t.get('timestamp'))
+    else:
+        raise ValueError(f"Unsupported corpus format in {path}")
+
+    for group in groups.values():
+        group['messages'].sort(key=lambda m: m.id)
+
+    return groups
+
+
+class FakeTelegramClient:
+    """
+    Drop-in replacement for TelegramClient backed by an in-memory corpus.
+
+    Args:
+        session, api_id, api_hash: Accepted for signature compatibility and ignored
+        corpus: Corpus as returned by load_corpus()
+        latency (float): Seconds slept per simulated API request
+        flood_wait_rate (float): Probability that a request raises FloodWaitError
+        flood_wait_seconds (int): Wait duration carried by the raised errors
+        message_rate (float): Live messages per second emitted while
+            run_until_disconnected() is running (0 disables live traffic)
+        live_messages (int): Number of live messages to emit before
+            disconnecting (0 means run until disconnect() is called)
+        seed (int): Seed for the latency/flood-wait randomness
+    """
+
+    def __init__(self, session=None, api_id=None, api_hash=None, corpus: Optional[Dict[int, Dict]] = None,
+                 latency: float = 0.0, flood_wait_rate: float = 0.0, flood_wait_seconds: int = 1,
+                 message_rate: float = 0.0, live_messages: int = 0, seed: int = 0):
+        self.corpus = corpus or {}
+        self.latency = latency
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.message_rate = message_rate
+        self.live_messages = live_messages
+        self.request_count = 0
+        # (entity, text) of every send_message call
+        self.sent_messages: List = []
+        self._random = random.Random(seed)
+        self._handlers: List = []
+        self._connected = False
+        self._disconnected: Optional[asyncio.Event] = None
+
+    async def _request(self):
+        """Simulate one round-trip to Telegram"""
+        self.request_count += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.flood_wait_rate and self._random.random() < self.flood_wait_rate:
+            raise FloodWaitError(request=None, capture=self.flood_wait_seconds)
+
+    # Connection lifecycle
+
+    async def connect(self):
+        self._connected = True
+        self._disconnected = asyncio.Event()
+
+    async def start(self, phone=None):
+        await self.connect()
+        return self
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def disconnect(self):
+        self._connected = False
+        if self._disconnected is not None:
+            self._disconnected.set()
+        return _CompletedAwaitable()
+
+    # Requests
+
+    def _resolve_chat_id(self, entity) -> int:
+        if isinstance(entity, FakeEntity):
+            return entity.id
+        if isinstance(entity, TLObject):
+            # Input peers built from the entity cache
+            entity = utils.get_peer_id(entity)
+        try:
+            chat_id = int(entity)
+        except (TypeError, ValueError):
+            raise ValueError(f'Cannot find any entity corresponding to "{entity}"')
+        if chat_id not in self.corpus:
+            raise ValueError(f'Could not find the input entity for {entity}')
+        return chat_id
+
+    async def get_entity(self, entity) -> FakeEntity:
+        await self._request()
+        chat_id = self._resolve_chat_id(entity)
+        return FakeEntity(chat_id, self.corpus[chat_id]['title'])
+
+    async def iter_messages(self, entity, limit: Optional[int] = 20, offset_id: int = 0, min_id: int = 0,
+                            max_id: int = 0, reverse: bool = False, offset_date=None, wait_time=None, **kwargs):
+        """Async generator with the same paging semantics as TelegramClient.iter_messages"""
+        chat_id = self._resolve_chat_id(entity)
+        messages = self.corpus[chat_id]['messages']
+
+        def selected(m: FakeMessage) -> bool:
+            if min_id and m.id <= min_id:
+                return False
+            if max_id and m.id >= max_id:
+                return False
+            if offset_id and (m.id <= offset_id if reverse else m.id >= offset_id):
+                return False
+            if offset_date and (m.date < offset_date if reverse else m.date >= offset_date):
+                return False
+            return True
+
+        ordered = messages if reverse else reversed(messages)
+        matches = [m for m in ordered if selected(m)]
+        if limit is not None:
+            matches = matches[:limit]
+
+        for start in range(0, len(matches), HISTORY_CHUNK_SIZE):
+            await self._request()
+            if wait_time and start:
+                await asyncio.sleep(wait_time)
+            for message in matches[start:start + HISTORY_CHUNK_SIZE]:
+                yield message
+
+    async def send_message(self, entity, message: str):
+        """Record an outgoing message (e.g. an alert) instead of sending it"""
+        await self._request()
+        self.sent_messages.append((entity, message))
+
+    # Events
+
+    def on(self, event_builder):
+        """Register an event handler, mirroring TelegramClient.on"""
+        def decorator(handler: Callable):
+            self._handlers.append((event_builder, handler))
+            return handler
+        return decorator
+
+    def add_event_handler(self, handler: Callable, event_builder):
+        self._handlers.append((event_builder, handler))
+
+    def _next_live_message(self, sequence: int) -> Optional[FakeMessage]:
+        """Replay corpus texts as new messages with fresh IDs"""
+        chat_ids = [chat_id for chat_id, group in self.corpus.items() if group['messages']]
+        if not chat_ids:
+            return None
+        chat_id = chat_ids[sequence % len(chat_ids)]
+        group = self.corpus[chat_id]
+        template = group['messages'][(sequence // len(chat_ids)) % len(group['messages'])]
+        message = FakeMessage(group['messages'][-1].id + 1, template.text, datetime.now(timezone.utc), chat_id)
+        group['messages'].append(message)
+        return message
+
+    async def _dispatch(self, kind: str, event, chat_id: Optional[int]):
+        for builder, handler in list(self._handlers):
+            if type(builder).__name__ != kind:
+                continue
+            chats = getattr(builder, 'chats', None)
+            if chats and (chat_id is None or chat_id not in {int(c) for c in chats}):
+                continue
+            await handler(event)
+
+    async def emit_new_message(self, message: FakeMessage):
+        """Dispatch a NewMessage event for message to the matching handlers"""
+        event = FakeNewMessageEvent(message, FakeEntity(message.chat_id, self.corpus[message.chat_id]['title']))
+        await self._dispatch('NewMessage', event, message.chat_id)
+
+    async def edit_message(self, entity, message_id: int, text: str) -> FakeMessage:
+        """Change a corpus message and dispatch MessageEdited, mirroring TelegramClient.edit_message"""
+        chat_id = self._resolve_chat_id(entity)
+        await self._request()
+        message = next(m for m in self.corpus[chat_id]['messages'] if m.id == message_id)
+        message.text = message.message = text
+        event = FakeNewMessageEvent(message, FakeEntity(chat_id, self.corpus[chat_id]['title']))
+        await self._dispatch('MessageEdited', event, chat_id)
+        return message
+
+    async def delete_messages(self, entity, message_ids: List[int]):
+        """Remove corpus messages and dispatch MessageDeleted, mirroring TelegramClient.delete_messages"""
+        chat_id = self._resolve_chat_id(entity)
+        await self._request()
+        ids = set(message_ids)
+        group = self.corpus[chat_id]
+        group['messages'] = [m for m in group['messages'] if m.id not in ids]
+        # Telegram only says which chat a deletion happened in for channels/supergroups
+        reported_chat = chat_id if str(chat_id).startswith('-100') else None
+        await self._dispatch('MessageDeleted', FakeMessageDeletedEvent(list(message_ids), reported_chat), reported_chat)
+
+    async def run_until_disconnected(self):
+        """Emit live messages at message_rate until disconnected or live_messages is reached"""
+        if self._disconnected is None:
+            await self.connect()
+        disconnected = self._disconnected
+        assert disconnected is not None
+
+        if not self.message_rate:
+            await disconnected.wait()
+            return
+
+        interval = 1.0 / self.message_rate
+        sequence = 0
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while not disconnected.is_set():
+            if self.live_messages and sequence >= self.live_messages:
+                self.disconnect()
+                break
+            message = self._next_live_message(sequence)
+            if message is None:
+                await disconnected.wait()
+                break
+            await self.emit_new_message(message)
+            sequence += 1
+            next_at += interval
+            delay = next_at - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(disconnected.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+
+def fake_client_factory(corpus_path: str, **options) -> Callable:
+    """Return a client factory with TelegramClient's signature serving corpus_path"""
+    corpus = load_corpus(corpus_path)
+    logger.info(f"Using offline Telegram client with corpus {corpus_path} "
+                f"({sum(len(g['messages']) for g in corpus.values())} messages in {len(corpus)} groups)")
+
+    def factory(session, api_id, api_hash):
+        return FakeTelegramClient(session, api_id, api_hash, corpus=corpus, **options)
+
+    return factory
+
+
+def fake_client_factory_from_env() -> Optional[Callable]:
+    """
+    Build a fake client factory from TELEGRAM_FAKE_* environment variables.
+
+    TELEGRAM_FAKE_CORPUS selects the corpus file and enables the fake client;
+    TELEGRAM_FAKE_LATENCY, TELEGRAM_FAKE_FLOOD_RATE, TELEGRAM_FAKE_FLOOD_SECONDS,
+    TELEGRAM_FAKE_MESSAGE_RATE and TELEGRAM_FAKE_LIVE_MESSAGES tune it.
+    """
+    corpus_path = os.environ.get('TELEGRAM_FAKE_CORPUS')
+    if not corpus_path:
+        return None
+    return fake_client_factory(
+        corpus_path,
+        latency=float(os.environ.get('TELEGRAM_FAKE_LATENCY', 0)),
+        flood_wait_rate=float(os.environ.get('TELEGRAM_FAKE_FLOOD_RATE', 0)),
+        flood_wait_seconds=int(os.environ.get('TELEGRAM_FAKE_FLOOD_SECONDS', 1)),
+        message_rate=float(os.environ.get('TELEGRAM_FAKE_MESSAGE_RATE', 0)),
+        live_messages=int(os.environ.get('TELEGRAM_FAKE_LIVE_MESSAGES', 0)),
+    )
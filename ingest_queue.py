@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Real-time ingestion queue
+Bounded queue between the Telethon handlers and the worker that parses and
+stores real-time messages. The handlers only copy the few fields the parser
+needs out of the event and return, and the worker stores whatever has queued
+up in one write, so a flood of messages costs one store write per batch
+instead of one per message. Edits and deletions go through the same queue, so
+they are applied after the messages received before them.
+
+What happens when the queue is full is set by the policy:
+    block     the handler waits for room (Telegram updates back up in Telethon)
+    coalesce  the message is dropped and its group remembered; once the queue
+              is drained the worker fetches the group's messages after the last
+              one it had (min_id) and stores the dropped ones from there.
+              Edits and deletions cannot be fetched again and are queued anyway
+    spill     the message is appended to a file next to the store, which the
+              worker reads back after the queue is drained (and at startup)
+
+Example config:
+    "ingest": {"capacity": 1000, "policy": "coalesce", "batch_size": 200}
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, IO, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ('block', 'coalesce', 'spill')
+DEFAULT_CAPACITY = 1000
+DEFAULT_POLICY = 'block'
+# Messages stored per write
+DEFAULT_BATCH_SIZE = 200
+
+
+class IngestItem:
+    """
+    The parts of a received message (or deletion) the parser needs.
+
+    Looks like a Telethon message to build_transaction (id, text, date), so
+    the queue holds no references to events or Telethon objects. kind is
+    'new', 'edit' or 'delete'; a deletion carries the deleted IDs, its group
+    (None when Telegram did not name the chat) and the name of the session
+    that received it.
+    """
+
+    __slots__ = ('kind', 'group_id', 'id', 'text', 'date', 'title', 'received', 'ids', 'session')
+
+    def __init__(self, group_id: Optional[str], message_id: int, text: str, date: Optional[datetime],
+                 title: Optional[str] = None, received: Optional[float] = None, kind: str = 'new',
+                 ids: Optional[List[int]] = None, session: Optional[str] = None):
+        self.kind = kind
+        self.group_id = group_id
+        self.id = message_id
+        self.text = text
+        self.date = date
+        self.title = title
+        self.received = received if received is not None else time.time()
+        self.ids = ids
+        self.session = session
+
+    @classmethod
+    def from_event(cls, event, kind: str = 'new') -> 'IngestItem':
+        message = event.message
+        return cls(str(event.chat_id), message.id, message.text, message.date, getattr(event.chat, 'title', None),
+                   kind=kind)
+
+    @classmethod
+    def deletion(cls, event, session: str) -> 'IngestItem':
+        group_id = str(event.chat_id) if event.chat_id is not None else None
+        ids = list(event.deleted_ids)
+        return cls(group_id, max(ids, default=0), '', None, kind='delete', ids=ids, session=session)
+
+    def to_json(self) -> str:
+        return json.dumps({'kind': self.kind, 'group_id': self.group_id, 'id': self.id, 'text': self.text,
+                           'date': self.date.isoformat() if self.date else None, 'title': self.title,
+                           'received': self.received, 'ids': self.ids, 'session': self.session},
+                          ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, line: str) -> 'IngestItem':
+        data = json.loads(line)
+        date = datetime.fromisoformat(data['date']) if data.get('date') else None
+        return cls(data['group_id'], data['id'], data['text'], date, data.get('title'), data.get('received'),
+                   data.get('kind', 'new'), data.get('ids'), data.get('session'))
+
+
+class IngestQueue:
+    """
+    Bounded real-time message queue with an overflow policy.
+
+    Producers call put(); a single consumer calls get_batch().
+
+    Args:
+        capacity (int): Messages held in memory
+        policy (str): 'block', 'coalesce' or 'spill' (see the module docstring)
+        spill_path (str): Overflow file of the spill policy
+        batch_size (int): Most messages returned by one get_batch()
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, policy: str = DEFAULT_POLICY,
+                 spill_path: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown ingest policy '{policy}', expected one of {', '.join(POLICIES)}")
+        if policy == 'spill' and not spill_path:
+            raise ValueError("The spill policy needs a spill file")
+        self.capacity = max(1, capacity)
+        self.policy = policy
+        self.spill_path = spill_path
+        self.batch_size = max(1, batch_size)
+        self.dropped = 0
+        self.spilled = 0
+        self.processed = 0
+        # Group -> newest message ID stored before messages of the group were dropped
+        self.gaps: Dict[str, int] = {}
+        self._items: deque = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        # Newest message ID taken from the queue per group, the catch-up point if the group overflows
+        self._last_ids: Dict[str, int] = {}
+        self._pending_spill = 0
+        # Arrival time of the oldest spilled message not taken yet (approximately, once the file is read)
+        self._spill_since: Optional[float] = None
+        # Spilled messages are appended through one handle, flushed per batch
+        self._spill_file: Optional[IO] = None
+        self._draining: Optional[IO] = None
+        if spill_path:
+            self._pending_spill = self._recover_spill()
+        # Read when metrics are rendered, so the lag keeps growing while the worker is stuck
+        metrics.INGEST_LAG_SECONDS.set_function(self.lag_seconds)
+
+    @classmethod
+    def from_config(cls, settings: Optional[Dict], spill_path: Optional[str] = None) -> 'IngestQueue':
+        settings = settings or {}
+        return cls(settings.get('capacity', DEFAULT_CAPACITY), settings.get('policy', DEFAULT_POLICY),
+                   spill_path, settings.get('batch_size', DEFAULT_BATCH_SIZE))
+
+    def _recover_spill(self) -> int:
+        # Messages spilled by a previous run that did not get to drain them
+        pending = 0
+        for path in (self.spill_path + '.draining', self.spill_path):
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if self._spill_since is None:
+                            self._spill_since = self._received(line)
+                        pending += 1
+        if pending:
+            logger.info(f"{pending} spilled real-time messages left from the last run will be stored")
+        return pending
+
+    @staticmethod
+    def _received(line: str) -> float:
+        try:
+            return IngestItem.from_json(line).received
+        except (ValueError, KeyError):
+            return time.time()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def full(self) -> bool:
+        return len(self._items) >= self.capacity
+
+    @property
+    def idle(self) -> bool:
+        """Nothing queued in memory or on disk"""
+        return not self._items and not self._pending_spill
+
+    async def put(self, item: IngestItem):
+        """Queue a received message, applying the overflow policy when the queue is full"""
+        if self.policy == 'spill' and (self.full or self._pending_spill):
+            # Once messages are on disk newer ones follow them there, so they are stored in order
+            self._spill(item)
+            return
+        if self.full and self.policy == 'coalesce':
+            metrics.INGEST_OVERFLOWS.labels(policy=self.policy).inc()
+            if item.kind == 'new':
+                self.dropped += 1
+                if item.group_id not in self.gaps:
+                    self.gaps[item.group_id] = self._last_ids.get(item.group_id, item.id - 1)
+                    logger.warning(f"Ingestion queue full, dropping messages of group {item.group_id} "
+                                   f"until it can be caught up from message {self.gaps[item.group_id]}")
+                return
+        else:
+            if self.full:
+                metrics.INGEST_OVERFLOWS.labels(policy=self.policy).inc()
+            while self.full:
+                self._not_full.clear()
+                await self._not_full.wait()
+        self._items.append(item)
+        self._not_empty.set()
+        self._update_metrics()
+
+    def _spill(self, item: IngestItem):
+        # Buffered: a flood costs a write per batch rather than an open/append/close per message
+        if self._spill_file is None:
+            self._spill_file = open(self.spill_path, 'a', encoding='utf-8')
+        self._spill_file.write(item.to_json() + '\n')
+        if not self._pending_spill:
+            self._spill_since = item.received
+        self._pending_spill += 1
+        self.spilled += 1
+        metrics.INGEST_OVERFLOWS.labels(policy=self.policy).inc()
+        self._not_empty.set()
+        self._update_metrics()
+
+    async def get_batch(self) -> List[IngestItem]:
+        """Wait for messages and return up to batch_size of them, in arrival order"""
+        while not self._items and not self._pending_spill:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        if self._items:
+            batch = [self._items.popleft() for _ in range(min(self.batch_size, len(self._items)))]
+            self._not_full.set()
+        else:
+            batch = self._read_spill()
+        if self._spill_file:
+            self._spill_file.flush()
+        for item in batch:
+            if item.kind == 'new' and item.group_id not in self.gaps:
+                self._last_ids[item.group_id] = max(self._last_ids.get(item.group_id, 0), item.id)
+        self.processed += len(batch)
+        self._update_metrics()
+        return batch
+
+    def requeue(self, items: List[IngestItem]):
+        """Put a batch that could not be stored back at the front of the queue, past the capacity"""
+        self._items.extendleft(reversed(items))
+        self.processed -= len(items)
+        self._not_empty.set()
+        self._update_metrics()
+
+    def add_gaps(self, items: List[IngestItem]):
+        """Catch the groups of messages that could not be stored up from before the oldest of them"""
+        for item in items:
+            if item.kind == 'new':
+                self.gaps[item.group_id] = min(self.gaps.get(item.group_id, item.id - 1), item.id - 1)
+
+    def restore_gaps(self, gaps: Dict[str, int]):
+        """Register gaps taken by take_gaps() again (their catch-up did not finish)"""
+        for group_id, min_id in gaps.items():
+            self.gaps[group_id] = min(self.gaps.get(group_id, min_id), min_id)
+
+    def _read_spill(self) -> List[IngestItem]:
+        # The spill file is moved aside and read in batches; messages spilled meanwhile go to a new file
+        if self._draining is None:
+            self._close_spill()
+            draining_path = self.spill_path + '.draining'
+            if not os.path.exists(draining_path):
+                if not os.path.exists(self.spill_path):
+                    self._pending_spill = 0
+                    return []
+                os.replace(self.spill_path, draining_path)
+            self._draining = open(draining_path, 'r', encoding='utf-8')
+        batch = []
+        for line in self._draining:
+            try:
+                batch.append(IngestItem.from_json(line))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable spilled message: {e}")
+            if len(batch) >= self.batch_size:
+                break
+        else:
+            self._draining.close()
+            os.remove(self._draining.name)
+            self._draining = None
+        self._pending_spill = max(0, self._pending_spill - len(batch)) if self._draining else self._count_spill()
+        if not self._pending_spill:
+            self._spill_since = None
+        elif batch:
+            self._spill_since = batch[-1].received
+        return batch
+
+    def _close_spill(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _count_spill(self) -> int:
+        if self._spill_file:
+            self._spill_file.flush()
+        if not os.path.exists(self.spill_path):
+            return 0
+        with open(self.spill_path, 'r', encoding='utf-8') as f:
+            return sum(1 for _ in f)
+
+    def drain_nowait(self) -> List[IngestItem]:
+        """Everything queued in memory, without waiting (for shutdown)"""
+        items = list(self._items)
+        self._items.clear()
+        self._not_full.set()
+        self._update_metrics()
+        return items
+
+    def close(self):
+        """Flush and close the spill files; what they hold is stored on the next start"""
+        self._close_spill()
+        if self._draining is not None:
+            self._draining.close()
+            self._draining = None
+
+    def take_gaps(self) -> Dict[str, int]:
+        """Groups with dropped messages and the message ID to catch each one up from"""
+        gaps, self.gaps = self.gaps, {}
+        for group_id in gaps:
+            self._last_ids.pop(group_id, None)
+        return gaps
+
+    def lag_seconds(self) -> float:
+        """Age of the oldest message waiting to be stored, in memory or spilled (memory holds the older ones)"""
+        if self._items:
+            return time.time() - self._items[0].received
+        if self._pending_spill and self._spill_since is not None:
+            return time.time() - self._spill_since
+        return 0.0
+
+    def _update_metrics(self):
+        metrics.REALTIME_QUEUE_DEPTH.set(len(self._items) + self._pending_spill)
+
+    def stats(self) -> Dict:
+        return {
+            'policy': self.policy,
+            'capacity': self.capacity,
+            'depth': len(self._items),
+            'spill_pending': self._pending_spill,
+            'lag_seconds': round(self.lag_seconds(), 3),
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'gaps': dict(self.gaps)
+        }
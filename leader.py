@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Leader election
+Lets several web workers share one store while only one of them talks to
+Telegram. Workers compete for a file lock; the holder is the leader and runs
+the parser, the others are followers that only serve reads. When the leader
+exits the OS releases its lock and the next follower to retry takes over.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_INTERVAL = 5.0
+
+
+class LeaderElection:
+    """
+    File-lock based leader election between processes.
+
+    Args:
+        lock_path (str): Lock file shared by all competing processes
+        on_elected (Callable): Called in the election thread when this
+            process becomes leader
+        on_tick (Callable): Called on every retry interval while leader
+        retry_interval (float): Seconds between election attempts by followers
+    """
+
+    def __init__(self, lock_path: str, on_elected: Optional[Callable[[], None]] = None,
+                 on_tick: Optional[Callable[[], None]] = None, retry_interval: float = DEFAULT_RETRY_INTERVAL):
+        self.lock = FileLock(lock_path)
+        self.on_elected = on_elected
+        self.on_tick = on_tick
+        self.retry_interval = retry_interval
+        self.elected_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.lock.locked
+
+    @property
+    def role(self) -> str:
+        return 'leader' if self.is_leader else 'follower'
+
+    def try_elect(self) -> bool:
+        """Attempt to become leader once; returns True if this process leads"""
+        if self.is_leader:
+            return True
+        if not self.lock.try_acquire():
+            return False
+        self.elected_at = time.time()
+        self.lock.write_info(f"pid={os.getpid()} host={socket.gethostname()} since={self.elected_at:.0f}\n")
+        logger.info(f"Process {os.getpid()} elected leader ({self.lock.path})")
+        if self.on_elected:
+            try:
+                self.on_elected()
+            except Exception as e:
+                logger.error(f"Error in leader election callback: {e}")
+        return True
+
+    def start(self) -> bool:
+        """Run one election now and keep retrying (or ticking) in a daemon thread"""
+        elected = self.try_elect()
+        if not elected:
+            logger.info(f"Process {os.getpid()} is a follower; another worker holds {self.lock.path}")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='leader-election', daemon=True)
+            self._thread.start()
+        return elected
+
+    def _run(self):
+        while not self._stop.wait(self.retry_interval):
+            if not self.is_leader:
+                self.try_elect()
+            elif self.on_tick:
+                try:
+                    self.on_tick()
+                except Exception as e:
+                    logger.error(f"Error in leader tick: {e}")
+
+    def stop(self):
+        """Stop retrying and step down"""
+        self._stop.set()
+        if self.is_leader:
+            logger.info(f"Process {os.getpid()} stepping down as leader")
+        self.lock.release()
+        self.elected_at = None
+
+    def status(self) -> dict:
+        return {
+            'role': self.role,
+            'pid': os.getpid(),
+            'leader_since': self.elected_at
+        }
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - HTTP API load benchmark
+Starts app.py against a synthetic transaction store in a temporary directory
+and drives the real API endpoints with concurrent polling clients.
+Runs fully offline: Telegram is replaced by the fake client from fake_telegram.py.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+APP_DIR = Path(__file__).resolve().parent
+
+INCOME_GROUP_ID = '-4855539306'
+EXPENSE_GROUP_ID = '-4884869527'
+
+# Endpoint weights roughly matching a mini app that polls status and summary
+# and occasionally reloads the transaction list
+DEFAULT_MIX = 'status=6,summary=3,transactions=1'
+
+ENDPOINTS = {
+    'transactions': '/api/transactions',
+    'summary': '/api/summary',
+    'status': '/api/status',
+}
+
+SAMPLE_TEXTS = [
+    'продукты магазин {amount}',
+    'такси {amount}',
+    'коммуналка {amount} руб',
+    'угловой диван {amount}',
+    'аптека {amount}₽',
+    'зарплата {amount}',
+]
+
+
+def generate_store(path: Path, rows: int, seed: int = 0):
+    """Write a synthetic transactions.json with the given number of rows"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    data: Dict[str, List[Dict]] = {'income': [], 'expense': []}
+
+    for i in range(rows):
+        kind = 'income' if rng.random() < 0.4 else 'expense'
+        amount = float(rng.randint(1, 500) * 100)
+        text = rng.choice(SAMPLE_TEXTS).format(amount=int(amount))
+        data[kind].append({
+            'id': str(rows - i),
+            'timestamp': (start + timedelta(minutes=rows - i)).isoformat(),
+            'group_id': INCOME_GROUP_ID if kind == 'income' else EXPENSE_GROUP_ID,
+            'group_title': 'ПРИХОД' if kind == 'income' else 'РАСХОД',
+            'text': text,
+            'sender_id': 0,
+            'amount': amount,
+            'currency': 'RUB',
+            'description': text
+        })
+
+    data['last_updated'] = datetime.now().isoformat()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def write_config(path: Path, port: int):
+    config = {
+        'api_id': 1,
+        'api_hash': 'offline',
+        'phone_number': '',
+        'group_ids': [
+            {'id': EXPENSE_GROUP_ID, 'name': 'расход'},
+            {'id': INCOME_GROUP_ID, 'name': 'приход'}
+        ],
+        'group_types': {
+            EXPENSE_GROUP_ID: 'expense',
+            INCOME_GROUP_ID: 'income'
+        },
+        'web_server': {'host': '127.0.0.1', 'port': port, 'debug': False}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def read_rss_kb(pid: int) -> Optional[int]:
+    """Resident set size of pid in KiB, or None when it cannot be determined"""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss // 1024
+    except Exception:
+        return None
+
+
+def parse_mix(mix: str) -> List[str]:
+    """Turn 'status=6,summary=3' into a weighted list of endpoint names"""
+    weighted = []
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}', expected one of {', '.join(ENDPOINTS)}")
+        weighted.extend([name] * int(weight or 1))
+    return weighted
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoadRunner:
+    """Drives the API with a fixed number of concurrent keep-alive clients"""
+
+    def __init__(self, host: str, port: int, concurrency: int, duration: float, mix: List[str],
+                 poll_interval: float = 0.0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.concurrency = concurrency
+        self.duration = duration
+        self.mix = mix
+        self.poll_interval = poll_interval
+        self.seed = seed
+        self.latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.errors: Dict[str, int] = {name: 0 for name in ENDPOINTS}
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    def _worker(self, worker_id: int, deadline: float):
+        rng = random.Random(self.seed + worker_id)
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        errors: Dict[str, int] = {name: 0 for name in ENDPOINTS}
+        received = 0
+
+        while time.perf_counter() < deadline:
+            name = rng.choice(self.mix)
+            started = time.perf_counter()
+            try:
+                conn.request('GET', ENDPOINTS[name])
+                response = conn.getresponse()
+                body = response.read()
+                if response.status != 200:
+                    errors[name] += 1
+                    continue
+                latencies[name].append(time.perf_counter() - started)
+                received += len(body)
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                errors[name] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            if self.poll_interval:
+                time.sleep(self.poll_interval)
+
+        conn.close()
+        with self._lock:
+            for name in ENDPOINTS:
+                self.latencies[name].extend(latencies[name])
+                self.errors[name] += errors[name]
+            self.bytes_received += received
+
+    def run(self) -> float:
+        deadline = time.perf_counter() + self.duration
+        threads = [threading.Thread(target=self._worker, args=(i, deadline), daemon=True)
+                   for i in range(self.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+
+def wait_until_ready(host: str, port: int, process: subprocess.Popen, timeout: float = 120.0) -> float:
+    """Poll /api/status until the workspace has finished warming up; returns seconds waited"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} during startup")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/api/status')
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+            # The server answers while the store is still loading; only 'ready' means it is loaded
+            if response.status == 200 and json.loads(body).get('data', {}).get('status') == 'ready':
+                return time.perf_counter() - started
+        except (OSError, ValueError, http.client.HTTPException):
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Server did not become ready within {timeout:.0f}s")
+
+
+def run_benchmark(rows: int, concurrency: int, duration: float, mix: str, poll_interval: float = 0.0,
+                  workdir: Optional[str] = None, keep: bool = False, seed: int = 0) -> Dict:
+    """Start the app on a synthetic store, run the load and return the report"""
+    weighted_mix = parse_mix(mix)
+    temp_dir = workdir or tempfile.mkdtemp(prefix='finance-agent-bench-')
+    work_path = Path(temp_dir)
+    work_path.mkdir(parents=True, exist_ok=True)
+    host, port = '127.0.0.1', free_port()
+
+    generate_store(work_path / 'transactions.json', rows, seed)
+    generate_store(work_path / 'corpus.json', min(rows, 200), seed)
+    write_config(work_path / 'config.json', port)
+
+    env = dict(os.environ)
+    env['TELEGRAM_FAKE_CORPUS'] = str(work_path / 'corpus.json')
+    env['PYTHONUNBUFFERED'] = '1'
+
+    log_file = open(work_path / 'server.log', 'w')
+    process = subprocess.Popen([sys.executable, str(APP_DIR / 'app.py'), str(port), host],
+                               cwd=temp_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    rss_samples: List[int] = []
+    stop_sampling = threading.Event()
+
+    def sample_rss():
+        while not stop_sampling.is_set():
+            rss = read_rss_kb(process.pid)
+            if rss:
+                rss_samples.append(rss)
+            stop_sampling.wait(0.25)
+
+    try:
+        startup_seconds = wait_until_ready(host, port, process)
+        rss_idle = read_rss_kb(process.pid)
+
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+        runner = LoadRunner(host, port, concurrency, duration, weighted_mix, poll_interval, seed)
+        elapsed = runner.run()
+        stop_sampling.set()
+        sampler.join()
+    finally:
+        stop_sampling.set()
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log_file.close()
+        if not keep and not workdir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    all_latencies = sorted(l for values in runner.latencies.values() for l in values)
+    report = {
+        'rows': rows,
+        'concurrency': concurrency,
+        'duration': round(elapsed, 3),
+        'mix': mix,
+        'startup_seconds': round(startup_seconds, 3),
+        'requests': len(all_latencies),
+        'errors': sum(runner.errors.values()),
+        'throughput_rps': round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+        'bytes_received': runner.bytes_received,
+        'rss_idle_kb': rss_idle,
+        'rss_peak_kb': max(rss_samples) if rss_samples else None,
+        'endpoints': {}
+    }
+    for name, values in runner.latencies.items():
+        values.sort()
+        if not values and not runner.errors[name]:
+            continue
+        report['endpoints'][name] = {
+            'requests': len(values),
+            'errors': runner.errors[name],
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p90_ms': round(percentile(values, 90) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2) if values else 0.0
+        }
+    report['p50_ms'] = round(percentile(all_latencies, 50) * 1000, 2)
+    report['p90_ms'] = round(percentile(all_latencies, 90) * 1000, 2)
+    report['p99_ms'] = round(percentile(all_latencies, 99) * 1000, 2)
+    return report
+
+
+def print_report(report: Dict):
+    print(f"Rows: {report['rows']}  Concurrency: {report['concurrency']}  "
+          f"Duration: {report['duration']}s  Mix: {report['mix']}")
+    print(f"Startup: {report['startup_seconds']}s  "
+          f"RSS idle: {report['rss_idle_kb']} KiB  RSS peak: {report['rss_peak_kb']} KiB")
+    print(f"Requests: {report['requests']}  Errors: {report['errors']}  "
+          f"Throughput: {report['throughput_rps']} req/s")
+    print(f"{'endpoint':<14}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in report['endpoints'].items():
+        print(f"{name:<14}{stats['requests']:>10}{stats['errors']:>8}{stats['p50_ms']:>10}"
+              f"{stats['p90_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    print(f"{'all':<14}{report['requests']:>10}{report['errors']:>8}{report['p50_ms']:>10}"
+          f"{report['p90_ms']:>10}{report['p99_ms']:>10}")
+
+
+def main():
+    """Main function for standalone usage"""
+    parser = argparse.ArgumentParser(description='HTTP API load benchmark for app.py')
+    parser.add_argument('--rows', type=int, default=10000, help='Synthetic transactions in the store')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to apply load')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Weighted endpoint mix (default: {DEFAULT_MIX})')
+    parser.add_argument('--poll-interval', type=float, default=0.0,
+                        help='Pause between requests per client, in seconds (0 = closed loop)')
+    parser.add_argument('--workdir', help='Directory for the synthetic store (default: temporary)')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary directory and server log')
+    parser.add_argument('--json', help='Also write the report to this file')
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    report = run_benchmark(args.rows, args.concurrency, args.duration, args.mix,
+                           args.poll_interval, args.workdir, args.keep, args.seed)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -688,14 +688,37 @@ function saveSettings() {
     localStorage.setItem('settings', JSON.stringify(config));
 }
 
+// Rows of a format=columnar /api/transactions page (see columnar.py)
+function decodeColumnar(page) {
+    const dictionaries = page.dictionaries;
+    const columns = page.columns;
+    const rows = new Array(page.count);
+    let epoch = 0;
+    for (let i = 0; i < page.count; i++) {
+        epoch += columns.date[i];
+        const group = dictionaries.group[columns.group[i]];
+        rows[i] = {
+            id: columns.id[i],
+            amount: columns.amount[i],
+            type: dictionaries.type[columns.type[i]],
+            description: columns.description[i],
+            category: dictionaries.category[columns.category[i]],
+            date: new Date(epoch * 1000).toISOString(),
+            group_id: group[0],
+            group_name: group[1]
+        };
+    }
+    return rows;
+}
+
 // Real-time data loading function
 async function loadData() {
     try {
-        const response = await fetch('/api/transactions');
+        const response = await fetch('/api/transactions?format=columnar');
         const data = await response.json();
         
         if (data.success) {
-            transactions = data.data;
+            transactions = data.format === 'columnar' ? decodeColumnar(data.data) : data.data;
             initializeApp();
         } else {
             showNotification('Ошибка при загрузке данных', 'error');
@@ -1063,11 +1086,11 @@ document.addEventListener('DOMContentLoaded', function() {
 
 async function loadData() {
     try {
-        const response = await fetch('/api/transactions');
+        const response = await fetch('/api/transactions?format=columnar');
         const data = await response.json();
         
         if (data.success) {
-            transactions = data.data;
+            transactions = data.format === 'columnar' ? decodeColumnar(data.data) : data.data;
             initializeApp();
         } else {
             showNotification('Ошибка при загрузке данных', 'error');
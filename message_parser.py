@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Message parser
+The message parsing rules (group types, amount patterns, category keywords)
+as a small picklable object with no Telegram dependency, plus a batch API
+that fans (text, group_id) streams out to a process pool. Each worker
+builds the parser once from the rules passed to its initializer; only the
+message chunks travel per task, and results come back in input order.
+ParseCache memoizes results for texts that are parsed again (every parse
+cycle re-fetches the latest messages of each group).
+
+Run `python message_parser.py --messages 1000000` to compare one core against the pool.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORY = 'другое'
+DEFAULT_CATEGORIES = {
+    'еда': ['продукты', 'магазин', 'еда', 'ресторан', 'кафе', 'обед', 'ужин'],
+    'транспорт': ['такси', 'метро', 'автобус', 'бензин', 'транспорт', 'поездка'],
+    'жкх': ['коммуналка', 'жкх', 'свет', 'вода', 'газ', 'интернет', 'телефон'],
+    'развлечения': ['кино', 'театр', 'концерт', 'отдых', 'путешествие', 'отпуск'],
+    'здоровье': ['аптека', 'врач', 'медицина', 'лекарства', 'больница'],
+    'одежда': ['одежда', 'обувь', 'магазин одежды', 'стиль'],
+    'образование': ['курсы', 'обучение', 'университет', 'книги', 'учеба'],
+    'работа': ['зарплата', 'аванс', 'премия', 'доход', 'бизнес']
+}
+
+# Tried in order: number with a currency symbol, number at the end of the message, any number
+AMOUNT_PATTERNS = [
+    re.compile(r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*(?:₽|руб|RUB|р)'),
+    re.compile(r'(\d+(?:,\d{3})*(?:\.\d{2})?)$'),
+    re.compile(r'(\d+(?:,\d{3})*(?:\.\d{2})?)')
+]
+
+# Messages per task sent to a worker
+DEFAULT_CHUNK_SIZE = 2000
+# Parse results kept by ParseCache
+DEFAULT_PARSE_CACHE_SIZE = 10000
+
+# Bound once: looking up the labelled child costs about as much as a cache hit
+_CACHE_HITS = metrics.PARSE_CACHE_LOOKUPS.labels(result='hit')
+_CACHE_MISSES = metrics.PARSE_CACHE_LOOKUPS.labels(result='miss')
+
+
+class MessageParser:
+    """
+    Parses message texts into transaction fields.
+
+    The transaction type comes from the group the message was posted in
+    (group_types), the amount from the first matching amount pattern and the
+    category from the first category whose keywords occur in the text.
+
+    Args:
+        group_types (Dict): Group ID -> 'income' or 'expense'
+        categories (Dict): Category -> keywords, checked in order
+    """
+
+    def __init__(self, group_types: Optional[Dict] = None, categories: Optional[Dict[str, List[str]]] = None):
+        self.group_types: Dict[str, str] = {}
+        for group_id, group_type in (group_types or {}).items():
+            self.group_types.setdefault(str(group_id), group_type)
+        self.categories = dict(categories or DEFAULT_CATEGORIES)
+        self._rules_version: Optional[str] = None
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'MessageParser':
+        return cls(config.get('group_types', {}), config.get('categories'))
+
+    @property
+    def rules(self) -> Dict:
+        """Constructor arguments, e.g. for building the same parser in a worker process"""
+        return {'group_types': self.group_types, 'categories': self.categories}
+
+    @property
+    def rules_version(self) -> str:
+        """Hash of the rules; changes whenever group types or categories change"""
+        if self._rules_version is None:
+            encoded = json.dumps(self.rules, sort_keys=True, ensure_ascii=False).encode('utf-8')
+            self._rules_version = hashlib.blake2b(encoded, digest_size=8).hexdigest()
+        return self._rules_version
+
+    def group_type(self, group_id) -> Optional[str]:
+        return self.group_types.get(str(group_id))
+
+    def parse(self, message: str, group_id) -> Optional[Dict]:
+        """Transaction fields of a message, or None if it is not financial or its group has no type"""
+        if not message:
+            return None
+
+        message = message.lower().strip()
+
+        transaction_type = self.group_type(group_id)
+        if not transaction_type:
+            logger.debug(f"No transaction type configured for group {group_id}")
+            return None
+
+        for pattern in AMOUNT_PATTERNS:
+            amount_match = pattern.search(message)
+            if amount_match:
+                break
+        else:
+            return None
+
+        try:
+            amount = float(amount_match.group(1).replace(',', ''))
+        except ValueError:
+            return None
+
+        return {
+            'amount': amount,
+            'type': transaction_type,  # Use type from group configuration
+            'description': message[:100],  # First 100 chars as description
+            'category': self.extract_category(message)
+        }
+
+    def extract_category(self, message: str) -> str:
+        message_lower = message.lower()
+        for category, keywords in self.categories.items():
+            if any(keyword in message_lower for keyword in keywords):
+                return category
+        return DEFAULT_CATEGORY
+
+
+class ParseCache:
+    """
+    Bounded LRU memo of parse results.
+
+    The result of a parse depends only on the normalized text, the type of
+    the group it was posted in and the rules, so entries are keyed by a hash
+    of those three; messages repeated across groups of the same type share an
+    entry. When the parser's rules version changes the cache is emptied.
+
+    Args:
+        capacity (int): Entries kept
+    """
+
+    def __init__(self, capacity: int = DEFAULT_PARSE_CACHE_SIZE):
+        self.capacity = capacity
+        self.rules_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: 'OrderedDict[bytes, Optional[Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, parser: MessageParser, message: str, group_id) -> Optional[Dict]:
+        """parser.parse(message, group_id), answered from the cache when the same text was parsed before"""
+        group_type = parser.group_type(group_id)
+        if not message or not group_type or self.capacity <= 0:
+            # Nothing to parse; not worth an entry
+            return parser.parse(message, group_id)
+
+        rules_version = parser.rules_version
+        key = hashlib.blake2b(f'{rules_version}\0{group_type}\0{message.lower().strip()}'.encode('utf-8'),
+                              digest_size=16).digest()
+        with self._lock:
+            if rules_version != self.rules_version:
+                self._invalidate(rules_version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                _CACHE_HITS.inc()
+                parsed = self._entries[key]
+                return dict(parsed) if parsed is not None else None
+
+        parsed = parser.parse(message, group_id)
+        with self._lock:
+            self.misses += 1
+            _CACHE_MISSES.inc()
+            if rules_version == self.rules_version:
+                self._entries[key] = dict(parsed) if parsed is not None else None
+                if len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+        return parsed
+
+    def _invalidate(self, rules_version: Optional[str]):
+        if self._entries:
+            self.invalidations += 1
+            logger.info(f"Parse rules changed; dropping {len(self._entries)} cached parse results")
+        self._entries.clear()
+        self.rules_version = rules_version
+
+    def clear(self):
+        with self._lock:
+            self._invalidate(None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'entries': len(self._entries),
+                'capacity': self.capacity,
+                'invalidations': self.invalidations,
+                'rules_version': self.rules_version
+            }
+
+
+# Parser of a pool worker, built once by _init_worker
+_worker_parser: Optional[MessageParser] = None
+
+
+def _init_worker(rules: Dict):
+    global _worker_parser
+    _worker_parser = MessageParser(**rules)
+
+
+def _parse_chunk(chunk: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+    return [_worker_parser.parse(text, group_id) for text, group_id in chunk]
+
+
+def parse_batch(pairs: Iterable[Tuple[str, str]], parser: MessageParser, workers: Optional[int] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Optional[Dict]]:
+    """
+    Parse a stream of (text, group_id) pairs on a process pool.
+
+    Results are yielded in input order. At most two chunks per worker are in
+    flight, so arbitrarily long inputs are read lazily.
+
+    Args:
+        pairs: (text, group_id) pairs
+        parser (MessageParser): Rules to parse with, sent once to each worker
+        workers (int): Worker processes (default: CPU count); 1 parses in this process
+        chunk_size (int): Pairs per task
+    """
+    workers = workers or os.cpu_count() or 1
+    pairs = iter(pairs)
+    if workers == 1:
+        for text, group_id in pairs:
+            yield parser.parse(text, group_id)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(parser.rules,)) as pool:
+        in_flight = deque()
+        while True:
+            while len(in_flight) < workers * 2:
+                chunk = list(islice(pairs, chunk_size))
+                if not chunk:
+                    break
+                in_flight.append(pool.submit(_parse_chunk, chunk))
+            if not in_flight:
+                return
+            yield from in_flight.popleft().result()
+
+
+def benchmark(messages: int, workers: int, chunk_size: int):
+    """Parse a synthetic corpus on one core and on the pool and compare"""
+    group_types = {str(-1000000000 - i): ('income' if i % 3 == 0 else 'expense') for i in range(20)}
+    parser = MessageParser(group_types)
+    words = ['обед в кафе', 'такси до офиса', 'бензин', 'аптека', 'курсы английского', 'премия', 'разное']
+
+    def corpus():
+        for i in range(messages):
+            yield f'{i} {words[i % len(words)]} {i % 9000 + 100} руб', str(-1000000000 - i % 20)
+
+    started = time.perf_counter()
+    sequential = sum(1 for result in parse_batch(corpus(), parser, workers=1) if result)
+    sequential_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    pooled = sum(1 for result in parse_batch(corpus(), parser, workers=workers, chunk_size=chunk_size) if result)
+    pooled_seconds = time.perf_counter() - started
+
+    assert pooled == sequential
+    print(f"{messages} messages, {sequential} transactions")
+    print(f"  1 process:   {sequential_seconds:.2f}s ({messages / sequential_seconds:,.0f} messages/s)")
+    print(f"  {workers} processes: {pooled_seconds:.2f}s ({messages / pooled_seconds:,.0f} messages/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sequential and process-pool message parsing')
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    benchmark(args.messages, args.workers, args.chunk_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
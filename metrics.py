@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Metrics
+Minimal in-process Prometheus-style metrics (counters, gauges, histograms)
+rendered in the text exposition format for the /metrics endpoint.
+Recording is a lock-protected increment, cheap enough for the per-message path.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from sub-millisecond regex parses up to slow Telegram fetches
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bytes, from a few rows up to multi-hundred-megabyte stores
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760, 104857600, 1073741824)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class _Metric:
+    """Base class for a metric family with optional labels"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional['Registry'] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], '_Metric'] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self) -> '_Metric':
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs) -> '_Metric':
+        """Return the child metric for the given label values"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self) -> List[Tuple[str, str, float]]:
+        """Return (suffix, labels, value) tuples for rendering"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, value in self._samples():
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._value = 0.0
+
+    def _new_child(self) -> 'Counter':
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def _samples(self):
+        if not self.labelnames:
+            return [('', '', self._value)]
+        return [('', _format_labels(self.labelnames, values), child._value)
+                for values, child in list(self._children.items())]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._value = 0.0
+        self._function = None
+
+    def _new_child(self) -> 'Gauge':
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        """Read the value from function whenever it is rendered (None goes back to the set value)"""
+        self._function = function
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function else self._value
+
+    def _samples(self):
+        if not self.labelnames:
+            return [('', '', self.value)]
+        return [('', _format_labels(self.labelnames, values), child.value)
+                for values, child in list(self._children.items())]
+
+
+class _Timer:
+    """Context manager observing the elapsed time into a histogram"""
+
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram: 'Histogram'):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional['Registry'] = None, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> 'Histogram':
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def _child_samples(self, names: Tuple[str, ...], values: Tuple[str, ...]):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            samples.append(('_bucket', _format_labels(names, values, le), cumulative))
+        samples.append(('_sum', _format_labels(names, values), total))
+        samples.append(('_count', _format_labels(names, values), count))
+        return samples
+
+    def _samples(self):
+        if not self.labelnames:
+            return self._child_samples((), ())
+        samples = []
+        for values, child in list(self._children.items()):
+            samples.extend(child._child_samples(self.labelnames, values))
+        return samples
+
+
+class Registry:
+    """Collection of metric families rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Telegram fetch path
+TELEGRAM_FETCH_SECONDS = Histogram(
+    'telegram_fetch_seconds', 'Time to fetch and parse recent messages from one group',
+    ['group_id'], registry=REGISTRY)
+MESSAGES_SEEN = Counter(
+    'telegram_messages_seen_total', 'Messages passed to parse_financial_message', registry=REGISTRY)
+TRANSACTIONS_PARSED = Counter(
+    'transactions_parsed_total', 'Messages recognized as financial transactions', registry=REGISTRY)
+PARSE_MISSES = Counter(
+    'parse_misses_total', 'Messages not recognized as financial transactions', registry=REGISTRY)
+PARSE_SECONDS = Histogram(
+    'parse_financial_message_seconds', 'parse_financial_message latency', registry=REGISTRY)
+PARSE_CACHE_LOOKUPS = Counter(
+    'parse_cache_lookups_total', 'Parse result memo cache lookups', ['result'], registry=REGISTRY)
+PARSE_CACHE_ENTRIES = Gauge(
+    'parse_cache_entries', 'Parse results held in the memo cache', ['workspace'], registry=REGISTRY)
+TELEGRAM_FLOOD_WAITS = Counter(
+    'telegram_flood_waits_total', 'FloodWait errors returned by Telegram', registry=REGISTRY)
+TELEGRAM_REQUEST_RATE = Gauge(
+    'telegram_request_rate', 'Current adaptive request rate (requests per second)', ['limiter'], registry=REGISTRY)
+TELEGRAM_SESSION_HEALTHY = Gauge(
+    'telegram_session_healthy', 'Whether a Telegram session is serving its groups (1) or rebalanced away (0)',
+    ['session'], registry=REGISTRY)
+
+# Store
+SAVE_SECONDS = Histogram(
+    'save_transactions_seconds', 'save_transactions duration', registry=REGISTRY)
+SAVE_BYTES = Histogram(
+    'save_transactions_bytes', 'Bytes written by save_transactions', registry=REGISTRY, buckets=SIZE_BUCKETS)
+STORE_SIZE = Gauge(
+    'transaction_store_size', 'Transactions currently in the store', ['workspace'], registry=REGISTRY)
+
+# Real-time monitoring
+REALTIME_QUEUE_DEPTH = Gauge(
+    'realtime_queue_depth', 'Real-time messages received but not yet processed', registry=REGISTRY)
+INGEST_LAG_SECONDS = Gauge(
+    'ingest_lag_seconds', 'Age of the oldest real-time message waiting to be stored', registry=REGISTRY)
+INGEST_OVERFLOWS = Counter(
+    'ingest_overflows_total', 'Real-time messages that found the ingestion queue full', ['policy'],
+    registry=REGISTRY)
+ALERTS_FIRED = Counter(
+    'alerts_fired_total', 'Budget and large-expense alerts raised', ['kind'], registry=REGISTRY)
+
+# HTTP API
+API_REQUEST_SECONDS = Histogram(
+    'api_request_seconds', 'HTTP request latency per route', ['route', 'method'], registry=REGISTRY)
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'response_cache_lookups_total', 'API response cache lookups', ['workspace', 'result'], registry=REGISTRY)
+
+
+def render() -> str:
+    """Render all registered metrics in Prometheus text format"""
+    return REGISTRY.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread, for processes without the Flask app (e.g. the real-time parser)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - On-demand profiling
+Opt-in cProfile sessions around sampled HTTP requests, parse cycles and
+real-time message handlers. The top-N functions of each session are written
+to a rotating set of text files.
+
+Enable with FINANCE_AGENT_PROFILE=<sample rate> (e.g. 0.05 or 1) or at runtime
+through POST /api/admin/profiling. When disabled, the hooks cost a single
+attribute check.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileSession:
+    """A running cProfile session that dumps its report when stopped"""
+
+    def __init__(self, profiler: 'Profiler', label: str):
+        self.profiler = profiler
+        self.label = label
+        self.started = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self) -> Optional[Path]:
+        self._profile.disable()
+        self.profiler._release()
+        return self.profiler._dump(self.label, self._profile, time.perf_counter() - self.started)
+
+
+class Profiler:
+    """
+    Sampling cProfile wrapper with rotating top-N reports.
+
+    Args:
+        output_dir (str): Directory for the report files
+        sample_rate (float): Fraction of sampled invocations to profile (0 disables)
+        top_n (int): Number of functions listed per report
+        max_files (int): Oldest reports beyond this count are deleted
+        sort_by (str): pstats sort key for the report
+    """
+
+    def __init__(self, output_dir: str = 'profiles', sample_rate: float = 0.0, top_n: int = 30,
+                 max_files: int = 50, sort_by: str = 'cumulative'):
+        self.output_dir = Path(output_dir)
+        self.top_n = top_n
+        self.max_files = max_files
+        self.sort_by = sort_by
+        self.sample_rate = 0.0
+        self.enabled = False
+        self.sessions_written = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.configure(sample_rate=sample_rate)
+
+    @classmethod
+    def from_env(cls) -> 'Profiler':
+        """Create a profiler configured from FINANCE_AGENT_PROFILE* environment variables"""
+        try:
+            sample_rate = float(os.environ.get('FINANCE_AGENT_PROFILE', 0) or 0)
+        except ValueError:
+            logger.warning("Invalid FINANCE_AGENT_PROFILE value, profiling disabled")
+            sample_rate = 0.0
+        return cls(
+            output_dir=os.environ.get('FINANCE_AGENT_PROFILE_DIR', 'profiles'),
+            sample_rate=sample_rate,
+            top_n=int(os.environ.get('FINANCE_AGENT_PROFILE_TOP', 30)),
+            max_files=int(os.environ.get('FINANCE_AGENT_PROFILE_MAX_FILES', 50)),
+        )
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                  top_n: Optional[int] = None):
+        """Update profiling settings; enabling without a rate profiles every invocation"""
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if enabled is True and self.sample_rate == 0.0:
+            self.sample_rate = 1.0
+        if enabled is False:
+            self.sample_rate = 0.0
+        if top_n is not None:
+            self.top_n = int(top_n)
+        self.enabled = self.sample_rate > 0.0
+        if self.enabled:
+            logger.info(f"Profiling enabled (sample rate {self.sample_rate}, reports in {self.output_dir})")
+
+    def start(self, label: str, sample: bool = True) -> Optional[ProfileSession]:
+        """
+        Start a profiling session, or return None when this invocation is not profiled.
+
+        Args:
+            label (str): Name used in the report file name
+            sample (bool): Apply the sample rate; False profiles every invocation while enabled
+        """
+        if not self.enabled:
+            return None
+        if sample and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        # cProfile cannot nest on one thread; the outer session already covers this call
+        if getattr(self._local, 'active', False):
+            return None
+        self._local.active = True
+        try:
+            return ProfileSession(self, label)
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) is already active
+            self._local.active = False
+            logger.debug(f"Could not start profiler: {e}")
+            return None
+
+    @contextmanager
+    def profile(self, label: str, sample: bool = True):
+        """Context manager form of start()/stop()"""
+        session = self.start(label, sample)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                session.stop()
+
+    def _release(self):
+        self._local.active = False
+
+    def _dump(self, label: str, profile: cProfile.Profile, elapsed: float) -> Optional[Path]:
+        try:
+            stream = io.StringIO()
+            stats = pstats.Stats(profile, stream=stream)
+            stream.write(f"{label} - {elapsed * 1000:.1f} ms - {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            stats.sort_stats(self.sort_by).print_stats(self.top_n)
+
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            safe_label = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'session'
+            with self._lock:
+                self.sessions_written += 1
+                path = self.output_dir / (f"{time.strftime('%Y%m%d-%H%M%S')}-{self.sessions_written:06d}"
+                                          f"-{safe_label}.txt")
+                path.write_text(stream.getvalue(), encoding='utf-8')
+                self._rotate()
+            return path
+        except Exception as e:
+            logger.error(f"Error writing profile report for {label}: {e}")
+            return None
+
+    def _rotate(self):
+        reports = sorted(self.output_dir.glob('*.txt'))
+        for old in reports[:max(0, len(reports) - self.max_files)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    def recent_reports(self, limit: int = 20) -> List[str]:
+        if not self.output_dir.exists():
+            return []
+        return [p.name for p in sorted(self.output_dir.glob('*.txt'))[-limit:]]
+
+    def status(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'top_n': self.top_n,
+            'output_dir': str(self.output_dir),
+            'sessions_written': self.sessions_written,
+            'recent_reports': self.recent_reports()
+        }
+
+
+PROFILER = Profiler.from_env()
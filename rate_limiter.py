@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Adaptive rate limiter
+Token bucket shared by every Telegram request of a client. FloodWait errors
+block all callers for the requested duration and cut the request rate
+(multiplicative decrease); successful requests raise it again slowly
+(additive increase), so the limiter settles just below the account's limit.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from telethon.errors import FloodWaitError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram returns at most 100 messages per history request
+MAX_BATCH_SIZE = 100
+
+
+class AdaptiveRateLimiter:
+    """
+    AIMD token bucket for Telegram API calls.
+
+    Args:
+        requests_per_second (float): Initial sustained request rate
+        burst (int): Bucket capacity
+        min_rate (float): Lower bound for the adapted rate
+        max_rate (float): Upper bound for the adapted rate
+        increase (float): Rate added after each successful request
+        decrease (float): Factor applied to the rate on FloodWait
+        min_batch_size (int): Smallest iter_messages chunk after throttling
+        max_retries (int): FloodWait retries per call before giving up
+        max_flood_wait (int): FloodWaits longer than this (seconds) are raised
+            to the caller instead of being slept through
+    """
+
+    def __init__(self, requests_per_second: float = 1.0, burst: int = 5, min_rate: float = 0.05,
+                 max_rate: float = 20.0, increase: float = 0.05, decrease: float = 0.5,
+                 min_batch_size: int = 20, max_retries: int = 3, max_flood_wait: int = 300,
+                 name: str = 'default'):
+        self.rate = requests_per_second
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.min_batch_size = min_batch_size
+        self.batch_size = MAX_BATCH_SIZE
+        self.max_retries = max_retries
+        self.max_flood_wait = max_flood_wait
+        self.name = name
+        self.flood_waits = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        metrics.TELEGRAM_REQUEST_RATE.labels(limiter=name).set(self.rate)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict], name: str = 'default') -> 'AdaptiveRateLimiter':
+        """Create a limiter from the 'rate_limit' config section"""
+        config = config or {}
+        return cls(
+            requests_per_second=config.get('requests_per_second', 1.0),
+            burst=config.get('burst', 5),
+            min_rate=config.get('min_rate', 0.05),
+            max_rate=config.get('max_rate', 20.0),
+            max_retries=config.get('max_retries', 3),
+            max_flood_wait=config.get('max_flood_wait', 300),
+            name=name
+        )
+
+    @property
+    def wait_time(self) -> float:
+        """Pause between consecutive history requests at the current rate"""
+        return 1.0 / self.rate
+
+    def _refill(self, now: float):
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait for a token, honoring any active FloodWait"""
+        # Created lazily so the limiter can be built outside the event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+        self.batch_size = min(MAX_BATCH_SIZE, self.batch_size + 5)
+        metrics.TELEGRAM_REQUEST_RATE.labels(limiter=self.name).set(self.rate)
+
+    def on_flood_wait(self, seconds: int):
+        self.flood_waits += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        metrics.TELEGRAM_FLOOD_WAITS.inc()
+        metrics.TELEGRAM_REQUEST_RATE.labels(limiter=self.name).set(self.rate)
+        logger.warning(f"FloodWait of {seconds}s on limiter '{self.name}', "
+                       f"rate lowered to {self.rate:.2f} req/s, batch size {self.batch_size}")
+
+    def _check_flood_wait(self, error: FloodWaitError, attempt: int):
+        """Record a FloodWait and re-raise it when it should not be retried"""
+        self.on_flood_wait(error.seconds)
+        if error.seconds > self.max_flood_wait or attempt >= self.max_retries:
+            raise error
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await func(*args, **kwargs) under the limiter, retrying on FloodWait"""
+        attempt = 0
+        while True:
+            await self.acquire()
+            try:
+                result = await func(*args, **kwargs)
+            except FloodWaitError as e:
+                attempt += 1
+                self._check_flood_wait(e, attempt)
+                continue
+            self.on_success()
+            return result
+
+    async def iter_messages(self, client, entity, limit: Optional[int] = 100, offset_id: int = 0,
+                            reverse: bool = False, **kwargs) -> AsyncIterator:
+        """
+        Rate-limited replacement for client.iter_messages.
+
+        History is fetched in chunks of the adaptive batch size, one token per
+        chunk. A FloodWait in the middle of a chunk resumes from the last
+        message delivered, so no message is yielded twice.
+        """
+        remaining = limit
+        attempt = 0
+        while remaining is None or remaining > 0:
+            batch = self.batch_size if remaining is None else min(self.batch_size, remaining)
+            await self.acquire()
+            received = 0
+            try:
+                async for message in client.iter_messages(entity, limit=batch, offset_id=offset_id,
+                                                          reverse=reverse, wait_time=self.wait_time, **kwargs):
+                    received += 1
+                    offset_id = message.id
+                    yield message
+            except FloodWaitError as e:
+                attempt += 1
+                if remaining is not None:
+                    remaining -= received
+                self._check_flood_wait(e, attempt)
+                continue
+            attempt = 0
+            self.on_success()
+            if remaining is not None:
+                remaining -= received
+            if received < batch:
+                break
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Response cache
+LRU cache of serialized API responses keyed by (workspace, endpoint,
+normalized query parameters, data version). A store change bumps the data
+version, so older entries are never served again; they are dropped as soon
+as the workspace's next entry is stored, or pushed out by the LRU once the
+memory cap is reached. Concurrent requests for the same missing entry wait
+for one computation instead of all recomputing it. Hits, misses, evictions
+and invalidations are counted per workspace as well as in total.
+"""
+
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MB = 64
+# Responses above this share of the cap (e.g. a whole large store) are not cached
+MAX_ENTRY_SHARE = 0.25
+
+
+def normalize_params(params: Iterable[Tuple[str, str]]) -> Tuple[Tuple[str, str], ...]:
+    """Query parameters as a sorted tuple without empty values, so equivalent queries share an entry"""
+    return tuple(sorted((name, value.strip()) for name, value in params if value is not None and value.strip()))
+
+
+class ResponseCache:
+    """
+    Memory-capped LRU cache of response bodies.
+
+    Args:
+        max_bytes (int): Total size of cached bodies
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: 'OrderedDict[Tuple, bytes]' = OrderedDict()
+        self._versions: Dict[str, Hashable] = {}
+        self._pending: Dict[Tuple, threading.Event] = {}
+        # Workspace -> Counter of hits, misses, evictions and invalidations
+        self._workspace_counts: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, workspace_id: str, event: str, amount: int = 1):
+        # Callers hold the lock
+        self._workspace_counts.setdefault(workspace_id, Counter())[event] += amount
+
+    def get_or_compute(self, workspace_id: str, endpoint: str, params: Iterable[Tuple[str, str]],
+                       version: Hashable, compute: Callable[[], bytes]) -> bytes:
+        """
+        Cached body for the request, computing and storing it on a miss.
+
+        Args:
+            workspace_id (str): Workspace the response belongs to
+            endpoint (str): Route name
+            params: Query parameters as (name, value) pairs
+            version: Data version of the workspace (part of the key)
+            compute: Builds the serialized body; exceptions propagate and nothing is cached
+        """
+        key = (workspace_id, endpoint, normalize_params(params), version)
+        while True:
+            with self._lock:
+                body = self._entries.get(key)
+                if body is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self._count(workspace_id, 'hits')
+                    metrics.RESPONSE_CACHE_LOOKUPS.labels(workspace=workspace_id, result='hit').inc()
+                    return body
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    self._count(workspace_id, 'misses')
+                    metrics.RESPONSE_CACHE_LOOKUPS.labels(workspace=workspace_id, result='miss').inc()
+                    break
+            # Another request is computing this entry; use its result (or compute if it failed)
+            pending.wait()
+
+        try:
+            body = compute()
+            self._store(key, body)
+            return body
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.set()
+
+    def _store(self, key: Tuple, body: bytes):
+        if len(body) > self.max_bytes * MAX_ENTRY_SHARE:
+            return
+        workspace_id, version = key[0], key[3]
+        with self._lock:
+            if self._versions.get(workspace_id) != version:
+                # The workspace's data changed: its older entries can never be hit again
+                stale = [old for old in self._entries if old[0] == workspace_id and old[3] != version]
+                for old in stale:
+                    self.size -= len(self._entries.pop(old))
+                self.invalidations += len(stale)
+                self._count(workspace_id, 'invalidations', len(stale))
+                self._versions[workspace_id] = version
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+                self._count(evicted_key[0], 'evictions')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.size = 0
+
+    def stats(self, workspace_id: Optional[str] = None) -> Dict:
+        """Cache statistics of the whole process, or of one workspace's entries (the cap is shared)"""
+        with self._lock:
+            if workspace_id is None:
+                counts = {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                          'invalidations': self.invalidations}
+                entries = list(self._entries.values())
+            else:
+                counts = self._workspace_counts.get(workspace_id, Counter())
+                entries = [body for key, body in self._entries.items() if key[0] == workspace_id]
+            hits, misses = counts['hits'], counts['misses']
+            return {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+                'entries': len(entries),
+                'bytes': sum(len(body) for body in entries),
+                'max_bytes': self.max_bytes,
+                'evictions': counts['evictions'],
+                'invalidations': counts['invalidations']
+            }
+
+
+# Shared by every workspace (and both servers) in the process
+RESPONSE_CACHE = ResponseCache(int(os.environ.get('FINANCE_AGENT_CACHE_MB', DEFAULT_CACHE_MB)) * 1024 * 1024)
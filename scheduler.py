@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Background scheduler
+One daemon thread running one asyncio event loop for all background
+Telegram work of the process, shared by every workspace. An async server
+(asgi_app.py) can hand its own loop to the scheduler instead, so Telegram
+clients and request handlers run on the same loop.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundScheduler:
+    """Runs coroutines on a shared event loop in a daemon thread"""
+
+    def __init__(self, name: str = 'telegram-scheduler'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._external: Optional[threading.Event] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The scheduler's event loop, started on first use"""
+        if self._external is not None:
+            # Work submitted before the server started waits for its loop
+            self._external.wait()
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+
+                def run():
+                    loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(loop)
+                    self._loop = loop
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                logger.info("Background scheduler started")
+            return self._loop
+
+    def expect_loop(self):
+        """Do not start a thread; use the loop passed to use_loop() once it exists"""
+        with self._lock:
+            if self._loop is None and self._external is None:
+                self._external = threading.Event()
+
+    def use_loop(self, loop: asyncio.AbstractEventLoop) -> bool:
+        """Run scheduled coroutines on an existing (running) loop; False if the own thread already started"""
+        with self._lock:
+            if self._thread is not None:
+                logger.warning("Background scheduler already runs its own loop")
+                return False
+            self._loop = loop
+            if self._external is not None:
+                self._external.set()
+        logger.info("Background scheduler attached to the server loop")
+        return True
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the shared loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+# Shared by every workspace in the process
+SCHEDULER = BackgroundScheduler()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Group sharding
+Consistent hash ring assigning groups to Telegram sessions. Removing a
+session only moves the groups it owned; the others keep their session.
+"""
+
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Args:
+        nodes: Initial node names
+        replicas (int): Virtual nodes per node; more gives a more even spread
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 100):
+        self.replicas = replicas
+        self._ring: List[Tuple[int, str]] = []
+        self._nodes: Dict[str, bool] = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes[node] = True
+        for i in range(self.replicas):
+            bisect.insort(self._ring, (_hash(f'{node}#{i}'), node))
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            return
+        del self._nodes[node]
+        self._ring = [(h, n) for h, n in self._ring if n != node]
+
+    def get(self, key) -> Optional[str]:
+        """Return the node owning key, or None if the ring is empty"""
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._ring, (_hash(str(key)), '￿'))
+        if index == len(self._ring):
+            index = 0
+        return self._ring[index][1]
+
+    def assignments(self, keys: Iterable) -> Dict[str, List]:
+        """Group keys by owning node"""
+        owners: Dict[str, List] = {}
+        for key in keys:
+            node = self.get(key)
+            if node is not None:
+                owners.setdefault(node, []).append(key)
+        return owners
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Binary store snapshot
+Columnar binary copy of transactions.json (transactions.snapshot) that the
+app loads at startup instead of parsing the JSON. Numeric fields are stored
+as fixed-width arrays, categories and groups as small-int codes into
+dictionaries, and strings as offsets into one UTF-8 blob that is only
+decoded for the rows actually accessed. transactions.json stays the
+portable format; the snapshot is rewritten next to it after every save.
+
+Run `python snapshot.py --rows 1000000` to compare cold load times against JSON.
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from store_io import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TFAS'
+VERSION = 1
+# magic, version, header length
+PREAMBLE = struct.Struct('<4sIQ')
+ALIGNMENT = 8
+
+TYPES = ['income', 'expense']
+STRING_FIELDS = ['id', 'description', 'date']
+DEFAULT_CATEGORY = 'другое'
+
+
+def snapshot_path(transactions_file: str) -> str:
+    return os.path.splitext(transactions_file)[0] + '.snapshot'
+
+
+def file_signature(path: str) -> Optional[List[int]]:
+    """(mtime_ns, size) identifying one version of a file"""
+    try:
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return None
+
+
+def unify_transaction(t: Dict, transaction_type: str) -> Dict:
+    """Convert one stored ParserQ item to the app's row format"""
+    return {
+        'id': str(t.get('id', '')),
+        'amount': t.get('amount', 0),
+        'type': transaction_type,
+        'description': t.get('description', t.get('text', '')),
+        'category': t.get('category', DEFAULT_CATEGORY),
+        'date': t.get('timestamp', t.get('date', datetime.now().isoformat())),
+        'group_id': t.get('group_id', ''),
+        'group_name': t.get('group_name', 'Unknown')
+    }
+
+
+def unify_transactions(data) -> List[Dict]:
+    """Convert the stored ParserQ format ({'income': [...], 'expense': [...]}) to the app's row format"""
+    if not isinstance(data, dict):
+        # Old format - list of transactions
+        return list(data)
+
+    return [unify_transaction(t, transaction_type)
+            for transaction_type in TYPES
+            for t in data.get(transaction_type, [])]
+
+
+def to_epoch(value) -> int:
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def _string_column(values: Iterable[str]) -> Tuple[array, bytes]:
+    offsets = array('q', [0])
+    chunks = []
+    position = 0
+    for value in values:
+        encoded = str(value).encode('utf-8')
+        chunks.append(encoded)
+        position += len(encoded)
+        offsets.append(position)
+    return offsets, b''.join(chunks)
+
+
+def encode_snapshot(rows: List[Dict], source_signature: Optional[List[int]] = None) -> bytes:
+    """Serialize unified rows into the snapshot layout"""
+    categories: Dict[str, int] = {}
+    groups: Dict[Tuple, int] = {}
+
+    amount = array('d')
+    epoch = array('q')
+    type_codes = array('b')
+    category_codes = array('H')
+    group_codes = array('H')
+    for row in rows:
+        amount.append(float(row.get('amount') or 0))
+        epoch.append(to_epoch(row.get('date')))
+        type_codes.append(TYPES.index(row['type']) if row.get('type') in TYPES else -1)
+        category_codes.append(categories.setdefault(row.get('category', DEFAULT_CATEGORY), len(categories)))
+        group_key = (row.get('group_id', ''), row.get('group_name', 'Unknown'))
+        group_codes.append(groups.setdefault(group_key, len(groups)))
+
+    columns = [('amount', amount), ('epoch', epoch), ('type', type_codes),
+               ('category', category_codes), ('group', group_codes)]
+    for field in STRING_FIELDS:
+        offsets, blob = _string_column(row.get(field, '') for row in rows)
+        columns.append((f'{field}.offsets', offsets))
+        columns.append((f'{field}.data', array('B', blob)))
+
+    layout = {}
+    position = 0
+    for name, values in columns:
+        length = len(values) * values.itemsize
+        layout[name] = {'typecode': values.typecode, 'offset': position, 'length': length}
+        position += length + (-length % ALIGNMENT)
+
+    header = json.dumps({
+        'count': len(rows),
+        'source': source_signature,
+        'types': TYPES,
+        'categories': list(categories),
+        'groups': [list(key) for key in groups],
+        'columns': layout
+    }, ensure_ascii=False).encode('utf-8')
+    header += b' ' * (-(PREAMBLE.size + len(header)) % ALIGNMENT)
+
+    parts = [PREAMBLE.pack(MAGIC, VERSION, len(header)), header]
+    for name, values in columns:
+        data = values.tobytes()
+        parts.append(data)
+        parts.append(b'\0' * (-len(data) % ALIGNMENT))
+    return b''.join(parts)
+
+
+def write_snapshot(path: str, rows: List[Dict], source_signature: Optional[List[int]] = None) -> int:
+    """Atomically write the snapshot for rows; returns its size in bytes"""
+    payload = encode_snapshot(rows, source_signature)
+    atomic_write(path, payload)
+    return len(payload)
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot file.
+
+    Columns are exposed as memoryviews (or NumPy arrays) over the file
+    contents without copying; string fields are decoded per row on access.
+
+    Args:
+        buffer: Snapshot bytes (or any buffer, e.g. an mmap)
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        magic, version, header_length = PREAMBLE.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} transaction snapshot")
+        header_end = PREAMBLE.size + header_length
+        header = json.loads(bytes(self.buffer[PREAMBLE.size:header_end]))
+        self.count: int = header['count']
+        self.source: Optional[List[int]] = header.get('source')
+        self.types: List[str] = header['types']
+        self.categories: List[str] = header['categories']
+        self.groups: List[List] = header['groups']
+        self._data_start = header_end
+        self._layout: Dict[str, Dict] = header['columns']
+
+    @classmethod
+    def open(cls, path: str, use_mmap: bool = True) -> 'Snapshot':
+        """
+        Open a snapshot file.
+
+        With use_mmap the file is mapped read-only instead of read, so columns
+        are paged in on demand and shared with the page cache. Writers replace
+        the file by rename, which leaves an existing mapping intact.
+        """
+        with open(path, 'rb') as f:
+            if use_mmap:
+                return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            return cls(f.read())
+
+    def column(self, name: str) -> memoryview:
+        """Column values as a typed memoryview (no copy)"""
+        spec = self._layout[name]
+        start = self._data_start + spec['offset']
+        return self.buffer[start:start + spec['length']].cast(spec['typecode'])
+
+    def array(self, name: str):
+        """Column values as a read-only NumPy array over the snapshot buffer (no copy)"""
+        import numpy as np
+
+        spec = self._layout[name]
+        dtype = np.dtype(spec['typecode'])
+        return np.frombuffer(self.buffer, dtype=dtype, count=spec['length'] // dtype.itemsize,
+                             offset=self._data_start + spec['offset'])
+
+    def rows(self) -> 'SnapshotRows':
+        return SnapshotRows(self)
+
+
+class SnapshotRows(Sequence):
+    """
+    List-like access to snapshot rows in the app's dict format.
+
+    Rows are built (and their strings decoded) on first access and then kept,
+    so startup only pays for reading the columns.
+    """
+
+    def __init__(self, snapshot: Snapshot):
+        self.snapshot = snapshot
+        self._rows: List[Optional[Dict]] = [None] * snapshot.count
+        self._amount = snapshot.column('amount')
+        self._type = snapshot.column('type')
+        self._category = snapshot.column('category')
+        self._group = snapshot.column('group')
+        self._strings = {field: (snapshot.column(f'{field}.offsets'), snapshot.column(f'{field}.data'))
+                         for field in STRING_FIELDS}
+
+    def __len__(self) -> int:
+        return self.snapshot.count
+
+    def _decode(self, field: str, index: int) -> str:
+        offsets, data = self._strings[field]
+        return str(data[offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def strings(self, field: str, indices: Iterable[int]) -> List[str]:
+        """Values of a string field for the given rows, decoded without building the rows"""
+        return [self._decode(field, index) for index in indices]
+
+    def decode(self, index: int) -> Dict:
+        """Build row index without keeping it (for one-pass scans such as exports)"""
+        group_id, group_name = self.snapshot.groups[self._group[index]]
+        type_code = self._type[index]
+        return {
+            'id': self._decode('id', index),
+            'amount': self._amount[index],
+            'type': self.snapshot.types[type_code] if type_code >= 0 else '',
+            'description': self._decode('description', index),
+            'category': self.snapshot.categories[self._category[index]],
+            'date': self._decode('date', index),
+            'group_id': group_id,
+            'group_name': group_name
+        }
+
+    def _build(self, index: int) -> Dict:
+        row = self.decode(index)
+        self._rows[index] = row
+        return row
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('snapshot row index out of range')
+        row = self._rows[index]
+        return row if row is not None else self._build(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def load_snapshot(transactions_file: str) -> Optional[Snapshot]:
+    """Open the snapshot for transactions_file if it matches the current JSON; None otherwise"""
+    path = snapshot_path(transactions_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = Snapshot.open(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+    if snapshot.source != file_signature(transactions_file):
+        logger.info(f"Snapshot {path} is older than {transactions_file}; loading JSON")
+        return None
+    return snapshot
+
+
+def benchmark(rows: int, workdir: str):
+    """Write a synthetic store of rows transactions and time cold loads from JSON and from the snapshot"""
+    transactions_file = os.path.join(workdir, 'transactions.json')
+    data = {'income': [], 'expense': []}
+    for i in range(rows):
+        transaction_type = TYPES[i % 3 == 0]
+        data[transaction_type].append({
+            'id': str(i),
+            'timestamp': datetime.fromtimestamp(1700000000 + i * 60).isoformat(),
+            'group_id': -1000000000 - i % 20,
+            'group_title': f'Group {i % 20}',
+            'text': f'{i} покупка материалов {i % 9000 + 100}',
+            'sender_id': 0,
+            'amount': float(i % 9000 + 100),
+            'currency': 'RUB',
+            'description': f'{i} покупка материалов {i % 9000 + 100}'
+        })
+    with open(transactions_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    del data
+
+    started = time.perf_counter()
+    write_snapshot(snapshot_path(transactions_file), unify_transactions(_read_json(transactions_file)),
+                   file_signature(transactions_file))
+    write_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    json_rows = unify_transactions(_read_json(transactions_file))
+    json_seconds = time.perf_counter() - started
+    del json_rows
+
+    started = time.perf_counter()
+    snapshot_rows = load_snapshot(transactions_file).rows()
+    snapshot_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sum(1 for _ in snapshot_rows)
+    materialize_seconds = time.perf_counter() - started
+
+    print(f"{rows} rows: JSON {os.path.getsize(transactions_file) / 1e6:.1f} MB, "
+          f"snapshot {os.path.getsize(snapshot_path(transactions_file)) / 1e6:.1f} MB (written in {write_seconds:.2f}s)")
+    print(f"  cold load from JSON:     {json_seconds:.3f}s")
+    print(f"  cold load from snapshot: {snapshot_seconds:.3f}s")
+    print(f"  materializing every snapshot row afterwards: {materialize_seconds:.3f}s")
+
+
+def _read_json(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare startup load times of JSON and the binary snapshot')
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmark(args.rows, workdir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
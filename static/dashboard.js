@@ -0,0 +1,562 @@
+// Dashboard page script (templates/index.html); API_BASE is set by the page
+
+// Global variables
+let transactions = [];
+let isLoading = false;
+let storeVersion = null;
+let eventSource = null;
+let liveUpdates = false;
+let alertSeq = null;
+
+// Initialize app
+document.addEventListener('DOMContentLoaded', function() {
+    initializeApp();
+    loadData();
+    startAutoRefresh();
+    loadAlerts();
+});
+
+function initializeApp() {
+    // Show loading screen initially
+    showLoading(true);
+    
+    // Check connection status
+    checkConnectionStatus();
+}
+
+function showLoading(show) {
+    const loadingScreen = document.getElementById('loadingScreen');
+    const mainContent = document.getElementById('mainContent');
+    
+    if (show) {
+        loadingScreen.style.display = 'flex';
+        mainContent.style.display = 'none';
+    } else {
+        loadingScreen.style.display = 'none';
+        mainContent.style.display = 'block';
+    }
+}
+
+async function checkConnectionStatus() {
+    try {
+        const response = await fetch(API_BASE + '/api/status');
+        const data = await response.json();
+        
+        if (data.success) {
+            updateConnectionStatus(data.data);
+        }
+    } catch (error) {
+        console.error('Error checking status:', error);
+        updateConnectionStatus({
+            is_parsing: false,
+            last_update: null,
+            transaction_count: 0
+        });
+    }
+}
+
+function updateConnectionStatus(status) {
+    const statusIndicator = document.getElementById('connectionStatus');
+    const statusText = document.getElementById('statusText');
+    
+    if (status.is_parsing) {
+        statusIndicator.className = 'status-indicator status-parsing';
+        statusText.textContent = 'Обновление данных...';
+    } else if (status.last_update) {
+        statusIndicator.className = 'status-indicator status-connected';
+        statusText.textContent = 'Подключено';
+    } else {
+        statusIndicator.className = 'status-indicator status-disconnected';
+        statusText.textContent = 'Нет данных';
+    }
+    
+    // Update last update time
+    if (status.last_update) {
+        const lastUpdateEl = document.getElementById('lastUpdate');
+        const updateTime = new Date(status.last_update);
+        lastUpdateEl.textContent = `Последнее обновление: ${updateTime.toLocaleTimeString('ru-RU')}`;
+    }
+}
+
+async function loadData() {
+    if (isLoading) return;
+    
+    isLoading = true;
+    
+    try {
+        // Load transactions
+        const response = await fetch(API_BASE + '/api/transactions?format=columnar');
+        const data = await response.json();
+        
+        if (data.success) {
+            transactions = data.format === 'columnar' ? decodeColumnar(data.data) : data.data;
+            storeVersion = data.version;
+            updateDashboard();
+            showLoading(false);
+            if (!eventSource) {
+                subscribeToChanges();
+            }
+        } else {
+            console.error('Error loading transactions:', data.error);
+            showError('Ошибка загрузки данных');
+        }
+    } catch (error) {
+        console.error('Error loading data:', error);
+        showError('Ошибка подключения к серверу');
+    } finally {
+        isLoading = false;
+    }
+}
+
+// Rows of a format=columnar /api/transactions page (see columnar.py)
+function decodeColumnar(page) {
+    const dictionaries = page.dictionaries;
+    const columns = page.columns;
+    const rows = new Array(page.count);
+    let epoch = 0;
+    for (let i = 0; i < page.count; i++) {
+        epoch += columns.date[i];
+        const group = dictionaries.group[columns.group[i]];
+        rows[i] = {
+            id: columns.id[i],
+            amount: columns.amount[i],
+            type: dictionaries.type[columns.type[i]],
+            description: columns.description[i],
+            category: dictionaries.category[columns.category[i]],
+            date: new Date(epoch * 1000).toISOString(),
+            group_id: group[0],
+            group_name: group[1]
+        };
+    }
+    return rows;
+}
+
+// Apply store changes since storeVersion instead of reloading every transaction
+async function loadChanges() {
+    if (storeVersion === null || storeVersion === undefined) {
+        return loadData();
+    }
+    
+    try {
+        const response = await fetch(API_BASE + '/api/changes?since=' + storeVersion);
+        const data = await response.json();
+        
+        if (!data.success) {
+            return;
+        }
+        applyChanges(data.data);
+    } catch (error) {
+        console.error('Error loading changes:', error);
+    }
+}
+
+// Patch the loaded rows with a {version, reset, changes} update from /api/changes or /api/events
+function applyChanges(update) {
+    if (update.reset) {
+        loadData();
+        return;
+    }
+    if (update.changes.length === 0) {
+        storeVersion = update.version;
+        return;
+    }
+    
+    const rows = new Map(transactions.map(t => [t.group_id + ':' + t.id, t]));
+    const added = [];
+    update.changes.forEach(change => {
+        const key = change.key[0] + ':' + change.key[1];
+        if (change.op === 'delete') {
+            rows.delete(key);
+        } else if (rows.has(key)) {
+            Object.assign(rows.get(key), change.row);
+        } else {
+            added.push(change.row);
+            rows.set(key, change.row);
+        }
+    });
+    transactions = added.reverse().concat(
+        transactions.filter(t => rows.get(t.group_id + ':' + t.id) === t)
+    );
+    storeVersion = update.version;
+    updateDashboard();
+}
+
+// Server-pushed changes (ASGI server); polling takes over while the stream is down
+function subscribeToChanges() {
+    if (!window.EventSource) return;
+    
+    let opened = false;
+    eventSource = new EventSource(API_BASE + '/api/events?since=' + storeVersion);
+    eventSource.onopen = () => {
+        opened = true;
+        liveUpdates = true;
+    };
+    eventSource.addEventListener('changes', event => applyChanges(JSON.parse(event.data)));
+    eventSource.onerror = () => {
+        liveUpdates = false;
+        if (!opened) {
+            // No event stream on this server (Flask): keep polling
+            eventSource.close();
+        }
+    };
+}
+
+// Show budget alerts raised since the last check (the first check only records the position)
+async function loadAlerts() {
+    try {
+        const response = await fetch(API_BASE + '/api/alerts?since=' + (alertSeq || 0));
+        const data = await response.json();
+        
+        if (!data.success) {
+            return;
+        }
+        if (alertSeq !== null) {
+            data.data.alerts.forEach(alert => showNotification(alert.message, alert.level));
+        }
+        alertSeq = data.data.last_seq;
+    } catch (error) {
+        console.error('Error loading alerts:', error);
+    }
+}
+
+// Auto-refresh function for real-time updates
+function startAutoRefresh() {
+    // Auto refresh every 10 seconds for real-time updates
+    setInterval(() => {
+        if (!isLoading && !liveUpdates) {
+            loadChanges();
+        }
+        checkConnectionStatus();
+        loadAlerts();
+    }, 10000);
+}
+
+function updateDashboard() {
+    updateBalanceCards();
+    updateTransactionsChart();
+    updateRecentTransactions();
+    updateQuickStats();
+}
+
+function updateBalanceCards() {
+    const totalIncome = transactions
+        .filter(t => t.type === 'income')
+        .reduce((sum, t) => sum + t.amount, 0);
+    
+    const totalExpense = transactions
+        .filter(t => t.type === 'expense')
+        .reduce((sum, t) => sum + t.amount, 0);
+    
+    const balance = totalIncome - totalExpense;
+    
+    // Update UI elements
+    document.getElementById('totalIncome').textContent = formatCurrency(totalIncome);
+    document.getElementById('totalExpense').textContent = formatCurrency(totalExpense);
+    document.getElementById('totalBalance').textContent = formatCurrency(balance);
+    document.getElementById('incomeCount').textContent = `${transactions.filter(t => t.type === 'income').length} операций`;
+    document.getElementById('expenseCount').textContent = `${transactions.filter(t => t.type === 'expense').length} операций`;
+    
+    // Update balance change
+    const balanceChangeEl = document.getElementById('balanceChange');
+    if (balanceChangeEl) {
+        const changePercent = totalExpense > 0 ? ((totalIncome - totalExpense) / totalExpense * 100).toFixed(1) : 0;
+        balanceChangeEl.textContent = `${changePercent >= 0 ? '+' : ''}${changePercent}% за месяц`;
+    }
+}
+
+function updateTransactionsChart() {
+    const chartEl = document.getElementById('transactionsChart');
+    if (!chartEl || transactions.length === 0) return;
+    
+    // Group transactions by day
+    const dailyData = groupTransactionsByDay(transactions);
+    
+    const dates = Object.keys(dailyData).sort();
+    const incomeData = dates.map(date => dailyData[date].income || 0);
+    const expenseData = dates.map(date => -(dailyData[date].expense || 0));
+    
+    const data = [
+        {
+            x: dates,
+            y: incomeData,
+            type: 'scatter',
+            mode: 'lines+markers',
+            name: 'Приходы',
+            line: { color: '#10b981', width: 2 },
+            marker: { size: 4 }
+        },
+        {
+            x: dates,
+            y: expenseData,
+            type: 'scatter',
+            mode: 'lines+markers',
+            name: 'Расходы',
+            line: { color: '#ef4444', width: 2 },
+            marker: { size: 4 }
+        }
+    ];
+    
+    const layout = {
+        margin: { l: 40, r: 20, t: 20, b: 40 },
+        showlegend: true,
+        legend: { x: 0, y: 1.1, orientation: 'h' },
+        xaxis: { showgrid: false, showline: false },
+        yaxis: { showgrid: true, gridcolor: '#f3f4f6' },
+        plot_bgcolor: 'rgba(0,0,0,0)',
+        paper_bgcolor: 'rgba(0,0,0,0)'
+    };
+    
+    Plotly.newPlot(chartEl, data, layout, { displayModeBar: false, responsive: true });
+}
+
+function updateRecentTransactions() {
+    const container = document.getElementById('recentTransactions');
+    if (!container) return;
+    
+    if (transactions.length === 0) {
+        container.innerHTML = `
+            <div class="p-8 text-center text-gray-500">
+                <i class="fas fa-inbox text-4xl mb-3 opacity-50"></i>
+                <div class="text-sm">Нет транзакций</div>
+                <div class="text-xs mt-2">Проверьте настройки Telegram API</div>
+            </div>
+        `;
+        return;
+    }
+    
+    const recent = transactions
+        .sort((a, b) => new Date(b.date) - new Date(a.date))
+        .slice(0, 10);
+    
+    container.innerHTML = recent.map(transaction => `
+        <div class="transaction-item p-3 cursor-pointer" onclick="showTransactionDetail('${transaction.id}')">
+            <div class="flex items-center justify-between">
+                <div class="flex items-center space-x-3">
+                    <div class="w-10 h-10 rounded-full flex items-center justify-center ${transaction.type === 'income' ? 'bg-green-100 text-green-600' : 'bg-red-100 text-red-600'}">
+                        <i class="fas ${transaction.type === 'income' ? 'fa-arrow-up' : 'fa-arrow-down'}"></i>
+                    </div>
+                    <div>
+                        <div class="font-medium text-sm text-gray-800">${transaction.description || 'Без описания'}</div>
+                        <div class="text-xs text-gray-500">${formatDate(transaction.date)} • ${transaction.category || 'Другое'}</div>
+                    </div>
+                </div>
+                <div class="text-right">
+                    <div class="font-semibold ${transaction.type === 'income' ? 'text-green-600' : 'text-red-600'}">
+                        ${transaction.type === 'income' ? '+' : '-'}${formatCurrency(transaction.amount)}
+                    </div>
+                    <div class="text-xs text-gray-500">${transaction.group_name || 'Неизвестная группа'}</div>
+                </div>
+            </div>
+        </div>
+    `).join('');
+}
+
+function updateQuickStats() {
+    if (transactions.length === 0) return;
+    
+    const totalAmount = transactions.reduce((sum, t) => sum + t.amount, 0);
+    const avgTransaction = totalAmount / transactions.length;
+    
+    // Calculate daily average for last 30 days
+    const thirtyDaysAgo = new Date();
+    thirtyDaysAgo.setDate(thirtyDaysAgo.getDate() - 30);
+    
+    const recentTransactions = transactions.filter(t => new Date(t.date) >= thirtyDaysAgo);
+    const dailyAverage = recentTransactions.reduce((sum, t) => sum + t.amount, 0) / 30;
+    
+    document.getElementById('avgTransaction').textContent = formatCurrency(avgTransaction);
+    document.getElementById('transactionCount').textContent = transactions.length;
+    document.getElementById('dailyAverage').textContent = formatCurrency(dailyAverage);
+}
+
+// Utility functions
+function formatCurrency(amount) {
+    return `₽${amount.toLocaleString('ru-RU', { minimumFractionDigits: 0, maximumFractionDigits: 0 })}`;
+}
+
+function formatDate(date) {
+    const d = new Date(date);
+    const now = new Date();
+    
+    // Убираем время для корректного сравнения дат
+    const today = new Date(now.getFullYear(), now.getMonth(), now.getDate());
+    const transactionDate = new Date(d.getFullYear(), d.getMonth(), d.getDate());
+    
+    // Вычисляем разницу в миллисекундах и переводим в дни
+    const diffTime = Math.abs(today - transactionDate);
+    const diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24));
+    
+    // Сравниваем даты
+    if (transactionDate.getTime() === today.getTime()) return 'Сегодня';
+    if (transactionDate.getTime() === today.getTime() - (1000 * 60 * 60 * 24)) return 'Вчера';
+    if (diffDays <= 7) return `${diffDays} дн. назад`;
+    
+    return d.toLocaleDateString('ru-RU', { day: 'numeric', month: 'short' });
+}
+
+function groupTransactionsByDay(transactions) {
+    const grouped = {};
+    
+    transactions.forEach(transaction => {
+        const date = new Date(transaction.date).toISOString().split('T')[0];
+        if (!grouped[date]) {
+            grouped[date] = { income: 0, expense: 0 };
+        }
+        
+        if (transaction.type === 'income') {
+            grouped[date].income += transaction.amount;
+        } else {
+            grouped[date].expense += transaction.amount;
+        }
+    });
+    
+    return grouped;
+}
+
+// Event handlers
+function switchTab(tab) {
+    const pages = {
+        'dashboard': 'index.html',
+        'transactions': 'transactions.html',
+        'analytics': 'analytics.html',
+        'settings': 'settings.html'
+    };
+    
+    if (pages[tab]) {
+        window.location.href = pages[tab];
+    }
+}
+
+function showAllTransactions() {
+    window.location.href = 'transactions.html';
+}
+
+function showTransactionDetail(transactionId) {
+    const transaction = transactions.find(t => t.id === transactionId);
+    if (!transaction) return;
+    
+    const modal = document.getElementById('transactionModal');
+    const detailsEl = document.getElementById('transactionDetails');
+    
+    if (modal && detailsEl) {
+        detailsEl.innerHTML = `
+            <div class="space-y-3">
+                <div class="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
+                    <span class="text-sm text-gray-600">Сумма</span>
+                    <span class="font-bold ${transaction.type === 'income' ? 'text-green-600' : 'text-red-600'}">
+                        ${transaction.type === 'income' ? '+' : '-'}${formatCurrency(transaction.amount)}
+                    </span>
+                </div>
+                
+                <div class="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
+                    <span class="text-sm text-gray-600">Тип</span>
+                    <span class="text-sm font-medium">
+                        ${transaction.type === 'income' ? 'Приход' : 'Расход'}
+                    </span>
+                </div>
+                
+                <div class="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
+                    <span class="text-sm text-gray-600">Категория</span>
+                    <span class="text-sm font-medium">${transaction.category || 'Другое'}</span>
+                </div>
+                
+                <div class="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
+                    <span class="text-sm text-gray-600">Дата</span>
+                    <span class="text-sm font-medium">${formatDate(transaction.date)}</span>
+                </div>
+                
+                <div class="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
+                    <span class="text-sm text-gray-600">Группа</span>
+                    <span class="text-sm font-medium">${transaction.group_name || 'Неизвестная группа'}</span>
+                </div>
+                
+                ${transaction.description ? `
+                <div class="p-3 bg-gray-50 rounded-lg">
+                    <div class="text-sm text-gray-600 mb-1">Описание</div>
+                    <div class="text-sm font-medium">${transaction.description}</div>
+                </div>
+                ` : ''}
+            </div>
+        `;
+        
+        modal.classList.remove('hidden');
+    }
+}
+
+function closeTransactionModal() {
+    const modal = document.getElementById('transactionModal');
+    if (modal) {
+        modal.classList.add('hidden');
+    }
+}
+
+async function forceUpdate() {
+    if (isLoading) return;
+    
+    try {
+        showNotification('Обновление запущено...', 'info');
+        
+        // Immediately trigger data update on server
+        const response = await fetch(API_BASE + '/api/update', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            }
+        });
+        
+        const data = await response.json();
+        
+        if (data.success) {
+            // Load updated data immediately
+            await loadData();
+            checkConnectionStatus();
+            showNotification('Данные обновлены', 'success');
+        } else {
+            showNotification('Ошибка обновления: ' + (data.message || data.error), 'error');
+        }
+    } catch (error) {
+        console.error('Error forcing update:', error);
+        showNotification('Ошибка при обновлении', 'error');
+    }
+}
+
+function startAutoRefresh() {
+    // Auto refresh every 10 seconds for real-time updates
+    setInterval(() => {
+        if (!isLoading && !liveUpdates) {
+            loadChanges();
+        }
+        checkConnectionStatus();
+        loadAlerts();
+    }, 10000);
+}
+
+function showError(message) {
+    const container = document.getElementById('recentTransactions');
+    if (container) {
+        container.innerHTML = `
+            <div class="p-8 text-center text-red-500">
+                <i class="fas fa-exclamation-circle text-4xl mb-3"></i>
+                <div class="text-sm">${message}</div>
+            </div>
+        `;
+    }
+    showLoading(false);
+}
+
+function showNotification(message, type = 'info') {
+    const notification = document.createElement('div');
+    notification.className = `fixed top-4 right-4 z-50 p-4 rounded-lg text-white ${
+        type === 'success' ? 'bg-green-500' : 
+        type === 'error' ? 'bg-red-500' : 
+        type === 'warning' ? 'bg-yellow-500' :
+        'bg-blue-500'
+    }`;
+    notification.textContent = message;
+    
+    document.body.appendChild(notification);
+    
+    setTimeout(() => {
+        notification.remove();
+    }, 3000);
+}
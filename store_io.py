@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Store file I/O
+Crash- and race-safe writes for transactions.json and other shared JSON files.
+Writers serialize through an advisory lock (<file>.lock) and publish a new
+version by writing a temp file, fsyncing it and renaming it over the old one,
+so readers never need the lock: they always open a complete snapshot.
+
+Run `python store_io.py` to hammer a scratch store with concurrent writer and
+reader processes and check that no update is lost and no read is torn.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+from file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_TIMEOUT = 30.0
+
+# Windows refuses to replace a file another process has open; retry briefly
+REPLACE_RETRIES = 20
+REPLACE_RETRY_DELAY = 0.05
+
+
+def store_lock(path: str, timeout: float = DEFAULT_LOCK_TIMEOUT) -> FileLock:
+    """Writer lock for path; use as a context manager around read-modify-write"""
+    return FileLock(f'{path}.lock', timeout=timeout)
+
+
+def _fsync_directory(directory: str):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, data: bytes):
+    """Replace path with data so that readers see either the old or the new file, never a partial one"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}-', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:
+                if attempt == REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(REPLACE_RETRY_DELAY)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_directory(directory)
+
+
+def dump_json(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def write_json(path: str, data: Any, timeout: float = DEFAULT_LOCK_TIMEOUT) -> int:
+    """Atomically replace path with data under the writer lock; returns the bytes written"""
+    payload = dump_json(data)
+    with store_lock(path, timeout):
+        atomic_write(path, payload)
+    return len(payload)
+
+
+def update_json(path: str, update: Callable[[Any], Any], default: Any = None,
+                timeout: float = DEFAULT_LOCK_TIMEOUT) -> Any:
+    """
+    Read-modify-write path under the writer lock.
+
+    Args:
+        path (str): JSON file to update
+        update (Callable): Receives the current data (default if the file is
+            missing) and returns the data to write
+        default: Data used when the file does not exist yet
+    """
+    with store_lock(path, timeout):
+        data = read_json(path, default)
+        data = update(data)
+        atomic_write(path, dump_json(data))
+    return data
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    """Lock-free read of a file published with atomic_write"""
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Stress test
+
+def _hammer_writer(path: str, writer: int, iterations: int):
+    for i in range(iterations):
+        def append(data):
+            data['income'].append({'id': f'{writer}-{i}', 'amount': i})
+            return data
+        update_json(path, append, default={'income': [], 'expense': []})
+
+
+def _hammer_reader(path: str, done, result):
+    reads = errors = 0
+    last_count = 0
+    while not done.is_set():
+        try:
+            count = len(read_json(path, {'income': []})['income'])
+            if count < last_count:
+                errors += 1
+            last_count = count
+            reads += 1
+        except Exception:
+            errors += 1
+    result.put((reads, errors))
+
+
+def hammer(path: str, writers: int = 4, readers: int = 4, iterations: int = 200) -> bool:
+    """Run concurrent writers and readers against path; returns True if the store stayed consistent"""
+    write_json(path, {'income': [], 'expense': []})
+    done = multiprocessing.Event()
+    result = multiprocessing.Queue()
+    writer_procs = [multiprocessing.Process(target=_hammer_writer, args=(path, w, iterations))
+                    for w in range(writers)]
+    reader_procs = [multiprocessing.Process(target=_hammer_reader, args=(path, done, result))
+                    for _ in range(readers)]
+    started = time.time()
+    for p in reader_procs + writer_procs:
+        p.start()
+    for p in writer_procs:
+        p.join()
+    write_seconds = time.time() - started
+    done.set()
+    reads = errors = 0
+    for _ in reader_procs:
+        r, e = result.get()
+        reads += r
+        errors += e
+    for p in reader_procs:
+        p.join()
+
+    data = read_json(path)
+    ids = {t['id'] for t in data['income']}
+    expected = writers * iterations
+    ok = len(data['income']) == expected and len(ids) == expected and errors == 0
+    print(f"{writers} writers x {iterations} updates in {write_seconds:.2f}s: "
+          f"{len(data['income'])}/{expected} records, {reads} reads, {errors} torn or stale reads "
+          f"-> {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hammer the store with concurrent writers and readers')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=200, help='Updates per writer')
+    parser.add_argument('--path', help='Store file to use (default: a temporary file)')
+    args = parser.parse_args()
+
+    if args.path:
+        return 0 if hammer(args.path, args.writers, args.readers, args.iterations) else 1
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'transactions.json')
+        return 0 if hammer(path, args.writers, args.readers, args.iterations) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
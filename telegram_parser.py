@@ -1,16 +1,34 @@
 # pyright: reportGeneralTypeIssues=false
 # pyright: reportOptionalMemberAccess=false
 import asyncio
+import functools
+import itertools
 import json
 import logging
 import os
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, cast
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, cast
 
 from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError
 from telethon.tl.types import Message
 
+import metrics
+from alerts import AlertEngine, AlertLog, alerts_path
+from change_journal import ChangeJournal, journal_path
+from dedup_index import DedupIndex, transaction_key
+from entity_cache import DEFAULT_TTL, EntityCache
+from ingest_queue import DEFAULT_BATCH_SIZE, IngestItem, IngestQueue
+from message_parser import DEFAULT_CATEGORY, DEFAULT_PARSE_CACHE_SIZE, MessageParser, ParseCache, parse_batch
+from profiling import PROFILER
+from rate_limiter import AdaptiveRateLimiter
+from sharding import HashRing
+from snapshot import file_signature, snapshot_path, unify_transaction, unify_transactions, write_snapshot
+from store_io import atomic_write, store_lock
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -18,14 +36,168 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Attempts at storing a real-time batch before its new messages are left to a catch-up
+STORE_ATTEMPTS = 3
+# Seconds before a real-time batch that could not be stored is tried again
+STORE_RETRY_DELAY = 5
+
+def default_client_factory() -> Callable:
+    """Return the client factory: the offline fake when TELEGRAM_FAKE_CORPUS is set, TelegramClient otherwise"""
+    if os.environ.get('TELEGRAM_FAKE_CORPUS'):
+        from fake_telegram import fake_client_factory_from_env
+        return cast(Callable, fake_client_factory_from_env())
+    return TelegramClient
+
+class TelegramSession:
+    """One Telegram account: its own connection, rate limiter and entity cache"""
+    
+    def __init__(self, name: str, settings: Dict, config: Dict, session_file: str, entity_cache_path: str):
+        self.name = name
+        self.api_id = settings.get('api_id')
+        self.api_hash = settings.get('api_hash')
+        self.phone_number = settings.get('phone_number')
+        self.session_file = session_file
+        self.client: Optional[TelegramClient] = None
+        self.rate_limiter = AdaptiveRateLimiter.from_config(config.get('rate_limit'), name=name)
+        self.entity_cache = EntityCache(entity_cache_path, scope=name,
+                                        ttl=config.get('entity_cache_ttl', DEFAULT_TTL))
+        self.errors = 0
+        self.unhealthy_until = 0.0
+    
+    @property
+    def healthy(self) -> bool:
+        # A disconnected client receives no updates, so it must not own groups again after its cooldown
+        return (self.client is not None and self.client.is_connected() and
+                time.monotonic() >= self.unhealthy_until)
+
 class TelegramFinancialParser:
-    def __init__(self, config_path: str = 'config.json'):
-        """Initialize Telegram Financial Parser"""
+    # Consecutive request failures before a session's groups move elsewhere
+    MAX_SESSION_ERRORS = 3
+    # Seconds an unhealthy session stays out of the ring before it is retried
+    SESSION_COOLDOWN = 300
+    
+    def __init__(self, config_path: str = 'config.json', client_factory: Optional[Callable] = None,
+                 base_dir: Optional[str] = None, workspace: str = 'default'):
+        """
+        Initialize Telegram Financial Parser
+        
+        Args:
+            config_path (str): Path to the JSON config file
+            client_factory (Callable): Called as client_factory(session, api_id, api_hash)
+                to create the client; defaults to TelegramClient (see default_client_factory)
+            base_dir (str): Directory for the transactions, session and cache files
+                (defaults to the current directory)
+            workspace (str): Workspace this parser belongs to, used as a metrics label
+        """
+        self.config_path = config_path
         self.config = self.load_config(config_path)
-        self.client: Optional[TelegramClient] = None
+        self._config_signature = file_signature(config_path)
+        self.message_parser = MessageParser.from_config(self.config)
+        self.parse_cache = ParseCache(self.config.get('parse_cache_size', DEFAULT_PARSE_CACHE_SIZE))
+        self.alert_engine = self._load_alert_engine(self.config)
+        # Alerts waiting to be sent to the Telegram alert chat
+        self.pending_alerts = deque(maxlen=100)
+        # Real-time ingestion queue, created per monitoring run
+        self.ingest: Optional[IngestQueue] = None
+        # Batch the ingestion worker is storing, finished before monitoring stops
+        self._ingest_step: Optional[asyncio.Future] = None
+        self.client_factory = client_factory or default_client_factory()
         self.is_running = False
-        self.session_file = 'telegram_session.session'
-        self.transactions_file = 'transactions.json'
+        self.base_dir = base_dir
+        self.workspace = workspace
+        self.session_file = self.data_path('telegram_session.session')
+        self.transactions_file = self.data_path('transactions.json')
+        self.sessions = self.load_sessions()
+        self.ring = HashRing()
+        self._dedup_index: Optional[DedupIndex] = None
+    
+    def data_path(self, filename: str) -> str:
+        """Resolve a data file name against base_dir"""
+        return os.path.join(self.base_dir, filename) if self.base_dir else filename
+    
+    @property
+    def dedup_index(self) -> DedupIndex:
+        """(group_id, message_id) index of the stored transactions, opened on first save"""
+        if self._dedup_index is None:
+            self._dedup_index = DedupIndex(self.data_path('dedup_index.sqlite'))
+        return self._dedup_index
+    
+    @staticmethod
+    def _index_entries(data: Dict) -> List[Tuple[str, str, str]]:
+        return [transaction_key(item.get('group_id'), item.get('id')) + (transaction_type,)
+                for transaction_type in ('income', 'expense')
+                for item in data[transaction_type]]
+    
+    def load_sessions(self) -> Dict[str, TelegramSession]:
+        """
+        Build the Telegram sessions from the config.
+        
+        A 'sessions' list shards groups across several accounts; without it the
+        top-level api_id/api_hash/phone_number form a single session.
+        """
+        settings = self.config.get('sessions')
+        if not settings:
+            settings = [{
+                'name': Path(self.session_file).stem,
+                'api_id': self.config.get('api_id'),
+                'api_hash': self.config.get('api_hash'),
+                'phone_number': self.config.get('phone_number'),
+                'session_file': self.session_file
+            }]
+        
+        sessions = {}
+        for i, item in enumerate(settings):
+            name = item.get('name') or Path(item.get('session_file', f'session_{i}')).stem
+            session_file = item.get('session_file', f'{name}.session')
+            if not os.path.isabs(session_file) and session_file != self.session_file:
+                session_file = self.data_path(session_file)
+            sessions[name] = TelegramSession(name, item, self.config, session_file,
+                                             self.data_path('entity_cache.json'))
+        return sessions
+    
+    @property
+    def client(self) -> Optional[TelegramClient]:
+        """Client of the first healthy session (single-session compatibility)"""
+        for session in self.sessions.values():
+            if session.healthy:
+                return session.client
+        return None
+    
+    def session_for(self, group_id) -> Optional[TelegramSession]:
+        """Return the healthy session that owns group_id"""
+        self._restore_recovered_sessions()
+        name = self.ring.get(str(group_id))
+        return self.sessions[name] if name else None
+    
+    def _restore_recovered_sessions(self):
+        for name, session in self.sessions.items():
+            if name not in self.ring and session.healthy:
+                self.ring.add(name)
+                metrics.TELEGRAM_SESSION_HEALTHY.labels(session=name).set(1)
+                logger.info(f"Session {name} is healthy again, rebalancing groups")
+    
+    def mark_unhealthy(self, session: TelegramSession, cooldown: Optional[float] = None):
+        """Take a session out of the ring so its groups move to the remaining sessions"""
+        session.unhealthy_until = time.monotonic() + (cooldown if cooldown is not None else self.SESSION_COOLDOWN)
+        session.errors = 0
+        if session.name in self.ring:
+            self.ring.remove(session.name)
+            metrics.TELEGRAM_SESSION_HEALTHY.labels(session=session.name).set(0)
+            logger.warning(f"Session {session.name} marked unhealthy, rebalancing its groups "
+                           f"across {len(self.ring)} remaining session(s)")
+    
+    def _record_result(self, session: TelegramSession, error: Optional[Exception] = None):
+        """Track consecutive failures per session and rebalance when a session keeps failing"""
+        if error is None:
+            session.errors = 0
+            return
+        if isinstance(error, FloodWaitError):
+            # The limiter already retried; this account is throttled for a while
+            self.mark_unhealthy(session, max(error.seconds, self.SESSION_COOLDOWN))
+            return
+        session.errors += 1
+        if session.errors >= self.MAX_SESSION_ERRORS or not session.client.is_connected():
+            self.mark_unhealthy(session)
         
     def load_config(self, config_path: str) -> Dict:
         """Load configuration from JSON file"""
@@ -40,19 +212,37 @@ class TelegramFinancialParser:
             raise
     
     async def initialize_client(self) -> bool:
+        """Initialize a Telegram client per session; succeeds if at least one session connects"""
+        self.ring = HashRing()
+        for session in self.sessions.values():
+            if await self.initialize_session(session):
+                self.ring.add(session.name)
+                metrics.TELEGRAM_SESSION_HEALTHY.labels(session=session.name).set(1)
+            else:
+                metrics.TELEGRAM_SESSION_HEALTHY.labels(session=session.name).set(0)
+        
+        if not len(self.ring):
+            return False
+        if len(self.sessions) > 1:
+            logger.info(f"{len(self.ring)} of {len(self.sessions)} Telegram sessions connected")
+        return True
+    
+    async def initialize_session(self, session: TelegramSession) -> bool:
         """Initialize Telegram client"""
         try:
-            api_id = self.config.get('api_id')
-            api_hash = self.config.get('api_hash')
+            api_id = session.api_id
+            api_hash = session.api_hash
             
             if not api_id or not api_hash:
-                logger.error("API ID or Hash not found in config")
+                logger.error(f"API ID or Hash not found in config for session {session.name}")
                 return False
             
-            client = TelegramClient(self.session_file, api_id, api_hash)
+            client = self.client_factory(session.session_file, api_id, api_hash)
+            # Surface every FloodWait to the rate limiter instead of sleeping inside Telethon
+            client.flood_sleep_threshold = 0
             
             # Start client
-            phone_number = self.config.get('phone_number')
+            phone_number = session.phone_number
             if phone_number:
                 await client.start(phone=phone_number)
             else:
@@ -63,15 +253,24 @@ class TelegramFinancialParser:
                 logger.error("Client not authorized. Please check your phone number and verification code.")
                 return False
             
-            self.client = client
-            logger.info("Telegram client initialized successfully")
+            session.client = client
+            session.errors = 0
+            session.unhealthy_until = 0.0
+            logger.info(f"Telegram client initialized successfully (session {session.name})")
             return True
             
         except Exception as e:
-            logger.error(f"Failed to initialize client: {e}")
+            logger.error(f"Failed to initialize client for session {session.name}: {e}")
             return False
     
-    def parse_financial_message(self, message: str, group_id: str) -> Optional[Dict]:
+    async def disconnect_all(self):
+        """Disconnect every session's client"""
+        for session in self.sessions.values():
+            if session.client:
+                await session.client.disconnect()
+    
+    def parse_financial_message(self, message: str, group_id: str,
+                                message_parser: Optional[MessageParser] = None) -> Optional[Dict]:
         """
         Parse financial information from message text based on group type configuration.
         
@@ -82,241 +281,608 @@ class TelegramFinancialParser:
         Args:
             message (str): The text message to parse
             group_id (str): The ID of the group the message came from
+            message_parser (MessageParser): Rules to parse with (default: the current rules, not refreshed)
             
         Returns:
             Optional[Dict]: Parsed transaction data or None if not a financial message
         """
-        if not message:
-            return None
-        
-        message = message.lower().strip()
-        
-        # Get group types mapping from config
-        group_types = self.config.get('group_types', {})
-        
-        # Determine transaction type based on group ID
-        # Handle both string and integer group IDs
-        transaction_type = None
-        for config_group_id, config_type in group_types.items():
-            # Convert both to strings for comparison
-            if str(config_group_id) == str(group_id):
-                transaction_type = config_type
-                break
-        
-        # If group type is not configured, return None
-        if not transaction_type:
-            logger.debug(f"No transaction type configured for group {group_id}")
-            return None
-        
-        # Extract amount - try multiple patterns to be more flexible
-        import re
-        
-        # Pattern 1: Number with currency symbol (original pattern)
-        amount_pattern1 = r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*(?:₽|руб|RUB|р)'
-        amount_match1 = re.search(amount_pattern1, message)
+        started = time.perf_counter()
+        parsed = self._parse_financial_message(message, group_id, message_parser)
+        metrics.PARSE_SECONDS.observe(time.perf_counter() - started)
+        metrics.MESSAGES_SEEN.inc()
+        if parsed:
+            metrics.TRANSACTIONS_PARSED.inc()
+        else:
+            metrics.PARSE_MISSES.inc()
+        return parsed
+    
+    def _parse_financial_message(self, message: str, group_id: str,
+                                 message_parser: Optional[MessageParser] = None) -> Optional[Dict]:
+        """Uninstrumented body of parse_financial_message"""
+        # The same recent messages come back on every parse cycle
+        return self.parse_cache.parse(message_parser or self.message_parser, message, group_id)
+    
+    def refresh_rules(self) -> bool:
+        """
+        Pick up group_types, categories and alert rules changed in the config file (e.g. from the settings page).
         
-        # Pattern 2: Number at the end of message (for cases like "description 10000")
-        amount_pattern2 = r'(\d+(?:,\d{3})*(?:\.\d{2})?)$'
-        amount_match2 = re.search(amount_pattern2, message)
+        The parse cache is keyed by the rules version, so cached results of the old rules are dropped.
         
-        # Pattern 3: Any number in the message (least specific)
-        amount_pattern3 = r'(\d+(?:,\d{3})*(?:\.\d{2})?)'
-        amount_match3 = re.search(amount_pattern3, message)
+        Returns:
+            True if the parse rules changed
+        """
+        signature = file_signature(self.config_path)
+        if signature == self._config_signature:
+            return False
+        self._config_signature = signature
+        try:
+            config = self.load_config(self.config_path)
+        except Exception as e:
+            logger.warning(f"Keeping the current parse rules: {e}")
+            return False
         
-        amount_match = amount_match1 or amount_match2 or amount_match3
+        if ((config.get('alerts'), config.get('notifications', True)) !=
+                (self.config.get('alerts'), self.config.get('notifications', True))):
+            for key in ('alerts', 'notifications'):
+                if key in config:
+                    self.config[key] = config[key]
+                else:
+                    self.config.pop(key, None)
+            # Seeded from the store on the next write
+            self.alert_engine = self._load_alert_engine(self.config)
+            logger.info("Alert rules changed")
         
-        if not amount_match:
-            return None
+        message_parser = MessageParser.from_config(config)
+        if message_parser.rules_version == self.message_parser.rules_version:
+            return False
+        for key in ('group_types', 'categories'):
+            if key in config:
+                self.config[key] = config[key]
+            else:
+                self.config.pop(key, None)
+        self.message_parser = message_parser
+        logger.info(f"Parse rules changed (version {message_parser.rules_version})")
+        return True
+    
+    def current_rules(self) -> MessageParser:
+        """
+        Rules for the next batch of messages, refreshed from the config file.
         
-        amount_str = amount_match.group(1).replace(',', '')
+        Called once per parse cycle or batch and passed to build_transaction, so
+        parsing a message does not stat the config file.
+        """
+        self.refresh_rules()
+        return self.message_parser
+    
+    @staticmethod
+    def _load_alert_engine(config: Dict) -> Optional[AlertEngine]:
         try:
-            amount = float(amount_str)
-        except ValueError:
+            return AlertEngine.from_config(config)
+        except Exception as e:
+            logger.error(f"Invalid alert rules, alerts are disabled: {e}")
             return None
-        
-        # Extract category (basic implementation)
-        category = self.extract_category(message)
-        
-        return {
-            'amount': amount,
-            'type': transaction_type,  # Use type from group configuration
-            'description': message[:100],  # First 100 chars as description
-            'category': category
-        }
     
     def extract_category(self, message: str) -> str:
         """Extract category from message"""
-        categories = {
-            'еда': ['продукты', 'магазин', 'еда', 'ресторан', 'кафе', 'обед', 'ужин'],
-            'транспорт': ['такси', 'метро', 'автобус', 'бензин', 'транспорт', 'поездка'],
-            'жкх': ['коммуналка', 'жкх', 'свет', 'вода', 'газ', 'интернет', 'телефон'],
-            'развлечения': ['кино', 'театр', 'концерт', 'отдых', 'путешествие', 'отпуск'],
-            'здоровье': ['аптека', 'врач', 'медицина', 'лекарства', 'больница'],
-            'одежда': ['одежда', 'обувь', 'магазин одежды', 'стиль'],
-            'образование': ['курсы', 'обучение', 'университет', 'книги', 'учеба'],
-            'работа': ['зарплата', 'аванс', 'премия', 'доход', 'бизнес']
-        }
+        return self.message_parser.extract_category(message)
+    
+    def parse_batch(self, pairs: Iterable[Tuple[str, str]], workers: Optional[int] = None) -> Iterator[Optional[Dict]]:
+        """
+        Parse many (text, group_id) pairs on a process pool, in order (see message_parser.parse_batch).
+        
+        Args:
+            pairs: (text, group_id) pairs
+            workers (int): Worker processes (default: CPU count)
+        """
+        for parsed in parse_batch(pairs, self.message_parser, workers=workers):
+            metrics.MESSAGES_SEEN.inc()
+            if parsed:
+                metrics.TRANSACTIONS_PARSED.inc()
+            else:
+                metrics.PARSE_MISSES.inc()
+            yield parsed
+    
+    def reparse_store(self, workers: Optional[int] = None) -> int:
+        """
+        Re-parse every stored message with the current rules (e.g. after changing categories
+        or group_types) and update the rows whose amount, type or category changed.
         
-        message_lower = message.lower()
-        for category, keywords in categories.items():
-            if any(keyword in message_lower for keyword in keywords):
-                return category
+        Rows whose text no longer parses are kept as they are. Parsing runs without the
+        store lock, so writers are not held up; afterwards a changed row is only rewritten
+        if it is still stored as it was when it was parsed.
         
-        return 'другое'
+        Args:
+            workers (int): Worker processes (default: CPU count)
+        Returns:
+            Number of updated transactions
+        """
+        with store_lock(self.transactions_file):
+            data = self._load_store()
+        items = [(transaction_type, item) for transaction_type in ('income', 'expense')
+                 for item in data[transaction_type]]
+        del data
+        
+        started = time.perf_counter()
+        changed = {}
+        unparsed = 0
+        pairs = ((item.get('text') or item.get('raw_message') or item.get('description', ''), item.get('group_id'))
+                 for _, item in items)
+        for (transaction_type, item), parsed in zip(items, self.parse_batch(pairs, workers)):
+            if not parsed:
+                unparsed += 1
+                continue
+            if (parsed['type'] == transaction_type and parsed['amount'] == item.get('amount') and
+                    parsed['category'] == item.get('category', DEFAULT_CATEGORY)):
+                continue
+            changed[transaction_key(item.get('group_id'), item.get('id'))] = (
+                self._reparse_basis(item, transaction_type), parsed)
+        
+        logger.info(f"Re-parsed {len(items)} stored messages in {time.perf_counter() - started:.2f}s: "
+                    f"{len(changed)} changed, {unparsed} no longer parse (kept)")
+        del items
+        if not changed:
+            return 0
+        try:
+            with store_lock(self.transactions_file):
+                return self._apply_reparse(changed)
+        except TimeoutError as e:
+            logger.error(f"Error updating re-parsed transactions: {e}")
+            return 0
+    
+    @staticmethod
+    def _reparse_basis(item: Dict, transaction_type: str) -> Tuple:
+        # What a re-parse result was derived from; the row is rewritten only if this is unchanged
+        return (transaction_type, item.get('text'), item.get('description'), item.get('amount'),
+                item.get('category', DEFAULT_CATEGORY))
     
-    async def fetch_messages_from_group(self, group_id: str, limit: int = 100) -> List[Dict]:
-        """Fetch messages from a specific group"""
+    def _apply_reparse(self, changed: Dict[Tuple[str, str], Tuple[Tuple, Dict]]) -> int:
+        """Write re-parse results to the rows they were parsed from; callers hold the store lock"""
+        started = time.perf_counter()
+        try:
+            data = self._load_store()
+            changes = []
+            moved = {'income': [], 'expense': []}
+            for transaction_type in ('income', 'expense'):
+                rows = []
+                for item in data[transaction_type]:
+                    entry = changed.get(transaction_key(item.get('group_id'), item.get('id')))
+                    if entry is None or entry[0] != self._reparse_basis(item, transaction_type):
+                        # Unchanged, or written by someone else since it was parsed
+                        rows.append(item)
+                        continue
+                    parsed = entry[1]
+                    # Only the parsed fields change; sender, currency and other stored keys are kept
+                    updated = dict(item, amount=parsed['amount'], category=parsed['category'],
+                                   description=parsed['description'])
+                    if 'type' in updated:
+                        updated['type'] = parsed['type']
+                    changes.append(self._upsert(updated, parsed['type']))
+                    # A row whose type changed moves to the front of its new type, like an edit
+                    if parsed['type'] == transaction_type:
+                        rows.append(updated)
+                    else:
+                        moved[parsed['type']].append(updated)
+                data[transaction_type] = rows
+            for transaction_type, items in moved.items():
+                data[transaction_type] = items + data[transaction_type]
+            
+            if not changes:
+                logger.info("Every re-parsed transaction was changed meanwhile; nothing updated")
+                return 0
+            size = self._commit_store(data, changes)
+            metrics.SAVE_SECONDS.observe(time.perf_counter() - started)
+            metrics.SAVE_BYTES.observe(size)
+            
+            logger.info(f"Updated {len(changes)} re-parsed transactions "
+                        f"({len(changed) - len(changes)} changed meanwhile and kept)")
+            return len(changes)
+        except Exception as e:
+            logger.error(f"Error updating re-parsed transactions: {e}")
+            return 0
+    
+    async def fetch_messages_from_group(self, group_id: str, limit: int = 100, retry: bool = True,
+                                        message_parser: Optional[MessageParser] = None) -> List[Dict]:
+        """Fetch messages from a specific group using the session that owns it (parsed with message_parser)"""
         transactions = []
+        message_parser = message_parser or self.current_rules()
         
         # Check if client is initialized
-        if self.client is None:
+        session = self.session_for(group_id)
+        if session is None:
             logger.error("Client not initialized")
             return transactions
         
-        client = cast(TelegramClient, self.client)
+        client = cast(TelegramClient, session.client)
+        started = time.perf_counter()
+        error: Optional[Exception] = None
         
         try:
-            # Get entity (group) - handle both string and integer IDs
-            if isinstance(group_id, str) and group_id.startswith('-'):
-                # This is a negative ID (supergroup/channel)
-                entity = await client.get_entity(int(group_id))
-            elif isinstance(group_id, str):
-                # This might be a username or positive ID as string
-                try:
-                    entity = await client.get_entity(int(group_id))
-                except ValueError:
-                    # Try as username
-                    entity = await client.get_entity(group_id)
-            else:
-                # This is already an integer
-                entity = await client.get_entity(group_id)
+            # Get entity (group) from the cache, resolving it only when missing or expired
+            entity, group_title = await session.entity_cache.resolve(
+                group_id, functools.partial(self._get_entity, session))
             
             # Fetch recent messages
-            async for message in client.iter_messages(entity, limit=limit):
+            async for message in session.rate_limiter.iter_messages(client, entity, limit=limit):
                 if message.text:
-                    parsed_data = self.parse_financial_message(message.text, group_id)
+                    transaction = self.build_transaction(message, group_id, group_title, message_parser)
                     
-                    if parsed_data:
-                        transaction = {
-                            'id': str(message.id),  # This is the correct ID
-                            'amount': parsed_data['amount'],
-                            'type': parsed_data['type'],
-                            'description': parsed_data['description'],
-                            'category': parsed_data['category'],
-                            'date': message.date.isoformat(),
-                            'group_id': group_id,
-                            'group_name': getattr(entity, 'title', 'Unknown Group'),
-                            'message_id': message.id,
-                            'raw_message': message.text[:200]  # First 200 chars
-                        }
-                        
+                    if transaction:
                         transactions.append(transaction)
                         
                         logger.info(f"Found transaction: {transaction['type']} {transaction['amount']}₽ - {transaction['description'][:50]}...")
             
             logger.info(f"Fetched {len(transactions)} transactions from group {group_id}")
             
+        except FloodWaitError as e:
+            error = e
+            logger.warning(f"Rate limited while fetching group {group_id} (wait {e.seconds}s), "
+                           f"keeping {len(transactions)} transactions fetched so far")
         except Exception as e:
+            error = e
             logger.error(f"Error fetching messages from group {group_id}: {e}")
         
+        metrics.TELEGRAM_FETCH_SECONDS.labels(group_id=group_id).observe(time.perf_counter() - started)
+        self._record_result(session, error)
+        
+        # Give the group one more try on its new owner if the session was just taken out
+        if error is not None and retry and not session.healthy and self.session_for(group_id) is not None:
+            transactions.extend(await self.fetch_messages_from_group(group_id, limit, retry=False,
+                                                                     message_parser=message_parser))
         return transactions
     
-    def save_transactions(self, transactions: List[Dict]):
-        """Save transactions to JSON file in ParserQ format (separate income and expense arrays)"""
+    def build_transaction(self, message, group_id: str, group_title: str,
+                          message_parser: Optional[MessageParser] = None) -> Optional[Dict]:
+        """
+        Parse a Telegram message into a transaction record, or None if it is not financial.
+        
+        message_parser is the rules of the current batch (see current_rules); without it the
+        rules last loaded are used.
+        """
+        parsed_data = self.parse_financial_message(message.text, group_id, message_parser)
+        if not parsed_data:
+            return None
+        
+        return {
+            'id': str(message.id),  # This is the correct ID
+            'amount': parsed_data['amount'],
+            'type': parsed_data['type'],
+            'description': parsed_data['description'],
+            'category': parsed_data['category'],
+            'date': message.date.isoformat(),
+            'group_id': group_id,
+            'group_name': group_title,
+            'message_id': message.id,
+            'raw_message': message.text[:200]  # First 200 chars
+        }
+    
+    async def _get_entity(self, session: TelegramSession, group_id: str) -> Any:
+        """Look up a group entity over the network - handle both string and integer IDs"""
+        client = cast(TelegramClient, session.client)
+        limiter = session.rate_limiter
+        if isinstance(group_id, str) and group_id.startswith('-'):
+            # This is a negative ID (supergroup/channel)
+            return await limiter.call(client.get_entity, int(group_id))
+        elif isinstance(group_id, str):
+            # This might be a username or positive ID as string
+            try:
+                return await limiter.call(client.get_entity, int(group_id))
+            except ValueError:
+                # Try as username
+                return await limiter.call(client.get_entity, group_id)
+        else:
+            # This is already an integer
+            return await limiter.call(client.get_entity, group_id)
+    
+    def save_transactions(self, transactions: List[Dict]) -> bool:
+        """
+        Save transactions to JSON file in ParserQ format (separate income and expense arrays).
+        
+        Returns:
+            False if the store could not be written (the error is logged)
+        """
+        # Other writers (run_parser.py, the web app, ParserQ) merge into the same file
         try:
-            # Load existing transactions
+            with store_lock(self.transactions_file):
+                return self._save_transactions(transactions)
+        except TimeoutError as e:
+            logger.error(f"Error saving transactions: {e}")
+            return False
+    
+    async def save_transactions_async(self, transactions: List[Dict]) -> bool:
+        """save_transactions off the event loop, which the store lock wait, JSON dump and fsync would stall"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.save_transactions, transactions)
+    
+    def _load_store(self) -> Dict:
+        """Read the store in ParserQ format; callers hold the store lock"""
+        # Load existing transactions
+        existing_data = {
+            'income': [],
+            'expense': [],
+            'last_updated': datetime.now().isoformat()
+        }
+        
+        if os.path.exists(self.transactions_file):
+            try:
+                with open(self.transactions_file, 'r', encoding='utf-8') as f:
+                    existing_data = json.load(f)
+            except Exception as e:
+                logger.warning(f"Error loading existing transactions file: {e}")
+                # If there's an error loading the file, we'll start with empty arrays
+        
+        # Convert existing transactions to the new format if needed
+        if isinstance(existing_data, list):
+            # Old format - convert to new format
+            income_transactions = [t for t in existing_data if t.get('type') == 'income']
+            expense_transactions = [t for t in existing_data if t.get('type') == 'expense']
             existing_data = {
-                'income': [],
-                'expense': [],
+                'income': income_transactions,
+                'expense': expense_transactions,
                 'last_updated': datetime.now().isoformat()
             }
-            
-            if os.path.exists(self.transactions_file):
-                try:
-                    with open(self.transactions_file, 'r', encoding='utf-8') as f:
-                        existing_data = json.load(f)
-                except Exception as e:
-                    logger.warning(f"Error loading existing transactions file: {e}")
-                    # If there's an error loading the file, we'll start with empty arrays
-            
-            # Convert existing transactions to the new format if needed
-            if isinstance(existing_data, list):
-                # Old format - convert to new format
-                income_transactions = [t for t in existing_data if t.get('type') == 'income']
-                expense_transactions = [t for t in existing_data if t.get('type') == 'expense']
-                existing_data = {
-                    'income': income_transactions,
-                    'expense': expense_transactions,
-                    'last_updated': datetime.now().isoformat()
-                }
-            
-            # Ensure we have the right structure
-            if 'income' not in existing_data:
-                existing_data['income'] = []
-            if 'expense' not in existing_data:
-                existing_data['expense'] = []
-            
-            # Create sets of existing transaction IDs for quick lookup
-            # Use the correct ID field for comparison
-            existing_income_ids = {str(item.get('id')) for item in existing_data['income']}
-            existing_expense_ids = {str(item.get('id')) for item in existing_data['expense']}
+        
+        # Ensure we have the right structure
+        if 'income' not in existing_data:
+            existing_data['income'] = []
+        if 'expense' not in existing_data:
+            existing_data['expense'] = []
+        
+        # Message IDs are only unique per chat, so duplicates are detected by (group_id, message_id).
+        # The index is rebuilt only if another writer changed the file since our last save.
+        index = self.dedup_index
+        if index.source != file_signature(self.transactions_file):
+            index.rebuild(self._index_entries(existing_data), file_signature(self.transactions_file))
+        
+        return existing_data
+    
+    @staticmethod
+    def to_stored_format(t: Dict) -> Dict:
+        """Convert a parsed transaction to the ParserQ item stored in transactions.json"""
+        return {
+            'id': str(t.get('id')),  # Use 'id' field directly
+            'timestamp': t.get('date', datetime.now().isoformat()),
+            'group_id': t.get('group_id'),
+            'group_title': t.get('group_name', 'Unknown'),
+            'text': t.get('raw_message', t.get('description', '')),
+            'sender_id': 0,  # We don't have sender info in the new format
+            'amount': t.get('amount', 0),
+            'currency': 'RUB',
+            'description': t.get('description', ''),
+            'category': t.get('category', DEFAULT_CATEGORY)
+        }
+    
+    def _commit_store(self, data: Dict, changes: List[Dict]) -> int:
+        """
+        Publish data as the new store version; callers hold the store lock.
+        
+        Args:
+            data: Full store in ParserQ format
+            changes: Row-level changes this write makes (see ChangeJournal.append),
+                applied to the dedup index and recorded in the change journal
+        Returns:
+            Size of the written file in bytes
+        """
+        before = file_signature(self.transactions_file)
+        
+        # Update last_updated timestamp
+        data['last_updated'] = datetime.now().isoformat()
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        atomic_write(self.transactions_file, payload)
+        after = file_signature(self.transactions_file)
+        
+        index = self.dedup_index
+        index.add_many(tuple(c['key']) + (c['row']['type'],) for c in changes if c['op'] == 'upsert')
+        for change in changes:
+            if change['op'] == 'delete':
+                index.remove(tuple(change['key']))
+        index.set_source(after)
+        
+        self._write_snapshot(data)
+        
+        # Journaled last: readers treat the journal entry as the signal that this write is complete
+        # and apply these changes instead of reloading
+        try:
+            ChangeJournal(journal_path(self.transactions_file)).append(changes, before, after)
+        except Exception as e:
+            logger.warning(f"Error writing change journal: {e}")
+        self._evaluate_alerts(data, changes, before, after)
+        metrics.STORE_SIZE.labels(workspace=self.workspace).set(len(data['income']) + len(data['expense']))
+        return len(payload)
+    
+    def _evaluate_alerts(self, data: Dict, changes: List[Dict], before: Optional[List[int]],
+                         after: Optional[List[int]]):
+        """Run the alert rules on one store write and log what they raise; callers hold the store lock"""
+        engine = self.alert_engine
+        if engine is None or not changes:
+            return
+        try:
+            if engine.source != before:
+                # First write of this process, or another writer changed the store: recount the
+                # current windows from the rows this write did not touch
+                written = {tuple(change['key']) for change in changes}
+                engine.seed((row for row in unify_transactions(data)
+                             if transaction_key(row.get('group_id'), row.get('id')) not in written), before)
+            alerts = engine.apply(changes, after)
+            if not alerts:
+                return
+            alerts = AlertLog(alerts_path(self.transactions_file)).append(alerts)
+            for alert in alerts:
+                logger.warning(f"Alert: {alert['message']}")
+            if (self.config.get('alerts') or {}).get('telegram_chat'):
+                self.pending_alerts.extend(alerts)
+        except Exception as e:
+            logger.error(f"Error evaluating alerts: {e}")
+    
+    async def send_alerts(self):
+        """Send the alerts raised since the last call to the configured Telegram chat"""
+        chat = (self.config.get('alerts') or {}).get('telegram_chat')
+        if not chat or not self.pending_alerts:
+            return
+        if isinstance(chat, str) and chat.lstrip('-').isdigit():
+            chat = int(chat)
+        session = next((session for session in self.sessions.values() if session.healthy), None)
+        if session is None:
+            # Kept until a session is connected again
+            return
+        while self.pending_alerts:
+            alert = self.pending_alerts[0]
+            try:
+                await session.rate_limiter.call(session.client.send_message, chat, alert['message'])
+            except Exception as e:
+                logger.error(f"Error sending alert to Telegram chat {chat}: {e}")
+                return
+            self.pending_alerts.popleft()
+    
+    @staticmethod
+    def _upsert(item: Dict, transaction_type: str) -> Dict:
+        return {
+            'op': 'upsert',
+            'key': list(transaction_key(item.get('group_id'), item.get('id'))),
+            'row': unify_transaction(item, transaction_type)
+        }
+    
+    def _save_transactions(self, transactions: List[Dict]) -> bool:
+        started = time.perf_counter()
+        try:
+            existing_data = self._load_store()
+            index = self.dedup_index
             
             # Separate new transactions by type and filter out duplicates
             new_income = []
             new_expense = []
+            batch_keys = set()
             
             for t in transactions:
-                # Use the correct ID field - 'id' in the transaction object
-                transaction_id = str(t.get('id'))
+                key = transaction_key(t.get('group_id'), t.get('id'))
                 transaction_type = t.get('type')
                 
                 # Only add transaction if it doesn't already exist
-                if transaction_type == 'income' and transaction_id not in existing_income_ids:
+                if transaction_type not in ('income', 'expense') or key in batch_keys or key in index:
+                    continue
+                batch_keys.add(key)
+                if transaction_type == 'income':
                     new_income.append(t)
-                elif transaction_type == 'expense' and transaction_id not in existing_expense_ids:
+                else:
                     new_expense.append(t)
             
-            # Convert to ParserQ format
-            def convert_to_parserq_format(transaction_list):
-                converted = []
-                for t in transaction_list:
-                    converted_item = {
-                        'id': str(t.get('id')),  # Use 'id' field directly
-                        'timestamp': t.get('date', datetime.now().isoformat()),
-                        'group_id': t.get('group_id'),
-                        'group_title': t.get('group_name', 'Unknown'),
-                        'text': t.get('raw_message', t.get('description', '')),
-                        'sender_id': 0,  # We don't have sender info in the new format
-                        'amount': t.get('amount', 0),
-                        'currency': 'RUB',
-                        'description': t.get('description', '')
-                    }
-                    converted.append(converted_item)
-                return converted
+            if not new_income and not new_expense:
+                # Nothing new: leave the store, snapshot, journal and data version alone
+                logger.info("No new transactions to save")
+                return True
             
             # Convert new transactions
-            converted_new_income = convert_to_parserq_format(new_income)
-            converted_new_expense = convert_to_parserq_format(new_expense)
+            converted_new_income = [self.to_stored_format(t) for t in new_income]
+            converted_new_expense = [self.to_stored_format(t) for t in new_expense]
             
             # Merge with existing data (add new transactions to the beginning)
             # Only add new transactions, don't duplicate existing ones
             existing_data['income'] = converted_new_income + existing_data['income']
             existing_data['expense'] = converted_new_expense + existing_data['expense']
             
-            # Update last_updated timestamp
-            existing_data['last_updated'] = datetime.now().isoformat()
-            
             # Save to file
-            with open(self.transactions_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2)
+            changes = ([self._upsert(item, 'income') for item in converted_new_income] +
+                       [self._upsert(item, 'expense') for item in converted_new_expense])
+            size = self._commit_store(existing_data, changes)
+            
+            metrics.SAVE_SECONDS.observe(time.perf_counter() - started)
+            metrics.SAVE_BYTES.observe(size)
             
             logger.info(f"Saved {len(converted_new_income)} new income and {len(converted_new_expense)} new expense transactions. Total: {len(existing_data['income'])} income, {len(existing_data['expense'])} expense")
+            return True
             
         except Exception as e:
             logger.error(f"Error saving transactions: {e}")
+            return False
+    
+    def update_transactions(self, upserts: List[Dict], deletions: List[Tuple[str, str]]) -> bool:
+        """
+        Apply edited and deleted messages to the store.
+        
+        Args:
+            upserts: Re-parsed transactions replacing the stored rows with the same
+                (group_id, message_id), or added if there is none
+            deletions: (group_id, message_id) keys of rows to drop
+        
+        Returns:
+            False if the store could not be written (the error is logged)
+        """
+        try:
+            with store_lock(self.transactions_file):
+                return self._update_transactions(upserts, deletions)
+        except TimeoutError as e:
+            logger.error(f"Error updating transactions: {e}")
+            return False
+    
+    async def update_transactions_async(self, upserts: List[Dict], deletions: List[Tuple[str, str]]) -> bool:
+        """update_transactions off the event loop (see save_transactions_async)"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.update_transactions, upserts, deletions)
+    
+    def _update_transactions(self, upserts: List[Dict], deletions: List[Tuple[str, str]]) -> bool:
+        started = time.perf_counter()
+        try:
+            index = self.dedup_index
+            replacements = {transaction_key(t.get('group_id'), t.get('id')): t for t in upserts
+                            if t.get('type') in ('income', 'expense')}
+            # Keys missing from the index are not stored: nothing to delete, and upserts are plain inserts
+            deletions = [key for key in deletions if key not in replacements and key in index]
+            if not replacements and not deletions:
+                return True
+            
+            existing_data = self._load_store()
+            affected = set(deletions) | {key for key in replacements if key in index}
+            changes = [{'op': 'delete', 'key': list(key)} for key in deletions]
+            
+            # Edited rows keep their position unless their type changed; deleted rows are dropped
+            placed = {}
+            if affected:
+                for transaction_type in ('income', 'expense'):
+                    rows = []
+                    for item in existing_data[transaction_type]:
+                        key = transaction_key(item.get('group_id'), item.get('id'))
+                        if key not in affected:
+                            rows.append(item)
+                            continue
+                        t = replacements.get(key)
+                        if t is not None and t['type'] == transaction_type:
+                            placed[key] = self.to_stored_format(t)
+                            rows.append(placed[key])
+                    existing_data[transaction_type] = rows
+            
+            # New rows (and rows whose type changed) go first, in the order given, like saved ones
+            added = {'income': [], 'expense': []}
+            for key, t in replacements.items():
+                item = placed.get(key)
+                if item is None:
+                    item = self.to_stored_format(t)
+                    added[t['type']].append(item)
+                changes.append(self._upsert(item, t['type']))
+            for transaction_type, items in added.items():
+                existing_data[transaction_type] = items + existing_data[transaction_type]
+            
+            size = self._commit_store(existing_data, changes)
+            metrics.SAVE_SECONDS.observe(time.perf_counter() - started)
+            metrics.SAVE_BYTES.observe(size)
+            
+            logger.info(f"Updated {len(replacements)} and deleted {len(deletions)} transactions")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error updating transactions: {e}")
+            return False
+    
+    def _write_snapshot(self, data: Dict):
+        """Refresh the binary snapshot the app loads at startup; JSON stays the source of truth"""
+        try:
+            write_snapshot(snapshot_path(self.transactions_file), unify_transactions(data),
+                           file_signature(self.transactions_file))
+        except Exception as e:
+            logger.warning(f"Error writing transaction snapshot: {e}")
     
     async def start_parsing(self):
         """Start parsing messages from configured groups"""
+        with PROFILER.profile('start_parsing', sample=False):
+            return await self._start_parsing()
+    
+    async def _start_parsing(self):
         if not await self.initialize_client():
             return False
         
@@ -330,12 +896,45 @@ class TelegramFinancialParser:
         logger.info(f"Starting to parse messages from {len(group_ids)} groups")
         
         all_transactions = []
+        # Rule changes are picked up once per cycle
+        message_parser = self.current_rules()
+        
+        async def process_groups(groups: List[Tuple[str, str]]) -> List[Dict]:
+            results = []
+            for group_id, group_name in groups:
+                if not self.is_running:
+                    break
+                
+                logger.info(f"Processing group: {group_id} ({group_name})")
+                results.extend(await self.fetch_messages_from_group(group_id, message_parser=message_parser))
+            return results
+        
+        # Each session works through the groups it owns; sessions run concurrently
+        shards = self.shard_groups(self.configured_groups())
+        for transactions in await asyncio.gather(*(process_groups(groups) for groups in shards.values())):
+            all_transactions.extend(transactions)
+        
+        if all_transactions:
+            await self.save_transactions_async(all_transactions)
+            logger.info(f"Parsing completed. Found {len(all_transactions)} transactions total")
+        else:
+            logger.info("No financial transactions found in the groups")
+        
+        await self.send_alerts()
+        
+        cache_stats = self.parse_cache.stats()
+        metrics.PARSE_CACHE_ENTRIES.labels(workspace=self.workspace).set(cache_stats['entries'])
+        logger.info(f"Parse cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        
+        await self.disconnect_all()
+        return True
+    
+    def configured_groups(self) -> List[Tuple[str, str]]:
+        """Return (group_id, name) pairs from the config"""
+        groups = []
         
         # Handle both old format (list of strings) and new format (list of objects)
-        for group_item in group_ids:
-            if not self.is_running:
-                break
-            
+        for group_item in self.config.get('group_ids', []):
             # Extract group ID from either old format (string) or new format (object)
             if isinstance(group_item, dict):
                 group_id = group_item.get('id')
@@ -348,32 +947,164 @@ class TelegramFinancialParser:
                 logger.warning(f"Skipping invalid group item: {group_item}")
                 continue
             
-            logger.info(f"Processing group: {group_id} ({group_name})")
-            transactions = await self.fetch_messages_from_group(group_id)
-            all_transactions.extend(transactions)
+            groups.append((group_id, group_name))
         
-        if all_transactions:
-            self.save_transactions(all_transactions)
-            logger.info(f"Parsing completed. Found {len(all_transactions)} transactions total")
-        else:
-            logger.info("No financial transactions found in the groups")
+        return groups
+    
+    def shard_groups(self, groups: List[Tuple[str, str]]) -> Dict[str, List[Tuple[str, str]]]:
+        """Split (group_id, name) pairs by the session that owns them"""
+        shards: Dict[str, List[Tuple[str, str]]] = {}
+        for group in groups:
+            session = self.session_for(group[0])
+            if session is not None:
+                shards.setdefault(session.name, []).append(group)
+        return shards
+    
+    async def backfill(self, checkpoint_file: str = 'backfill_checkpoint.json', chunk_size: int = 500) -> bool:
+        """
+        Walk the full history of every configured group, oldest message first.
+        
+        Each chunk is parsed and saved before the next one is fetched, and the
+        last processed message ID per group is written to checkpoint_file, so
+        an interrupted run resumes where it stopped and memory use does not
+        depend on the depth of the history.
+        
+        Args:
+            checkpoint_file (str): JSON file holding per-group progress
+            chunk_size (int): Messages fetched, parsed and saved per step
+        """
+        if not await self.initialize_client():
+            return False
+        
+        self.is_running = True
+        checkpoint = self._load_checkpoint(checkpoint_file)
+        started = time.perf_counter()
+        totals = {'messages': 0, 'transactions': 0}
+        
+        async def backfill_groups(groups: List[Tuple[str, str]]):
+            for group_id, group_name in groups:
+                if not self.is_running:
+                    break
+                try:
+                    await self._backfill_group(group_id, group_name, checkpoint, checkpoint_file, chunk_size,
+                                               totals, started)
+                except FloodWaitError:
+                    raise
+                except Exception as e:
+                    # One failing group must not cancel the backfill of the others
+                    logger.error(f"Error backfilling group {group_id}, progress is checkpointed: {e}")
+        
+        try:
+            # Sessions walk their own groups concurrently
+            shards = self.shard_groups(self.configured_groups())
+            await asyncio.gather(*(backfill_groups(groups) for groups in shards.values()))
+        except FloodWaitError as e:
+            logger.error(f"Backfill stopped by a {e.seconds}s FloodWait; progress is checkpointed, rerun to resume")
+        finally:
+            await self.disconnect_all()
         
-        if self.client:
-            client = cast(TelegramClient, self.client)
-            await client.disconnect()
+        elapsed = time.perf_counter() - started
+        logger.info(f"Backfill finished: {totals['messages']} messages, {totals['transactions']} transactions "
+                    f"in {elapsed:.1f}s ({totals['messages'] / elapsed if elapsed else 0:.0f} msg/s)")
         return True
     
+    async def _backfill_group(self, group_id: str, group_name: str, checkpoint: Dict, checkpoint_file: str,
+                              chunk_size: int, totals: Dict, started: float):
+        """Backfill one group chunk by chunk, following the group if its session is rebalanced"""
+        progress = checkpoint.setdefault(str(group_id), {'offset_id': 0, 'messages': 0, 'transactions': 0})
+        if progress.get('offset_id'):
+            logger.info(f"Resuming backfill of {group_id} ({group_name}) after message {progress['offset_id']}")
+        else:
+            logger.info(f"Starting backfill of {group_id} ({group_name})")
+        
+        while self.is_running:
+            session = self.session_for(group_id)
+            if session is None:
+                logger.error(f"No healthy session left for group {group_id}, stopping its backfill")
+                return
+            
+            try:
+                entity, group_title = await session.entity_cache.resolve(
+                    group_id, functools.partial(self._get_entity, session))
+            except FloodWaitError as e:
+                self._record_result(session, e)
+                continue
+            except Exception as e:
+                logger.error(f"Error resolving group {group_id}, skipping backfill: {e}")
+                return
+            
+            chunk_started = time.perf_counter()
+            received = 0
+            last_id = progress['offset_id']
+            transactions = []
+            flood_wait = None
+            message_parser = self.current_rules()
+            
+            try:
+                async for message in session.rate_limiter.iter_messages(session.client, entity, limit=chunk_size,
+                                                                        offset_id=progress['offset_id'],
+                                                                        reverse=True):
+                    received += 1
+                    last_id = message.id
+                    if message.text:
+                        transaction = self.build_transaction(message, group_id, group_title, message_parser)
+                        if transaction:
+                            transactions.append(transaction)
+            except FloodWaitError as e:
+                # Keep the partial chunk so the checkpoint matches what was saved
+                flood_wait = e
+            
+            # The checkpoint only moves past messages that are stored
+            if transactions and not await self.save_transactions_async(transactions):
+                logger.error(f"Stopping backfill of {group_id}: saving the chunk after message "
+                             f"{progress['offset_id']} failed; rerun to resume")
+                return
+            
+            progress['offset_id'] = last_id
+            progress['messages'] += received
+            progress['transactions'] += len(transactions)
+            progress['updated'] = datetime.now().isoformat()
+            self._save_checkpoint(checkpoint_file, checkpoint)
+            
+            totals['messages'] += received
+            totals['transactions'] += len(transactions)
+            chunk_seconds = time.perf_counter() - chunk_started
+            elapsed = time.perf_counter() - started
+            logger.info(f"Backfill {group_id}: {progress['messages']} messages, "
+                        f"{progress['transactions']} transactions "
+                        f"(chunk {received / chunk_seconds if chunk_seconds else 0:.0f} msg/s, "
+                        f"overall {totals['messages'] / elapsed if elapsed else 0:.0f} msg/s)")
+            
+            if flood_wait:
+                # Continue on another session if one is left, otherwise give up until the next run
+                self._record_result(session, flood_wait)
+                if self.session_for(group_id) is None:
+                    raise flood_wait
+                continue
+            if received < chunk_size:
+                return
+    
+    def _load_checkpoint(self, checkpoint_file: str) -> Dict:
+        if not os.path.exists(checkpoint_file):
+            return {}
+        try:
+            with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Error loading backfill checkpoint {checkpoint_file}, starting over: {e}")
+            return {}
+    
+    def _save_checkpoint(self, checkpoint_file: str, checkpoint: Dict):
+        tmp_path = f"{checkpoint_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, checkpoint_file)
+    
     async def start_real_time_monitoring(self):
         """Start real-time monitoring of groups"""
         if not await self.initialize_client():
             return False
         
-        # Check if client is initialized
-        if self.client is None:
-            logger.error("Client not initialized")
-            return False
-        
-        client = cast(TelegramClient, self.client)
         self.is_running = True
         
         # Get group IDs in the correct format for monitoring
@@ -398,45 +1129,276 @@ class TelegramFinancialParser:
             logger.error("No valid group IDs found for monitoring")
             return False
         
+        # Handlers only queue messages, edits and deletions; one worker applies them in order, in batches
+        self.ingest = IngestQueue.from_config(self.config.get('ingest'), self.data_path('ingest.spill'))
+        self._ingest_step = None
+        worker = asyncio.create_task(self._ingest_worker())
+        
+        # Every session listens to every group but only handles the groups it
+        # owns, so a group keeps being served when its session is rebalanced away
+        sessions = [session for session in self.sessions.values() if session.healthy]
+        for session in sessions:
+            self._register_handlers(session, chat_ids)
+        
+        async def run_session(session: TelegramSession):
+            await session.client.run_until_disconnected()
+            if self.is_running:
+                # Its groups move to the sessions still connected, whose handlers listen to every group
+                logger.warning(f"Session {session.name} disconnected")
+                self.mark_unhealthy(session)
+        
+        logger.info(f"Starting real-time monitoring (ingestion queue: {self.ingest.capacity} messages, "
+                    f"{self.ingest.policy} when full)...")
+        try:
+            await asyncio.gather(*(run_session(session) for session in sessions))
+        finally:
+            await self._stop_ingest_worker(worker)
+            # Store what is still queued in memory; spilled messages stay on disk for the next run
+            remaining = self.ingest.drain_nowait()
+            if remaining and not await self._store_messages(remaining):
+                self.ingest.add_gaps(remaining)
+                changes = sum(1 for item in remaining if item.kind != 'new')
+                if changes:
+                    logger.error(f"{changes} queued edits and deletions could not be applied at shutdown")
+            self.ingest.close()
+            if self.ingest.gaps:
+                logger.warning(f"Not caught up after dropped messages (group: last message stored): "
+                               f"{self.ingest.gaps}; the next parse cycle fetches the recent messages")
+        
+        return True
+    
+    async def _stop_ingest_worker(self, worker: asyncio.Task):
+        # Waits for the batch (or catch-up) in progress, so nothing already taken from the queue is lost
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        if self._ingest_step is not None:
+            await asyncio.gather(self._ingest_step, return_exceptions=True)
+    
+    def _register_handlers(self, session: TelegramSession, chat_ids: List[int]):
+        client = cast(TelegramClient, session.client)
+        
         @client.on(events.NewMessage(chats=chat_ids))
         async def handle_new_message(event):
-            message = event.message
-            
-            if message.text:
-                # Get the correct group ID as string
-                group_id = str(event.chat_id)
-                parsed_data = self.parse_financial_message(message.text, group_id)
-                
-                if parsed_data:
-                    transaction = {
-                        'id': str(message.id),  # This is the correct ID
-                        'amount': parsed_data['amount'],
-                        'type': parsed_data['type'],
-                        'description': parsed_data['description'],
-                        'category': parsed_data['category'],
-                        'date': message.date.isoformat(),
-                        'group_id': group_id,
-                        'group_name': getattr(event.chat, 'title', 'Unknown Group'),
-                        'message_id': message.id,
-                        'raw_message': message.text[:200]
-                    }
-                    
-                    # Save single transaction
-                    self.save_transactions([transaction])
-                    
+            if self.session_for(event.chat_id) is not session:
+                return
+            await self._handle_new_message(event)
+        
+        @client.on(events.MessageEdited(chats=chat_ids))
+        async def handle_message_edited(event):
+            if self.session_for(event.chat_id) is not session:
+                return
+            await self.ingest.put(IngestItem.from_event(event, kind='edit'))
+        
+        # Telegram only names the chat of a deletion for channels, so this handler
+        # cannot filter by chat and the IDs are checked when the deletion is applied
+        @client.on(events.MessageDeleted())
+        async def handle_message_deleted(event):
+            if event.chat_id is not None and (event.chat_id not in chat_ids or
+                                              self.session_for(event.chat_id) is not session):
+                return
+            await self.ingest.put(IngestItem.deletion(event, session.name))
+    
+    async def _handle_new_message(self, event):
+        """Queue a real-time message for the ingestion worker (may wait while the queue is full)"""
+        if event.message.text:
+            await self.ingest.put(IngestItem.from_event(event))
+    
+    async def _ingest_worker(self):
+        """Apply queued real-time messages batch by batch and catch up groups whose messages were dropped"""
+        failures = 0
+        while True:
+            batch = await self.ingest.get_batch()
+            # Shielded, so stopping the worker lets the batch in progress finish (see _stop_ingest_worker)
+            self._ingest_step = asyncio.ensure_future(self._ingest_batch(batch, failures + 1 >= STORE_ATTEMPTS))
+            try:
+                stored = await asyncio.shield(self._ingest_step)
+            except Exception as e:
+                logger.error(f"Error storing real-time messages: {e}")
+                stored = True
+            failures = 0 if stored else failures + 1
+            if not stored:
+                await asyncio.sleep(STORE_RETRY_DELAY)
+    
+    async def _ingest_batch(self, batch: List[IngestItem], last_attempt: bool) -> bool:
+        """
+        Store a batch, then catch up dropped messages once the queue is drained.
+        
+        Returns:
+            False if the batch could not be stored and was put back in the queue
+        """
+        if not await self._store_messages(batch):
+            if not last_attempt:
+                self.ingest.requeue(batch)
+                return False
+            # New messages can still be fetched again; edits and deletions cannot
+            self.ingest.add_gaps(batch)
+            changes = sum(1 for item in batch if item.kind != 'new')
+            logger.error(f"Giving up on a batch of {len(batch)} real-time messages after {STORE_ATTEMPTS} attempts"
+                         f"{f', {changes} edits and deletions are lost' if changes else ''}; "
+                         f"the new messages are caught up later")
+        await self.send_alerts()
+        if self.ingest.idle:
+            gaps = self.ingest.take_gaps()
+            try:
+                for group_id in list(gaps):
+                    await self.catch_up(group_id, gaps[group_id])
+                    del gaps[group_id]
+            finally:
+                # Groups not reached yet if the catch-up was interrupted
+                self.ingest.restore_gaps(gaps)
+        return True
+    
+    async def _store_messages(self, items: List[IngestItem]) -> bool:
+        """
+        Apply queued real-time messages, edits and deletions in the order they arrived.
+        
+        Consecutive new messages are stored in one write, consecutive edits and deletions in another.
+        
+        Returns:
+            False if a write failed (the error is logged); the writes before it are kept
+        """
+        try:
+            message_parser = self.current_rules()
+            for new, run in itertools.groupby(items, key=lambda item: item.kind == 'new'):
+                if new:
+                    stored = await self._store_new_messages(list(run), message_parser)
+                else:
+                    stored = await self._apply_message_changes(list(run), message_parser)
+                if not stored:
+                    return False
+            return True
+        except Exception as e:
+            logger.error(f"Error storing real-time messages: {e}")
+            return False
+    
+    def _queued_title(self, item: IngestItem, renamed: set) -> str:
+        session = self.session_for(item.group_id)
+        entity_cache = session.entity_cache if session else None
+        
+        # Keep cached titles current when a group is renamed
+        if entity_cache and entity_cache.update_title(item.group_id, item.title):
+            renamed.add(entity_cache)
+        return item.title or (entity_cache.title(item.group_id) if entity_cache else 'Unknown')
+    
+    async def _store_new_messages(self, items: List[IngestItem], message_parser: MessageParser) -> bool:
+        transactions = []
+        renamed = set()
+        # The write runs in a thread and is timed by the save metrics; the profile covers the parsing
+        with PROFILER.profile('realtime_message', sample=False):
+            for item in items:
+                title = self._queued_title(item, renamed)
+                transaction = self.build_transaction(item, item.group_id, title, message_parser)
+                if transaction:
+                    transactions.append(transaction)
                     logger.info(f"New transaction detected: {transaction['type']} {transaction['amount']}₽")
         
-        logger.info("Starting real-time monitoring...")
-        await client.run_until_disconnected()
+        for entity_cache in renamed:
+            entity_cache.save()
+        if not transactions:
+            return True
+        # The alert rules are evaluated on the write
+        return await self.save_transactions_async(transactions)
+    
+    async def _apply_message_changes(self, items: List[IngestItem], message_parser: MessageParser) -> bool:
+        """Re-parse edited messages and replace (or drop) their stored transactions; drop deleted ones"""
+        # The last change of a message wins; None drops its row
+        changes: Dict[Tuple[str, str], Optional[Dict]] = {}
+        renamed = set()
+        for item in items:
+            if item.kind == 'delete':
+                for key in self._deleted_keys(item):
+                    changes[key] = None
+                continue
+            title = self._queued_title(item, renamed)
+            # An edit that is no longer a financial message drops the row
+            changes[transaction_key(item.group_id, item.id)] = (
+                self.build_transaction(item, item.group_id, title, message_parser) if item.text else None)
         
+        for entity_cache in renamed:
+            entity_cache.save()
+        upserts = [transaction for transaction in changes.values() if transaction]
+        deletions = [key for key, transaction in changes.items() if transaction is None]
+        if not upserts and not deletions:
+            return True
+        if not await self.update_transactions_async(upserts, deletions):
+            return False
+        for transaction in upserts:
+            logger.info(f"Edited transaction: {transaction['type']} {transaction['amount']}₽")
         return True
     
+    def _deleted_keys(self, item: IngestItem) -> List[Tuple[str, str]]:
+        """Store keys of a queued deletion"""
+        if item.group_id is not None:
+            return [transaction_key(item.group_id, message_id) for message_id in item.ids]
+        # Outside channels message IDs are unique per account, so look the chat up among
+        # the non-channel groups the receiving session serves
+        session = self.sessions.get(item.session)
+        keys = []
+        for message_id in item.ids:
+            group_ids = [group_id for group_id in self.dedup_index.groups_for(message_id)
+                         if not group_id.startswith('-100') and self.session_for(group_id) is session]
+            if len(group_ids) == 1:
+                keys.append((group_ids[0], str(message_id)))
+            elif group_ids:
+                logger.warning(f"Deleted message {message_id} matches several groups ({', '.join(group_ids)}); keeping it")
+        return keys
+    
+    async def catch_up(self, group_id: str, min_id: int) -> int:
+        """
+        Store the messages of a group posted after min_id (e.g. ones dropped while the ingestion queue was full).
+        
+        If that fails, the group is registered for another catch-up from the last message stored.
+        
+        Returns:
+            Number of transactions found
+        """
+        session = self.session_for(group_id)
+        if session is None:
+            logger.error(f"No healthy session to catch up group {group_id}")
+            if self.ingest is not None:
+                self.ingest.restore_gaps({group_id: min_id})
+            return 0
+        
+        batch_size = self.ingest.batch_size if self.ingest is not None else DEFAULT_BATCH_SIZE
+        message_parser = self.current_rules()
+        found = 0
+        transactions = []
+        # Everything up to this message is stored
+        stored_id = min_id
+        try:
+            entity, group_title = await session.entity_cache.resolve(
+                group_id, functools.partial(self._get_entity, session))
+            async for message in session.rate_limiter.iter_messages(session.client, entity, limit=None,
+                                                                    offset_id=min_id, reverse=True):
+                transaction = (self.build_transaction(message, group_id, group_title, message_parser)
+                               if message.text else None)
+                if transaction:
+                    transactions.append(transaction)
+                if len(transactions) >= batch_size:
+                    if not await self.save_transactions_async(transactions):
+                        raise RuntimeError("saving the fetched messages failed")
+                    found += len(transactions)
+                    transactions = []
+                    stored_id = message.id
+            if transactions and not await self.save_transactions_async(transactions):
+                raise RuntimeError("saving the fetched messages failed")
+            found += len(transactions)
+        except Exception as e:
+            logger.error(f"Error catching up group {group_id}, will retry from message {stored_id}: {e}")
+            if self.ingest is not None:
+                self.ingest.restore_gaps({group_id: stored_id})
+            return found
+        
+        await self.send_alerts()
+        logger.info(f"Caught up group {group_id} after message {min_id}: {found} transactions")
+        return found
+    
     def stop(self):
         """Stop the parser"""
         self.is_running = False
-        if self.client:
-            client = cast(TelegramClient, self.client)
-            client.disconnect()
+        for session in self.sessions.values():
+            if session.client:
+                session.client.disconnect()
 
 def main():
     """Main function for standalone usage"""
@@ -446,14 +1408,36 @@ def main():
     parser.add_argument('--config', default='config.json', help='Path to config file')
     parser.add_argument('--real-time', action='store_true', help='Enable real-time monitoring')
     parser.add_argument('--once', action='store_true', help='Parse once and exit')
+    parser.add_argument('--backfill', action='store_true', help='Walk the full history of every group (resumable)')
+    parser.add_argument('--checkpoint', default='backfill_checkpoint.json', help='Backfill checkpoint file')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Messages per backfill chunk')
+    parser.add_argument('--reparse', action='store_true',
+                        help='Re-parse the stored messages with the current rules and exit')
+    parser.add_argument('--workers', type=int, help='Worker processes for --reparse (default: CPU count)')
+    parser.add_argument('--fake-corpus', help='Serve Telegram data from this fixture file instead of the network')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port')
     
     args = parser.parse_args()
     
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port)
+    
+    client_factory = None
+    if args.fake_corpus:
+        from fake_telegram import fake_client_factory
+        client_factory = fake_client_factory(args.fake_corpus)
+    
     # Create parser instance
-    parser_instance = TelegramFinancialParser(args.config)
+    parser_instance = TelegramFinancialParser(args.config, client_factory=client_factory)
+    
+    if args.reparse:
+        parser_instance.reparse_store(args.workers)
+        return
     
     async def run():
-        if args.real_time:
+        if args.backfill:
+            await parser_instance.backfill(args.checkpoint, args.chunk_size)
+        elif args.real_time:
             await parser_instance.start_real_time_monitoring()
         elif args.once:
             await parser_instance.start_parsing()
@@ -5,21 +5,29 @@ Simple server for testing Telegram Mini App
 
 import os
 import sys
-from flask import Flask, send_from_directory
+from flask import Flask, Response, abort, render_template, request
 from flask_cors import CORS
 
-app = Flask(__name__)
+from assets import ASSETS
+
+app = Flask(__name__, static_folder=None)
+app.jinja_env.globals['asset_url'] = ASSETS.url
 CORS(app)
 
 # Serve static files
 @app.route('/static/<path:filename>')
 def static_files(filename):
-    return send_from_directory('static', filename)
+    result = ASSETS.respond(filename, request.headers.get('Accept-Encoding', ''),
+                            request.headers.get('If-None-Match', ''))
+    if result is None:
+        abort(404)
+    status, body, headers = result
+    return Response(body, status=status, headers=headers)
 
 # Serve the main Telegram Mini App
 @app.route('/')
 def telegram_mini_app():
-    return send_from_directory('templates', 'telegram_index.html')
+    return render_template('telegram_index.html', api_base='')
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Telegram Financial Agent - Workspaces
+Lets one process serve many independent ledgers. Each workspace is a
+directory <root>/<workspace_id>/ holding its own config.json,
+transactions.json, session and cache files; workspaces are created lazily
+on first access.
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKSPACE = 'default'
+WORKSPACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class WorkspaceRegistry:
+    """
+    Registry of workspaces keyed by workspace ID.
+
+    Args:
+        root (str): Directory containing one sub-directory per workspace
+        factory (Callable): Called as factory(workspace_id, config_path,
+            transactions_file, base_dir) to build a workspace's app state
+        default: App state served for the default workspace (the files in
+            the current directory)
+    """
+
+    def __init__(self, root: str, factory: Callable[..., Any], default: Any = None):
+        self.root = root
+        self.factory = factory
+        self._workspaces: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        if default is not None:
+            self._workspaces[DEFAULT_WORKSPACE] = default
+
+    def workspace_dir(self, workspace_id: str) -> str:
+        return os.path.join(self.root, workspace_id)
+
+    def exists(self, workspace_id: str) -> bool:
+        if workspace_id in self._workspaces:
+            return True
+        if not WORKSPACE_ID_PATTERN.match(workspace_id):
+            return False
+        return os.path.isfile(os.path.join(self.workspace_dir(workspace_id), 'config.json'))
+
+    def get(self, workspace_id: str) -> Optional[Any]:
+        """Return the workspace's app state, creating it on first access; None if it does not exist"""
+        workspace = self._workspaces.get(workspace_id)
+        if workspace is not None:
+            return workspace
+        if not self.exists(workspace_id):
+            return None
+
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id)
+            if workspace is None:
+                base_dir = self.workspace_dir(workspace_id)
+                logger.info(f"Opening workspace {workspace_id} from {base_dir}")
+                workspace = self.factory(
+                    workspace_id,
+                    os.path.join(base_dir, 'config.json'),
+                    os.path.join(base_dir, 'transactions.json'),
+                    base_dir
+                )
+                self._workspaces[workspace_id] = workspace
+        return workspace
+
+    def ids(self) -> List[str]:
+        """IDs of the default workspace and every workspace directory under root"""
+        ids = set(self._workspaces)
+        if os.path.isdir(self.root):
+            ids.update(name for name in os.listdir(self.root) if self.exists(name))
+        return sorted(ids)
+
+    def loaded(self) -> List[str]:
+        return sorted(self._workspaces)